@@ -1,26 +1,172 @@
 # project/agents/directory_agent.py
 
-import json
 import asyncio
+import heapq
+import random
 from spade.agent import Agent
 from spade.behaviour import CyclicBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from logs import get_logger
+from protocols.codec import Expertise, ReplicaLoad, ReplicaLoads, Topic, TutorList, TutorStatus, decode, encode
+
 # Protocol definition
 PROTOCOL_DIRECTORY = "DirectoryProtocol"
 
+
+class TutorIndex:
+    """
+    Inverted index of tutor expertise.
+    - `by_tutor` keeps {jid: [expertise1, expertise2]} (the old registry).
+    - `by_topic` keeps {topic: {jid1, jid2}} so a query only touches the matches.
+    - `status` keeps {jid: (available, queue_length)} as last published by the tutor.
+    """
+
+    def __init__(self):
+        self.by_tutor = {}
+        self.by_topic = {}
+        self.status = {}
+
+    def register(self, jid, expertise):
+        """Adds a tutor, or replaces the expertise of an already registered one."""
+        status = self.status.get(jid, (True, 0))
+        self.deregister(jid)
+        expertise = list(expertise)
+        self.by_tutor[jid] = expertise
+        self.status[jid] = status
+        for topic in expertise:
+            self.by_topic.setdefault(topic, set()).add(jid)
+
+    def update_status(self, jid, available, queue_length):
+        """Records a tutor's availability and load. Ignored for unknown tutors."""
+        if jid in self.by_tutor:
+            self.status[jid] = (available, queue_length)
+
+    def deregister(self, jid):
+        """Removes a tutor from every topic it was listed under."""
+        expertise = self.by_tutor.pop(jid, None)
+        self.status.pop(jid, None)
+        if expertise is None:
+            return False
+        for topic in expertise:
+            tutors = self.by_topic.get(topic)
+            if tutors is None:
+                continue
+            tutors.discard(jid)
+            if not tutors:
+                del self.by_topic[topic]
+        return True
+
+    def topics(self, jid):
+        """The topics `jid` is currently listed under."""
+        return set(self.by_tutor.get(jid, ()))
+
+    def find(self, topic, top_k=None, available_only=False):
+        """
+        Returns the JIDs of the tutors with `topic` in their expertise.
+        With `available_only`, unavailable tutors are left out. With `top_k`,
+        only the k least loaded are returned, available ones and shorter
+        queues first. Ties are broken at random, so equally loaded tutors
+        share a burst of queries instead of the same k getting all of them.
+        """
+        tutors = self.by_topic.get(topic, ())
+        if available_only:
+            tutors = [jid for jid in tutors if self.status[jid][0]]
+        if top_k is None:
+            return list(tutors)
+        return heapq.nsmallest(top_k, tutors, key=lambda jid: (*self.load(jid), random.random()))
+
+    def load(self, jid):
+        """Sort key: available tutors first, then by queue length."""
+        available, queue_length = self.status[jid]
+        return (not available, queue_length)
+
+    def __len__(self):
+        return len(self.by_tutor)
+
+
+class ReplicaIndex:
+    """
+    Replicas of shared services (e.g. "resource"), with the load each one
+    last published: {service: {jid: load}}.
+    """
+
+    def __init__(self):
+        self.by_service = {}
+        self.service_of = {}  # jid -> service
+
+    def register(self, service, jid):
+        self.deregister(jid)
+        self.by_service.setdefault(service, {})[jid] = 0.0
+        self.service_of[jid] = service
+
+    def update_load(self, jid, load):
+        """Records a replica's load. Ignored for unknown replicas."""
+        service = self.service_of.get(jid)
+        if service is not None:
+            self.by_service[service][jid] = load
+
+    def deregister(self, jid):
+        service = self.service_of.pop(jid, None)
+        if service is None:
+            return False
+        replicas = self.by_service[service]
+        del replicas[jid]
+        if not replicas:
+            del self.by_service[service]
+        return True
+
+    def replicas(self, service):
+        """{jid: load} of every replica of `service`."""
+        return dict(self.by_service.get(service, {}))
+
+
+class Subscriptions:
+    """Which agents want to hear when the tutor list of a topic changes."""
+
+    def __init__(self):
+        self.by_topic = {}       # topic -> {subscriber jid}
+        self.by_subscriber = {}  # subscriber jid -> {topic}
+
+    def subscribe(self, jid, topic):
+        self.by_topic.setdefault(topic, set()).add(jid)
+        self.by_subscriber.setdefault(jid, set()).add(topic)
+
+    def unsubscribe(self, jid):
+        for topic in self.by_subscriber.pop(jid, ()):
+            subscribers = self.by_topic[topic]
+            subscribers.discard(jid)
+            if not subscribers:
+                del self.by_topic[topic]
+
+    def subscribers(self, topic):
+        return self.by_topic.get(topic, ())
+
+
 class DirectoryAgent(Agent):
     """
     Manages a registry of available tutors and their expertise.
-    - Tutors register themselves on startup.
+    - Tutors register themselves on startup (and deregister on shutdown).
+    - Service replicas (e.g. ResourceAgents) register the same way with
+      metadata service=<name> and publish their load; a query with that
+      metadata returns {jid: load} of the replicas.
     - Students query this agent to find tutors for a specific topic.
+      A query with metadata subscribe=true also subscribes the student to
+      that topic: when its tutor list changes (a tutor registers,
+      deregisters or changes expertise) the student gets an 'invalidate'
+      message with the topic, so it can cache query results.
     """
 
     async def setup(self):
-        # A simple dictionary to store {jid: [expertise1, expertise2]}
-        self.tutor_registry = {}
-        print(f"{self.name}: Directory is online.")
+        # Topic -> tutors index; `tutor_registry` is the {jid: [expertise]} view of it
+        self.tutor_index = TutorIndex()
+        self.tutor_registry = self.tutor_index.by_tutor
+        self.replica_index = ReplicaIndex()
+        self.subscriptions = Subscriptions()
+        self.invalidations_sent = 0
+        self.log = get_logger("directory", self.name)
+        self.log.info("Directory is online.")
 
         # Template to listen for all directory-related messages
         template = Template()
@@ -28,11 +174,30 @@ class DirectoryAgent(Agent):
 
         self.add_behaviour(self.DirectoryResponderBehav(), template)
 
+    async def notify_changed(self, behaviour, topics):
+        """Tells the subscribers of each topic that its tutor list changed."""
+        for topic in topics:
+            for subscriber in self.subscriptions.subscribers(topic):
+                msg = Message(to=subscriber)
+                msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
+                msg.set_metadata("performative", "invalidate")
+                encode(msg, Topic(topic))
+                await behaviour.send(msg)
+                self.invalidations_sent += 1
+
     class DirectoryResponderBehav(CyclicBehaviour):
         """
-        Handles two types of requests:
-        1. 'register': A tutor registers their expertise.
-        2. 'query': A student asks for tutors for a topic.
+        Handles these types of requests:
+        1. 'register': A tutor registers (or re-registers) their expertise. Answered with 'agree'.
+        2. 'deregister': A tutor leaves the directory.
+        3. 'status': A tutor publishes its TutorStatus.
+        4. 'query': A student asks for tutors for a topic (and may subscribe to it).
+           Metadata top_k=N returns the N least loaded, available_only=true
+           leaves unavailable tutors out.
+        5. 'unsubscribe': A student drops all its subscriptions.
+        Subscribers of every topic whose tutor list changed get an 'invalidate'.
+        With metadata service=<name>, 1-4 are about the replicas of that
+        service instead (see handle_service).
         """
 
         async def run(self):
@@ -43,31 +208,85 @@ class DirectoryAgent(Agent):
             performative = msg.get_metadata("performative")
 
             try:
-                if performative == "register":
+                service = msg.get_metadata("service")
+                if service:
+                    await self.handle_service(msg, performative, service)
+
+                elif performative == "register":
                     # A tutor is registering
                     jid = str(msg.sender)
-                    expertise = json.loads(msg.body)
-                    self.agent.tutor_registry[jid] = expertise
-                    print(f"{self.agent.name}: Registered {jid} with expertise {expertise}")
+                    expertise = decode(msg, Expertise).topics
+                    before = self.agent.tutor_index.topics(jid)
+                    self.agent.tutor_index.register(jid, expertise)
+                    self.agent.log.info("Registered {} with expertise {}", jid, expertise)
+
+                    # Acknowledge, so the tutor (and the launcher) know it is listed
+                    reply = msg.make_reply()
+                    reply.set_metadata("performative", "agree")
+                    await self.send(reply)
+                    await self.agent.notify_changed(self, before ^ set(expertise))
+
+                elif performative == "deregister":
+                    # A tutor is leaving
+                    jid = str(msg.sender)
+                    before = self.agent.tutor_index.topics(jid)
+                    if self.agent.tutor_index.deregister(jid):
+                        self.agent.log.info("Deregistered {}", jid)
+                        await self.agent.notify_changed(self, before)
+
+                elif performative == "status":
+                    # A tutor's load changed
+                    status = decode(msg, TutorStatus)
+                    self.agent.tutor_index.update_status(str(msg.sender), status.available, status.queue_length)
+
+                elif performative == "unsubscribe":
+                    self.agent.subscriptions.unsubscribe(str(msg.sender))
 
                 elif performative == "query":
                     # A student is querying
-                    topic = msg.body
-                    print(f"{self.agent.name}: Received query for topic '{topic}'")
+                    topic = decode(msg, Topic).topic
+                    self.agent.log.debug("Received query for topic '{}'", topic)
+                    if msg.get_metadata("subscribe") == "true":
+                        self.agent.subscriptions.subscribe(str(msg.sender), topic)
 
-                    # Find all tutors who have this topic in their expertise list
-                    matches = []
-                    for jid, expertise_list in self.agent.tutor_registry.items():
-                        if topic in expertise_list:
-                            matches.append(jid)
-                    
-                    print(f"{self.agent.name}: Found {len(matches)} matches.")
+                    # Look the topic up in the inverted index
+                    top_k = msg.get_metadata("top_k")
+                    matches = self.agent.tutor_index.find(
+                        topic,
+                        top_k=int(top_k) if top_k else None,
+                        available_only=msg.get_metadata("available_only") == "true",
+                    )
+
+                    self.agent.log.debug("Found {} matches.", len(matches))
 
                     # Reply to the student with the list of matching JIDs
                     reply = msg.make_reply()
                     reply.set_metadata("performative", "inform")
-                    reply.body = json.dumps(matches) # Send list as a JSON string
+                    encode(reply, TutorList(tuple(matches)))
                     await self.send(reply)
 
             except Exception as e:
-                print(f"{self.agent.name}: Error processing message from {msg.sender}: {e}")
\ No newline at end of file
+                self.agent.log.error("Error processing message from {}: {}", msg.sender, e)
+
+        async def handle_service(self, msg, performative, service):
+            replicas = self.agent.replica_index
+            jid = str(msg.sender)
+            if performative == "register":
+                replicas.register(service, jid)
+                self.agent.log.info("Registered {} as a '{}' replica", jid, service)
+                reply = msg.make_reply()
+                reply.set_metadata("performative", "agree")
+                await self.send(reply)
+
+            elif performative == "deregister":
+                if replicas.deregister(jid):
+                    self.agent.log.info("Deregistered '{}' replica {}", service, jid)
+
+            elif performative == "status":
+                replicas.update_load(jid, decode(msg, ReplicaLoad).load)
+
+            elif performative == "query":
+                reply = msg.make_reply()
+                reply.set_metadata("performative", "inform")
+                encode(reply, ReplicaLoads(replicas.replicas(service)))
+                await self.send(reply)
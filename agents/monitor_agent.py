@@ -3,26 +3,158 @@
 
 import json
 import time
-import numpy as np
+from collections import Counter, deque
 from spade.agent import Agent
-from spade.behaviour import CyclicBehaviour
+from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
 from spade.template import Template
 
+from sim_clock import clock
+from metrics import StreamingStats, gini
+from event_store import EventStore
+from logs import get_logger, flush as flush_logs
+
 # Protocol definition
 PROTOCOL_MONITOR = "MonitorProtocol"
 MONITOR_AGENT_JID = "monitor@localhost"
 
+# Raw events kept in the event_log ring buffer by default (0 = no raw log)
+DEFAULT_EVENT_LOG_SIZE = 10_000
+# Real seconds between event store flushes (batches are also written when full)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class MonitorMetrics:
+    """
+    Running aggregates of the monitor events, updated as each event arrives.
+    Memory grows with the number of students/tutors, not with the number of events.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.messages = 0                     # Telemetry messages (one event or a batch each)
+        self.by_event = Counter()             # event name -> count
+        self.resources_by_topic = Counter()   # topic -> resources provided
+        self.resources_by_source = Counter()  # download / cache / coalesced -> resources provided
+        self.resource_mb_by_source = Counter()
+        self.resources_by_replica = Counter() # resource agent jid -> resources provided
+        self.sessions_by_tutor = Counter()    # tutor jid -> sessions started
+        self.cfp_fanout = StreamingStats()    # Tutors contacted per CFP round
+        self.help_requested = {}              # student jid -> timestamp of its open help request
+        self.time_to_help = StreamingStats(quantiles=True)
+        self.starts = {}                      # student jid -> STUDENT_START event
+        self.finished = {}                    # student jid -> final knowledge
+        self.learning_gain = StreamingStats()
+        self.retries_by_reason = Counter()    # resource_busy / directory / proposals / tutoring -> retries
+        self.retry_delay = StreamingStats()
+        # --- Latest known state (for the live dashboard) ---
+        self.tutor_status = {}                # tutor jid -> {"available", "queue_length"}
+        self.resource_load = {}               # replica jid -> {"load", "downloading", "queued"}
+        self.student_state = {}               # student jid -> current FSM state
+        self.students_by_state = Counter()    # FSM state -> students in it
+
+    def ingest(self, event):
+        name = event["event"]
+        self.events += 1
+        self.by_event[name] += 1
+
+        if name == "RESOURCE_PROVIDED":
+            self.resources_by_topic[event.get("topic")] += 1
+            source = event.get("source", "download")
+            self.resources_by_source[source] += 1
+            self.resource_mb_by_source[source] += event.get("size_mb", 0)
+            self.resources_by_replica[event.get("replica", "resource_manager@localhost")] += 1
+        elif name == "SESSION_START":
+            self.sessions_by_tutor[event["tutor"]] += 1
+        elif name == "CFP_SENT":
+            self.cfp_fanout.add(event["participants"])
+        elif name == "STUDENT_REQUEST_HELP":
+            # Measured from the first request until a tutor is found
+            self.help_requested.setdefault(event["student"], event["timestamp"])
+        elif name == "STUDENT_FOUND_TUTOR":
+            requested = self.help_requested.pop(event["student"], None)
+            if requested is not None:
+                self.time_to_help.add(event["timestamp"] - requested)
+        elif name == "STUDENT_STATE":
+            previous = self.student_state.get(event["student"])
+            if previous is not None:
+                self.students_by_state[previous] -= 1
+            self.student_state[event["student"]] = event["state"]
+            self.students_by_state[event["state"]] += 1
+        elif name == "TUTOR_STATUS":
+            self.tutor_status[event["tutor"]] = {
+                "available": event["available"], "queue_length": event["queue_length"]}
+        elif name == "RESOURCE_LOAD":
+            self.resource_load[event["replica"]] = {
+                "load": event["load"], "downloading": event["downloading"], "queued": event["queued"]}
+        elif name == "RETRY":
+            self.retries_by_reason[event["reason"]] += 1
+            self.retry_delay.add(event["delay"])
+        elif name == "STUDENT_START":
+            self.starts[event["student"]] = event
+        elif name == "STUDENT_FINISH":
+            student = event["student"]
+            self.finished[student] = event["knowledge"]
+            start = self.starts.get(student)
+            if start is not None:
+                self.learning_gain.add(event["knowledge"] - start["knowledge"])
+
+    def snapshot(self):
+        """The current aggregates as a JSON-friendly dict."""
+        return {
+            "events": self.events,
+            "messages": self.messages,
+            "by_event": dict(self.by_event),
+            "resources_provided": self.by_event["RESOURCE_PROVIDED"],
+            "resources_by_topic": dict(self.resources_by_topic),
+            "resources_by_source": dict(self.resources_by_source),
+            "resources_by_replica": dict(self.resources_by_replica),
+            "sessions_by_tutor": dict(self.sessions_by_tutor),
+            "cfp_fanout": self.cfp_fanout.snapshot(),
+            "time_to_help": self.time_to_help.snapshot(),
+            "waiting_for_help": len(self.help_requested),
+            "students_started": len(self.starts),
+            "students_finished": len(self.finished),
+            "learning_gain": self.learning_gain.snapshot(),
+            "retries_by_reason": dict(self.retries_by_reason),
+            "retry_delay": self.retry_delay.snapshot(),
+            "tutor_status": dict(self.tutor_status),
+            "resource_load": dict(self.resource_load),
+            "students_by_state": {state: n for state, n in self.students_by_state.items() if n},
+        }
+
 
 class MonitorAgent(Agent):
     """
     Passively monitors the system by collecting event logs.
-    Calculates and prints performance metrics on shutdown.
+    Metrics are updated as events arrive (see MonitorMetrics) and can be
+    read at any time with snapshot(), or by sending a 'request' on the
+    MonitorProtocol. The full report is printed on shutdown.
+    If `event_store` is set (a SQLite path), every event is also persisted
+    there (see event_store.py).
     """
 
     async def setup(self):
-        self.event_log = []
-        self.start_time = time.time()
-        print(f"{self.name}: Monitor is online. Logging events...")
+        # Raw events are only kept in a bounded ring buffer; metrics never read it
+        log_size = self.get("event_log_size")
+        log_size = DEFAULT_EVENT_LOG_SIZE if log_size is None else log_size
+        self.event_log = deque(maxlen=log_size)
+        self.metrics = MonitorMetrics()
+        self.start_time = clock.time()
+        self.started_at = time.perf_counter()  # Wall clock, for the events/s throughput
+        self.log = get_logger("monitor", self.name)
+
+        self.event_store = None
+        store_path = self.get("event_store")
+        if store_path:
+            self.event_store = EventStore(store_path)
+            await self.event_store.open()
+            flush_interval = self.get("flush_interval") or DEFAULT_FLUSH_INTERVAL
+            # Timer only: a behaviour without a template would collect a copy of every message
+            nothing = Template()
+            nothing.set_metadata("protocol", "MonitorFlush")
+            self.add_behaviour(self.FlushEventsBehav(period=flush_interval), nothing)
+            self.log.info("Persisting events to {} (run {}).", store_path, self.event_store.run_id)
+        self.log.info("Monitor is online. Logging events...")
 
         # Template to listen for all 'inform' messages
         template = Template()
@@ -31,20 +163,43 @@ class MonitorAgent(Agent):
 
         self.add_behaviour(self.LogEventBehav(), template)
 
+        snapshot_template = Template()
+        snapshot_template.set_metadata("protocol", PROTOCOL_MONITOR)
+        snapshot_template.set_metadata("performative", "request")
+        self.add_behaviour(self.SnapshotResponderBehav(), snapshot_template)
+
+    def snapshot(self):
+        """Live metrics: the running aggregates plus the simulated time they refer to."""
+        snapshot = self.metrics.snapshot()
+        snapshot["timestamp"] = clock.time()
+        snapshot["runtime"] = snapshot["timestamp"] - self.start_time
+        return snapshot
+
+    async def stop(self):
+        # SPADE 4 has no takedown() hook, so print the report before disconnecting
+        if self.is_alive():
+            self.takedown()
+            if self.event_store:
+                await self.event_store.close()
+                self.log.info("{} events stored in {} (run {}).",
+                              self.event_store.written, self.event_store.path, self.event_store.run_id)
+        return await super().stop()
+
     def takedown(self):
         """
         Called when the agent is stopped.
-        This is where we calculate and print all metrics.
+        Prints the report from the running aggregates.
         """
+        flush_logs()  # Queued log lines first, so they don't interleave with the report
+        wall_time = time.perf_counter() - self.started_at
         print("\n" + "="*50)
         print(f"--- SYSTEM PERFORMANCE METRICS ---")
-        print(f"Simulation finished. Total runtime: {time.time() - self.start_time:.2f}s")
-        print(f"Total events logged: {len(self.event_log)}")
+        print(f"Simulation finished. Total runtime: {clock.time() - self.start_time:.2f}s (simulated)")
+        print(f"Total events logged: {self.metrics.events} (in {self.metrics.messages} telemetry messages)")
+        print(f"Monitor throughput: {self.metrics.events / wall_time:.1f} events/s over {wall_time:.1f}s wall clock")
         print("="*50 + "\n")
 
-        # --- Dictionaries to store processed data ---
-        self.starts = {e['student']: e for e in self.event_log if e['event'] == 'STUDENT_START'}
-        self.ends = {e['student']: e for e in self.event_log if e['event'] == 'STUDENT_FINISH'}
+        self.report_startup()
 
         # --- Run all metric calculations ---
         self.calculate_resource_utilization()
@@ -52,68 +207,104 @@ class MonitorAgent(Agent):
         self.calculate_time_to_help()
         self.calculate_learning_gains()
         self.summarize_student_learning() # <-- NEW SUMMARY
+        self.report_directory_traffic()
+        self.report_retries()
 
         print("="*50)
         print("--- End of Report ---")
-        
-        return super().takedown()
+
+    def report_startup(self):
+        """Metric: how long the launcher took to bring the population up (real seconds)."""
+        startup = self.get("startup")
+        if not startup:
+            return
+        print(f"### 0. Startup")
+        print(f"* Agents started: {startup['agents']} ({startup['tutors']} tutors, {startup['students']} students)")
+        print(f"* Total startup time: {startup['total_startup_s']:.2f}s (concurrency {startup['concurrency']})")
+        if startup.get('workers'):
+            print(f"    - Students sharded over {startup['workers']} worker process(es)")
+        print(f"    - Tutors started and registered: {startup['tutor_startup_s']:.2f}s")
+        print(f"    - Students started: {startup['student_startup_s']:.2f}s")
+        if startup['failed_to_start']:
+            print(f"    - Agents that failed to start: {startup['failed_to_start']}")
+        if startup['tutors_unregistered']:
+            print(f"    - Tutors never acknowledged by the directory: {startup['tutors_unregistered']}")
+        print("\n")
 
     def calculate_resource_utilization(self):
         """Metric: Resource utilization efficiency"""
-        resource_uses = [e for e in self.event_log if e['event'] == 'RESOURCE_PROVIDED']
         print(f"### 1. Resource Utilization")
-        print(f"* Total resources provided: {len(resource_uses)}")
-        # ... (rest of function is the same) ...
+        provided = self.metrics.by_event['RESOURCE_PROVIDED']
+        print(f"* Total resources provided: {provided}")
+        for topic, count in self.metrics.resources_by_topic.most_common():
+            print(f"    - {topic}: {count}")
+
+        # --- Cache and request coalescing ---
+        by_source = self.metrics.resources_by_source
+        mb = self.metrics.resource_mb_by_source
+        if provided:
+            shared = by_source["cache"] + by_source["coalesced"]
+            print(f"* Served from cache: {by_source['cache']} ({by_source['cache'] / provided:.0%} hit rate)")
+            print(f"* Coalesced with an in-flight download: {by_source['coalesced']}")
+            print(f"* Downloads: {by_source['download']} ({shared / provided:.0%} of requests avoided one)")
+            print(f"* Bandwidth: {mb['download']:.0f} MB downloaded, {mb['cache'] + mb['coalesced']:.0f} MB saved")
+
+        # --- Replicas ---
+        by_replica = self.metrics.resources_by_replica
+        if len(by_replica) > 1:
+            print(f"* Served by {len(by_replica)} replicas (Gini {gini(list(by_replica.values())):.3f}):")
+            for replica, count in sorted(by_replica.items()):
+                print(f"    - {replica.split('@')[0]}: {count}")
+        failovers = self.metrics.by_event["RESOURCE_FAILOVER"]
+        if failovers:
+            print(f"* Failovers after ERROR_SERVER_BUSY: {failovers}")
         print("\n")
 
     def calculate_tutor_workload(self):
         """Metric: Tutor workload balance"""
-        sessions = [e for e in self.event_log if e['event'] == 'SESSION_START']
-        workload = {}
-        for s in sessions:
-            tutor = s['tutor'].split('@')[0]
-            workload[tutor] = workload.get(tutor, 0) + 1
-        
+        workload = self.metrics.sessions_by_tutor
+
         print(f"### 2. Tutor Workload Balance")
-        print(f"* Total tutoring sessions: {len(sessions)}")
+        print(f"* Total tutoring sessions: {sum(workload.values())}")
         if workload:
             for tutor, count in workload.items():
-                print(f"    - {tutor}: {count} session(s)")
+                print(f"    - {tutor.split('@')[0]}: {count} session(s)")
         else:
             print(f"    - No tutors were engaged.")
+        # Tutors that never taught count as 0 sessions
+        startup = self.get("startup") or {}
+        idle = max(startup.get("tutors", 0) - len(workload), 0)
+        if workload:
+            print(f"* Workload Gini (0 = perfectly even): {gini(list(workload.values()) + [0] * idle):.3f}"
+                  f" over {len(workload) + idle} tutors")
+        refused = self.metrics.by_event["CFP_REFUSED_LOAD"]
+        if refused:
+            print(f"* CFPs refused by admission control: {refused}")
+        fanout = self.metrics.cfp_fanout
+        if fanout.count:
+            print(f"* CFP rounds: {fanout.count}, tutors contacted per round: {fanout.mean:.1f} avg / {fanout.max} max")
         print("\n")
 
     def calculate_time_to_help(self):
         """Metric: Average time to resolve learning difficulties"""
-        help_requests = {e['student']: e['timestamp'] for e in self.event_log if e['event'] == 'STUDENT_REQUEST_HELP'}
-        tutor_founds = {e['student']: e['timestamp'] for e in self.event_log if e['event'] == 'STUDENT_FOUND_TUTOR'}
-        
-        timings = []
-        for student_jid, start_time in help_requests.items():
-            if student_jid in tutor_founds:
-                end_time = tutor_founds[student_jid]
-                timings.append(end_time - start_time)
-        
+        timings = self.metrics.time_to_help
+
         print(f"### 3. Time to Resolve Difficulties")
-        if timings:
-            print(f"* Average time to find a tutor: {np.mean(timings):.2f}s")
-            print(f"* Max time: {np.max(timings):.2f}s / Min time: {np.min(timings):.2f}s")
+        if timings.count:
+            print(f"* Average time to find a tutor: {timings.mean:.2f}s")
+            print(f"* Max time: {timings.max:.2f}s / Min time: {timings.min:.2f}s")
+            print(f"* p50: {timings.quantile(0.5):.2f}s / p95: {timings.quantile(0.95):.2f}s / p99: {timings.quantile(0.99):.2f}s")
         else:
             print(f"* No tutor requests were successfully resolved.")
         print("\n")
-        
+
     def calculate_learning_gains(self):
         """Metric: Student learning gains"""
-        gains = []
-        for student_jid, start_event in self.starts.items():
-            if student_jid in self.ends:
-                end_event = self.ends[student_jid]
-                gain = end_event['knowledge'] - start_event['knowledge']
-                gains.append(gain)
-                
+        gains = self.metrics.learning_gain
+
         print(f"### 4. Student Learning Gains")
-        if gains:
-            print(f"* Average knowledge gain: {np.mean(gains):.2f}")
+        if gains.count:
+            print(f"* Average knowledge gain: {gains.mean:.2f}")
         else:
             print(f"* No student lifecycles were completed.")
         print("\n")
@@ -124,13 +315,14 @@ class MonitorAgent(Agent):
     def summarize_student_learning(self):
         """Summary of which students learned what."""
         print(f"### 5. Student Learning Summary")
-        
+        starts = self.metrics.starts
+
         completed_count = 0
-        for student_jid, start_event in self.starts.items():
+        for student_jid, start_event in starts.items():
             student_name = student_jid.split('@')[0]
             topic = start_event['topic']
-            
-            if student_jid in self.ends:
+
+            if student_jid in self.metrics.finished:
                 # This student finished
                 print(f"    - ✅ {student_name}: Successfully learned '{topic}'")
                 completed_count += 1
@@ -138,26 +330,87 @@ class MonitorAgent(Agent):
                 # This student did not finish
                 print(f"    - ❌ {student_name}: Did NOT finish learning '{topic}'")
 
-        if not self.starts:
+        if not starts:
             print("    - No students started the learning process.")
-        
-        print(f"\n* Total completed: {completed_count} / {len(self.starts)}")
+
+        print(f"\n* Total completed: {completed_count} / {len(starts)}")
         print("\n")
 
 
+    def report_directory_traffic(self):
+        """Metric: directory messages saved by the students' tutor-list caches."""
+        queries = self.metrics.by_event["DIRECTORY_QUERY"]
+        hits = self.metrics.by_event["DIRECTORY_CACHE_HIT"]
+        invalidated = self.metrics.by_event["DIRECTORY_INVALIDATED"]
+        lookups = queries + hits
+
+        print(f"### 6. Directory Traffic")
+        if lookups:
+            # Every query is a request plus a reply; invalidations are one push each
+            print(f"* Tutor lookups: {lookups} ({hits} served from cache, {hits / lookups:.0%} hit rate)")
+            print(f"* Directory messages without cache: {lookups * 2}")
+            print(f"* Directory messages with cache: {queries * 2 + invalidated} "
+                  f"({queries} queries, {invalidated} cache entries invalidated)")
+        else:
+            print(f"* No directory lookups.")
+        print("\n")
+
+    def report_retries(self):
+        """Metric: how many extra requests the students' retries generated."""
+        retries = self.metrics.retries_by_reason
+        print(f"### 7. Retries")
+        if not retries:
+            print(f"* No retries.")
+            print("\n")
+            return
+        delay = self.metrics.retry_delay
+        print(f"* Retries: {sum(retries.values())} (backoff {delay.mean:.1f}s avg / {delay.max:.1f}s max)")
+        for reason, count in retries.most_common():
+            print(f"    - {reason}: {count}")
+        provided = self.metrics.by_event["RESOURCE_PROVIDED"]
+        if provided:
+            # Every ERROR_SERVER_BUSY ended in a failover or a retry
+            sent = provided + self.metrics.by_event["RESOURCE_FAILOVER"] + retries["resource_busy"]
+            print(f"* Resource requests per resource served: {sent / provided:.2f}")
+        print("\n")
+
     class LogEventBehav(CyclicBehaviour):
         """
-        This behaviour runs forever, listening for messages
-        matching the template and adding them to the agent's log.
+        This behaviour runs forever, listening for messages matching the
+        template, updating the running metrics and (if enabled) the raw log.
+        A message holds either one event or a batch: {"events": [...]}.
         """
         async def run(self):
             msg = await self.receive(timeout=1000)
             if msg:
                 try:
                     data = json.loads(msg.body)
-                    print(f"[Monitor]: Logged '{data['event']}'")
+                    events = data["events"] if "events" in data else [data]
+                    self.agent.metrics.messages += 1
                     # Add timestamp *at time of logging* for accuracy
-                    data['log_time'] = time.time()
-                    self.agent.event_log.append(data)
+                    log_time = clock.time()
+                    for event in events:
+                        self.agent.log.trace("Logged '{}'", event["event"])
+                        event['log_time'] = log_time
+                        self.agent.metrics.ingest(event)
+                        if self.agent.event_log.maxlen:
+                            self.agent.event_log.append(event)
+                        if self.agent.event_store:
+                            await self.agent.event_store.append(event)
                 except Exception as e:
-                    print(f"{self.agent.name}: Error processing log message: {e}")
\ No newline at end of file
+                    self.agent.log.error("Error processing log message: {}", e)
+
+    class FlushEventsBehav(PeriodicBehaviour):
+        """Writes buffered events to the event store even when batches fill slowly."""
+        async def run(self):
+            await self.agent.event_store.flush()
+
+    class SnapshotResponderBehav(CyclicBehaviour):
+        """Answers MonitorProtocol 'request' messages with the live metrics snapshot."""
+        async def run(self):
+            msg = await self.receive(timeout=1000)
+            if msg:
+                reply = msg.make_reply()
+                reply.set_metadata("performative", "inform")
+                reply.body = json.dumps(self.agent.snapshot())
+                await self.send(reply)
@@ -2,38 +2,144 @@
 # (MODIFIED - LIMITED BANDWIDTH)
 
 import asyncio
-import json
-import time
 import random
+from collections import OrderedDict
 from spade.agent import Agent
-from spade.behaviour import CyclicBehaviour
+from spade.behaviour import CyclicBehaviour, OneShotBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from sim_clock import clock
+from logs import get_logger
+from resource_catalogue import open_catalogue
+from protocols.codec import (
+    ERROR_NOT_FOUND, ERROR_SERVER_BUSY, CodecError, Material, QueueTicket, ReplicaLoad, ResourceError, Topic,
+    decode, encode,
+)
+from protocols.telemetry import TelemetryBehav, telemetry_template
+
 # Definitions
 PROTOCOL_RESOURCE_REQUEST = "ResourceProtocol"
+PROTOCOL_DIRECTORY = "DirectoryProtocol"
+DIRECTORY_AGENT_JID = "directory@localhost"
 MONITOR_AGENT_JID = "monitor@localhost"
+SERVICE_NAME = "resource"  # Replicas are listed under this service in the directory
+
+# Directory registration retries
+REGISTRATION_ATTEMPTS = 3
+REGISTRATION_TIMEOUT = 10
+
+# Min simulated seconds between two load updates sent to the directory
+STATUS_INTERVAL = 2.0
+
+# Simulated download duration (seconds)
+DOWNLOAD_TIME_RANGE = (5, 10)
+AVERAGE_DOWNLOAD_TIME = sum(DOWNLOAD_TIME_RANGE) / 2
+
+# Hot materials cache
+CACHE_HIT_TIME = 0.5             # Simulated seconds to serve a cached material
+DEFAULT_CACHE_SIZE_MB = 100      # Cache capacity
+
+# Served when no catalogue file is configured (resource.catalogue)
+DEFAULT_RESOURCES = {
+    "mathematics": "https://www.math-videos.com/algebra-basics",
+    "physics": "https://www.physics-explained.com/newtons-laws",
+    "history": "https://www.history-channel.com/ww2-overview",
+    "biology": "https://www.biology-world.com/cells"
+}
+
+
+class ContentCache:
+    """
+    LRU cache of downloaded materials, bounded by total size (MB).
+    Least recently served materials are evicted first.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()  # key -> (content, size)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, content, size):
+        if size > self.max_size:
+            return
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (content, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def __contains__(self, key):
+        return key in self.entries
+
 
 class ResourceAgent(Agent):
     """
     Manages educational materials.
+    Materials come from a catalogue (resource_catalogue.py); each request
+    gets the one matching the student's knowledge and learning style.
     *** NEW: Simulates limited bandwidth. ***
+    Up to `max_bandwidth` downloads run at once; extra requests wait in a
+    bounded FIFO queue and are told their position and ETA.
+    Recently served materials are kept in an LRU cache and served at a
+    fast-path cost without taking a slot, and concurrent requests for the
+    same material share one in-flight download.
+    Any number of replicas can run: each registers with the DirectoryAgent
+    as a "resource" replica and publishes its load there, and students
+    pick between them (see student_agent.ReplicaSet).
     """
 
+    # --- Load published to the directory: setting either flags a change ---
+    @property
+    def current_load(self):
+        return self._current_load
+
+    @current_load.setter
+    def current_load(self, value):
+        self._current_load = value
+        self.load_changed.set()
+
+    @property
+    def queue_length(self):
+        return self._queue_length
+
+    @queue_length.setter
+    def queue_length(self, value):
+        self._queue_length = value
+        self.load_changed.set()
+
+    def load(self):
+        """Requests in the system per download slot (above 1 means requests wait)."""
+        return round((self.current_load + self.queue_length) / self.max_bandwidth, 2)
+
     async def setup(self):
-        # --- Knowledge Base (Simple resource database) ---
-        self.resources = {
-            "mathematics": "https://www.math-videos.com/algebra-basics",
-            "physics": "https://www.physics-explained.com/newtons-laws",
-            "history": "https://www.history-channel.com/ww2-overview",
-            "biology": "https://www.biology-world.com/cells"
-        }
+        # --- Knowledge Base (catalogue file, or the built-in links) ---
+        self.catalogue = open_catalogue(self.get("catalogue"), DEFAULT_RESOURCES)
         
         # --- NEW: Bandwidth Management ---
-        self.max_bandwidth = 2  # Can only serve 2 students at a time
+        self.max_bandwidth = self.get("max_bandwidth") or 2  # Can only serve 2 students at a time
+        self.max_queue = self.get("max_queue") or 10          # Students allowed to wait for a slot
+        self.load_changed = asyncio.Event()
         self.current_load = 0   # How many students are currently downloading
+        self.queue_length = 0   # How many admitted students are waiting for a slot
+        self.download_slots = asyncio.Semaphore(self.max_bandwidth)
+        self.downloads = set()  # Running download tasks
+
+        # --- Hot materials cache and in-flight downloads (request coalescing) ---
+        self.content_cache = ContentCache(self.get("cache_size_mb") or DEFAULT_CACHE_SIZE_MB)
+        self.in_flight = {}     # key -> Future of the download every requester shares
 
-        print(f"{self.name}: Ready. Max bandwidth: {self.max_bandwidth}.")
+        self.log = get_logger("resource", self.name)
+        self.log.info("Ready. Max bandwidth: {}. Max queue: {}.", self.max_bandwidth, self.max_queue)
 
         template = Template()
         template.set_metadata("protocol", PROTOCOL_RESOURCE_REQUEST)
@@ -41,55 +147,228 @@ class ResourceAgent(Agent):
 
         self.add_behaviour(self.ResourceResponderBehav(), template)
 
-    def get_resource_for_topic(self, topic):
-        return self.resources.get(topic.lower().strip())
+        # --- Monitor events are batched (protocols/telemetry.py) ---
+        self.telemetry = TelemetryBehav(MONITOR_AGENT_JID, **(self.get("telemetry") or {}))
+        self.add_behaviour(self.telemetry, telemetry_template())
+
+        # --- Register as a replica with the Directory Agent, then publish load changes ---
+        self.registered = asyncio.Event()
+        ack_template = Template()
+        ack_template.set_metadata("protocol", PROTOCOL_DIRECTORY)
+        ack_template.set_metadata("performative", "agree")
+        self.add_behaviour(self.RegisterWithDirectoryBehav(), ack_template)
+
+        self.status_interval = self.get("status_interval") or STATUS_INTERVAL
+        status_template = Template()  # Nothing is ever received on this template
+        status_template.set_metadata("protocol", PROTOCOL_DIRECTORY)
+        status_template.set_metadata("performative", "status")
+        self.add_behaviour(self.PublishLoadBehav(), status_template)
+
+    def directory_message(self, performative):
+        msg = Message(to=DIRECTORY_AGENT_JID)
+        msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
+        msg.set_metadata("performative", performative)
+        msg.set_metadata("service", SERVICE_NAME)
+        return msg
+
+    class RegisterWithDirectoryBehav(OneShotBehaviour):
+        """Lists this agent as a resource replica; retries until the directory acknowledges."""
+        async def run(self):
+            for attempt in range(1, REGISTRATION_ATTEMPTS + 1):
+                await self.send(self.agent.directory_message("register"))
+                if await clock.receive(self, REGISTRATION_TIMEOUT):
+                    self.agent.registered.set()
+                    self.agent.log.info("Registered with Directory as a '{}' replica.", SERVICE_NAME)
+                    return
+            self.agent.log.warning("Directory never acknowledged registration.")
+
+    class PublishLoadBehav(CyclicBehaviour):
+        """
+        Sends a ReplicaLoad to the DirectoryAgent (and the MonitorAgent) when it
+        changed, at most once per `status_interval` simulated seconds.
+        """
+        async def on_start(self):
+            self.published = 0.0  # What the directory assumes on registration
+
+        async def run(self):
+            await self.agent.registered.wait()
+            await self.agent.load_changed.wait()
+            self.agent.load_changed.clear()
+            load = self.agent.load()
+            if load == self.published:
+                return
+            msg = self.agent.directory_message("status")
+            encode(msg, ReplicaLoad(load))
+            await self.send(msg)
+            self.published = load
+            self.agent.telemetry.report({
+                "event": "RESOURCE_LOAD", "replica": str(self.agent.jid), "load": load,
+                "downloading": self.agent.current_load, "queued": self.agent.queue_length,
+                "timestamp": clock.time()
+            })
+            await clock.sleep(self.agent.status_interval)
+
+    class DeregisterFromDirectoryBehav(OneShotBehaviour):
+        async def run(self):
+            await self.send(self.agent.directory_message("deregister"))
+
+    async def stop(self):
+        # Leave the directory and send the buffered monitor events before disconnecting
+        if self.is_alive():
+            deregister = self.DeregisterFromDirectoryBehav()
+            self.add_behaviour(deregister)
+            await deregister.join(timeout=5)
+            await self.telemetry.flush()
+        result = await super().stop()
+        self.catalogue.close()
+        return result
+
+    @staticmethod
+    def resource_key(topic):
+        return topic.lower().strip()
+
+    def recommend(self, msg):
+        """The catalogue material for the request's topic, student knowledge and learning style."""
+        knowledge = msg.get_metadata("knowledge")
+        return self.catalogue.lookup(
+            self.resource_key(decode(msg, Topic).topic),
+            knowledge=float(knowledge) if knowledge else None,
+            style=msg.get_metadata("learning_style") or None,
+        )
+
+    def track(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.downloads.add(task)
+        task.add_done_callback(self.downloads.discard)
+
+    def retry_after(self):
+        """Seconds until a full queue should have room again: one download slot freeing up."""
+        return AVERAGE_DOWNLOAD_TIME / self.max_bandwidth
+
+    def estimate_wait(self, position):
+        """ETA (seconds) until the student at `position` in the queue gets its resource."""
+        rounds = (position + self.max_bandwidth - 1) // self.max_bandwidth
+        return (rounds + 1) * AVERAGE_DOWNLOAD_TIME
 
     class ResourceResponderBehav(CyclicBehaviour):
+        """
+        Picks the material for each request and hands it to its own task.
+        Cached materials and materials already being downloaded are served
+        right away without a slot. Other downloads run concurrently up to
+        `max_bandwidth`; the rest wait in FIFO order. Requests are only
+        refused when the queue is full.
+        """
+
         async def run(self):
-            print(f"{self.agent.name}: Waiting... (Load: {self.agent.current_load}/{self.agent.max_bandwidth})")
+            self.agent.log.trace("Waiting... (Load: {}/{}, Queue: {}/{})", self.agent.current_load,
+                                 self.agent.max_bandwidth, self.agent.queue_length, self.agent.max_queue)
             msg = await self.receive(timeout=1000)
+            if not msg:
+                return
 
-            if msg:
-                topic_requested = msg.body
-                print(f"{self.agent.name}: Received request for '{topic_requested}' from {str(msg.sender)}")
+            try:
+                topic = decode(msg, Topic).topic
+            except CodecError as e:
+                self.agent.log.warning("Unreadable request from {}: {}", msg.sender, e)
+                return
+            self.agent.log.debug("Received request for '{}' from {}", topic, msg.sender)
 
-                # 1. Check bandwidth
-                if self.agent.current_load >= self.agent.max_bandwidth:
-                    # --- Server is busy ---
-                    print(f"{self.agent.name}: Server busy. Rejecting request.")
+            material = self.agent.recommend(msg)
+            if material is None:
+                await self.reply(msg, None, "catalogue")
+                return
+
+            # 0. Fast paths: hot material, or a download of it already under way
+            key = material["id"]
+            if key in self.agent.content_cache or key in self.agent.in_flight:
+                self.agent.track(self.serve_shared(msg, key))
+                return
+
+            # 1. Check bandwidth
+            in_system = self.agent.current_load + self.agent.queue_length
+            if in_system >= self.agent.max_bandwidth:
+                position = in_system - self.agent.max_bandwidth + 1
+                if position > self.agent.max_queue:
+                    # --- Server is busy and the queue is full ---
+                    self.agent.log.info("Server busy and queue full. Rejecting request.")
                     reply = msg.make_reply()
                     reply.set_metadata("performative", "failure") # Use 'failure'
-                    reply.body = "ERROR_SERVER_BUSY"
+                    reply.set_metadata("retry_after", f"{self.agent.retry_after():.1f}")
+                    encode(reply, ResourceError(ERROR_SERVER_BUSY))
                     await self.send(reply)
                     return # Stop processing this message
 
-                # 2. Get resource (if not busy)
-                self.agent.current_load += 1 # Occupy a slot
-                resource_link = self.agent.get_resource_for_topic(topic_requested)
+                # --- Tell the student where it is in the queue ---
                 reply = msg.make_reply()
-                reply.set_metadata("performative", "inform")
-
-                if resource_link:
-                    # --- Simulate download time ---
-                    print(f"{self.agent.name}: Serving resource... (Load: {self.agent.current_load}/{self.agent.max_bandwidth})")
-                    await asyncio.sleep(random.randint(5, 10)) # Download takes 5-10s
-                    
-                    reply.body = resource_link
-                    
-                    # --- Report to monitor ---
-                    monitor_msg = Message(to=MONITOR_AGENT_JID)
-                    monitor_msg.set_metadata("protocol", "MonitorProtocol")
-                    monitor_msg.set_metadata("performative", "inform")
-                    monitor_msg.body = json.dumps({
-                        "event": "RESOURCE_PROVIDED", "student": str(msg.sender),
-                        "topic": topic_requested, "resource": resource_link,
-                        "timestamp": time.time()
-                    })
-                    await self.send(monitor_msg)
-                else:
-                    reply.body = "ERROR_NOT_FOUND"
-
-                # 3. Send reply and free up slot
+                reply.set_metadata("performative", "agree")
+                encode(reply, QueueTicket(position, self.agent.estimate_wait(position)))
                 await self.send(reply)
-                print(f"{self.agent.name}: Sent reply: {reply.body}")
-                self.agent.current_load -= 1 # Free up the slot
\ No newline at end of file
+                self.agent.log.debug("Server busy. Queued request at position {}.", position)
+
+            # 2. Serve it in the background so the next request can be admitted
+            self.agent.queue_length += 1
+            self.agent.track(self.serve(msg, material))
+
+        async def serve_shared(self, msg, key):
+            """Serves from the cache, or waits for the download another request started."""
+            material = self.agent.content_cache.get(key)
+            if material is not None:
+                source = "cache"
+                await clock.sleep(CACHE_HIT_TIME)
+            else:
+                source = "coalesced"
+                material = await asyncio.shield(self.agent.in_flight[key])
+            await self.reply(msg, material, source)
+
+        async def serve(self, msg, material):
+            key = material["id"]
+            async with self.agent.download_slots:
+                self.agent.queue_length -= 1
+                self.agent.current_load += 1 # Occupy a slot
+                try:
+                    if key in self.agent.content_cache or key in self.agent.in_flight:
+                        # Became available while we were queued
+                        await self.serve_shared(msg, key)
+                    else:
+                        await self.reply(msg, await self.download(material), "download")
+                finally:
+                    self.agent.current_load -= 1 # Free up the slot
+
+        async def download(self, material):
+            """Fetches a material once; concurrent requests for it share the result."""
+            key = material["id"]
+            in_flight = asyncio.get_running_loop().create_future()
+            self.agent.in_flight[key] = in_flight
+            try:
+                # --- Simulate download time ---
+                self.agent.log.debug("Serving resource... (Load: {}/{})", self.agent.current_load, self.agent.max_bandwidth)
+                await clock.sleep(random.randint(*DOWNLOAD_TIME_RANGE)) # Download takes 5-10s
+                self.agent.content_cache.put(key, material, material["size_mb"])
+                in_flight.set_result(material)
+                return material
+            finally:
+                del self.agent.in_flight[key]
+                if not in_flight.done():
+                    in_flight.set_result(None)  # Download was interrupted; waiters get ERROR_NOT_FOUND
+
+        async def reply(self, msg, material, source):
+            reply = msg.make_reply()
+            reply.set_metadata("performative", "inform")
+
+            if material:
+                encode(reply, Material(material["url"], material["title"], material["difficulty"], material["style"]))
+
+                # --- Report to monitor ---
+                self.agent.telemetry.report({
+                    "event": "RESOURCE_PROVIDED", "student": str(msg.sender),
+                    "topic": decode(msg, Topic).topic, "resource": material["url"], "source": source,
+                    "size_mb": material["size_mb"], "difficulty": material["difficulty"],
+                    "replica": str(self.agent.jid),
+                    "timestamp": clock.time()
+                })
+            else:
+                encode(reply, ResourceError(ERROR_NOT_FOUND))
+
+            # 3. Send reply
+            await self.send(reply)
+            self.agent.log.debug("Sent reply: {} ({})", reply.body, source)
@@ -1,19 +1,29 @@
 # project/agents/student_agent.py
 # (COMPLETE VERSION - INCLUDES ATTENTION SPAN & BANDWIDTH HANDLING)
 
-import asyncio
-import json
 import random
-import time
 from spade.agent import Agent
-from spade.behaviour import FSMBehaviour, State, OneShotBehaviour
+from spade.behaviour import FSMBehaviour, State, CyclicBehaviour, OneShotBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from sim_clock import clock
+from retry import RetryPolicy
+from logs import get_logger
+from onthology import PERFORMATIVE_PROPOSE, PERFORMATIVE_REFUSE
+from protocols.codec import (
+    ERROR_SERVER_BUSY, CodecError, Material, QueueTicket, ReplicaLoads, ResourceError, SessionStart, Topic, TutorList,
+    decode, encode,
+)
+from protocols.contract_net import ContractNetInitiatorBehav, cnp_template
+from protocols.conversations import ConversationRouterBehav
+from protocols.telemetry import TelemetryBehav, telemetry_template
+
 # --- FSM State Definitions ---
 STATE_START = "STATE_START"
 STATE_REQUEST_RESOURCES = "STATE_REQUEST_RESOURCES"
 STATE_AWAIT_RESOURCES = "STATE_AWAIT_RESOURCES"
+STATE_AWAIT_REPLICAS = "STATE_AWAIT_REPLICAS"
 STATE_EVALUATE_KNOWLEDGE = "STATE_EVALUATE_KNOWLEDGE"
 STATE_QUERY_DIRECTORY = "STATE_QUERY_DIRECTORY"
 STATE_AWAIT_DIRECTORY = "STATE_AWAIT_DIRECTORY"
@@ -25,7 +35,7 @@ STATE_TAKE_BREAK = "STATE_TAKE_BREAK"
 STATE_FINISH = "STATE_FINISH"
 
 # --- Agent JIDs ---
-RESOURCE_AGENT_JID = "resource_manager@localhost"
+RESOURCE_AGENT_JID = "resource_manager@localhost"  # Used when the directory lists no resource replicas
 DIRECTORY_AGENT_JID = "directory@localhost"
 MONITOR_AGENT_JID = "monitor@localhost"
 
@@ -33,6 +43,105 @@ MONITOR_AGENT_JID = "monitor@localhost"
 PROTOCOL_RESOURCE = "ResourceProtocol"
 PROTOCOL_CNP = "fipa-contract-net"
 PROTOCOL_DIRECTORY = "DirectoryProtocol"
+SERVICE_RESOURCE = "resource"
+
+# Proposals logged (DEBUG) when selecting a tutor
+SHOW_TOP_PROPOSALS = 5
+
+# Simulated seconds a directory answer is reused (0 = always ask the directory)
+DEFAULT_DIRECTORY_CACHE_TTL = 60
+# Simulated seconds the resource replica loads are reused (0 = ask before every request)
+DEFAULT_REPLICA_TTL = 30
+# Max simulated seconds before the first request (spreads out students started together)
+START_JITTER = 1.0
+
+
+class TutorListCache:
+    """
+    Directory answers (topic -> tutor JIDs) kept for `ttl` simulated
+    seconds, or until the directory sends an 'invalidate' for the topic.
+    Only unranked answers are cached: the directory invalidates on
+    registration changes, not on the load updates a top_k /
+    available_only answer depends on.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}  # topic -> (tutors, expires at)
+
+    def get(self, topic):
+        entry = self.entries.get(topic)
+        if entry is None:
+            return None
+        tutors, expires_at = entry
+        if clock.elapsed() >= expires_at:
+            del self.entries[topic]
+            return None
+        return list(tutors)
+
+    def put(self, topic, tutors):
+        if self.ttl > 0:
+            self.entries[topic] = (list(tutors), clock.elapsed() + self.ttl)
+
+    def invalidate(self, topic):
+        return self.entries.pop(topic, None) is not None
+
+
+class ReplicaSet:
+    """
+    Resource replicas and the load each one advertised in the directory,
+    refreshed every `ttl` simulated seconds.
+    A request goes to the less loaded of two random replicas (power of
+    two choices): nearly as good as the least loaded one, without every
+    student piling onto the same replica between two refreshes. Replicas
+    that answered ERROR_SERVER_BUSY are skipped until a request succeeds.
+    When the directory does not answer, the last known replicas are kept;
+    RESOURCE_AGENT_JID is only used until a first list arrives.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.loads = {}      # jid -> advertised load
+        self.listed = False  # A list ever came from the directory
+        self.expires_at = None
+        self.busy = set()    # Replicas that turned the current request away
+        self.retry_after = None  # Shortest retry-after hint among them
+
+    def stale(self):
+        return self.expires_at is None or clock.elapsed() >= self.expires_at
+
+    def update(self, loads):
+        self.loads = dict(loads) or {RESOURCE_AGENT_JID: 0.0}
+        self.listed = True
+        self.expires_at = clock.elapsed() + self.ttl
+        self.busy &= set(self.loads)
+
+    def keep(self):
+        """The directory did not answer: reuse the last known replicas for another `ttl`."""
+        if self.listed:
+            self.expires_at = clock.elapsed() + self.ttl
+        else:
+            self.loads = {RESOURCE_AGENT_JID: 0.0}  # Nothing known yet; ask again next time
+
+    def invalidate(self):
+        self.expires_at = None
+
+    def choose(self):
+        """A replica for the next request, or None if all of them are busy."""
+        candidates = [jid for jid in self.loads if jid not in self.busy]
+        if len(candidates) < 2:
+            return candidates[0] if candidates else None
+        first, second = random.sample(candidates, 2)
+        return min(first, second, key=self.loads.get)
+
+    def mark_busy(self, jid, retry_after=None):
+        self.busy.add(jid)
+        if retry_after is not None:
+            self.retry_after = retry_after if self.retry_after is None else min(self.retry_after, retry_after)
+
+    def reset(self):
+        self.busy.clear()
+        self.retry_after = None
 
 
 class StudentAgent(Agent):
@@ -42,28 +151,51 @@ class StudentAgent(Agent):
     - Reports key events to the MonitorAgent.
     - Manages an "attention span" and must take breaks.
     - Handles resource server "busy" errors.
+    - Retries busy/empty/unanswered steps with jittered exponential
+      backoff (retry.RetryPolicy), reporting each retry to the monitor.
     """
 
     async def setup(self):
+        self.log = get_logger("student", self.name)
+
         # --- Student Profile ---
         self.topic_needed = self.get("topic_needed") or "biology"
         self.knowledge = self.get("knowledge") or 0.1
+        self.learning_style = self.get("learning_style")  # Preferred material style (None = any)
+        self.retry = RetryPolicy(**(self.get("retry") or {}))
+        self.report_states = self.get("report_states") or False  # STUDENT_STATE per transition (dashboard)
         self.knowledge_goal = 0.9
         self.attention = 100  
 
         # Initialize shared FSM variables
-        self.proposals = []
+        self.negotiation = None  # Current contract-net round (protocols.contract_net.Negotiation)
+        self.proposal_deadline = self.get("proposal_deadline") or 5.0  # Max seconds to collect proposals
+        self.proposals_good_enough = self.get("proposals_good_enough")  # Stop after N proposals (None = wait for all)
         self.received_resource_effectiveness = 0.0
+        self.resource_eta = None  # Set when the resource server queues our request
+        self.resource_server = None  # Replica the current resource request went to
+        self.resource_thread = None  # Conversation of the current resource request
+        self.directory_thread = None  # Conversation of the last directory query
+        replica_ttl = self.get("resource_replica_ttl")
+        self.resource_replicas = ReplicaSet(DEFAULT_REPLICA_TTL if replica_ttl is None else replica_ttl)
         self.available_tutors = []
         self.selected_tutor = None
+        self.tutoring_eta = None  # Set when the selected tutor queues our session
+        self.directory_top_k = self.get("directory_top_k")  # Ask for the k least loaded tutors (None = all)
+        self.directory_available_only = self.get("directory_available_only") or False
+        cache_ttl = self.get("directory_cache_ttl")
+        if self.directory_top_k or self.directory_available_only:
+            cache_ttl = 0  # Ranked answers go stale with every tutor status update
+        self.tutor_cache = TutorListCache(DEFAULT_DIRECTORY_CACHE_TTL if cache_ttl is None else cache_ttl)
 
-        print(f"{self.name}: Ready. Topic: '{self.topic_needed}'. Knowledge: {self.knowledge}. Attention: {self.attention}%")
+        self.log.info("Ready. Topic: '{}'. Knowledge: {}. Attention: {}%", self.topic_needed, self.knowledge, self.attention)
 
         fsm = StudentFSM()
         # Register states
         fsm.add_state(name=STATE_START, state=StartState(), initial=True)
         fsm.add_state(name=STATE_REQUEST_RESOURCES, state=RequestResourcesState())
         fsm.add_state(name=STATE_AWAIT_RESOURCES, state=AwaitResourcesState())
+        fsm.add_state(name=STATE_AWAIT_REPLICAS, state=AwaitReplicasState())
         fsm.add_state(name=STATE_EVALUATE_KNOWLEDGE, state=EvaluateKnowledgeState())
         fsm.add_state(name=STATE_QUERY_DIRECTORY, state=QueryDirectoryState())
         fsm.add_state(name=STATE_AWAIT_DIRECTORY, state=AwaitDirectoryState())
@@ -77,18 +209,17 @@ class StudentAgent(Agent):
         # Define transitions
         fsm.add_transition(source=STATE_START, dest=STATE_REQUEST_RESOURCES)
         fsm.add_transition(source=STATE_REQUEST_RESOURCES, dest=STATE_AWAIT_RESOURCES)
+        fsm.add_transition(source=STATE_REQUEST_RESOURCES, dest=STATE_AWAIT_REPLICAS) # Replica loads are stale
+        fsm.add_transition(source=STATE_AWAIT_REPLICAS, dest=STATE_AWAIT_RESOURCES)
         fsm.add_transition(source=STATE_AWAIT_RESOURCES, dest=STATE_EVALUATE_KNOWLEDGE)
-        fsm.add_transition(source=STATE_AWAIT_RESOURCES, dest=STATE_REQUEST_RESOURCES) # For server busy
-        
-        # --- THIS IS THE FIX ---
-        # Allow the state to transition to itself to re-queue bad messages
-        fsm.add_transition(source=STATE_AWAIT_RESOURCES, dest=STATE_AWAIT_RESOURCES)
+        fsm.add_transition(source=STATE_AWAIT_RESOURCES, dest=STATE_REQUEST_RESOURCES) # Server busy: fail over or retry
 
         fsm.add_transition(source=STATE_EVALUATE_KNOWLEDGE, dest=STATE_FINISH)
         fsm.add_transition(source=STATE_EVALUATE_KNOWLEDGE, dest=STATE_TAKE_BREAK)
         fsm.add_transition(source=STATE_EVALUATE_KNOWLEDGE, dest=STATE_QUERY_DIRECTORY)
         fsm.add_transition(source=STATE_TAKE_BREAK, dest=STATE_EVALUATE_KNOWLEDGE)
         fsm.add_transition(source=STATE_QUERY_DIRECTORY, dest=STATE_AWAIT_DIRECTORY)
+        fsm.add_transition(source=STATE_QUERY_DIRECTORY, dest=STATE_START_CNP) # Cached tutor list
         fsm.add_transition(source=STATE_AWAIT_DIRECTORY, dest=STATE_START_CNP)
         fsm.add_transition(source=STATE_AWAIT_DIRECTORY, dest=STATE_START)
         fsm.add_transition(source=STATE_START_CNP, dest=STATE_AWAIT_PROPOSALS)
@@ -96,98 +227,246 @@ class StudentAgent(Agent):
         fsm.add_transition(source=STATE_AWAIT_PROPOSALS, dest=STATE_START)
         fsm.add_transition(source=STATE_SELECT_TUTOR, dest=STATE_AWAIT_TUTORING)
         fsm.add_transition(source=STATE_AWAIT_TUTORING, dest=STATE_EVALUATE_KNOWLEDGE)
+        fsm.add_transition(source=STATE_AWAIT_TUTORING, dest=STATE_SELECT_TUTOR) # Fall back to the next best proposal
         fsm.add_transition(source=STATE_AWAIT_TUTORING, dest=STATE_START)
 
-        self.add_behaviour(fsm)
-        self.add_behaviour(self.ReportStartBehav())
+        # --- Contract Net initiator: receives every proposal/refusal ---
+        answers = cnp_template(PERFORMATIVE_PROPOSE, PERFORMATIVE_REFUSE)
+        # Ranking of proposals is pluggable (protocols.contract_net.ScoringPolicy)
+        self.cnp = ContractNetInitiatorBehav(self.get("scoring_policy"))
+        self.add_behaviour(self.cnp, answers)
+
+        # --- Monitor events are batched (protocols/telemetry.py) ---
+        self.telemetry = TelemetryBehav(MONITOR_AGENT_JID, **(self.get("telemetry") or {}))
+        self.add_behaviour(self.telemetry, telemetry_template())
+
+        # --- Directory pushes 'invalidate' when a cached topic changes ---
+        invalidations = Template()
+        invalidations.set_metadata("protocol", PROTOCOL_DIRECTORY)
+        invalidations.set_metadata("performative", "invalidate")
+        self.add_behaviour(self.DirectoryInvalidationBehav(), invalidations)
+
+        # --- Every other reply is routed to the state waiting for its conversation ---
+        self.conversations = ConversationRouterBehav()
+        self.add_behaviour(self.conversations, ~answers & ~invalidations)
+
+        # States receive through self.agent.conversations; the FSM itself gets nothing
+        nothing = Template()
+        nothing.set_metadata("protocol", "StudentFSM")
+        self.add_behaviour(fsm, nothing)
+        self.telemetry.report({
+            "event": "STUDENT_START", "student": str(self.jid),
+            "knowledge": self.knowledge, "goal": self.knowledge_goal,
+            "topic": self.topic_needed, "timestamp": clock.time()
+        })
 
-    class ReportStartBehav(OneShotBehaviour):
+    async def stop(self):
+        if self.is_alive():
+            if self.tutor_cache.ttl > 0:
+                # Stop the directory from pushing invalidations to us
+                unsubscribe = self.UnsubscribeBehav()
+                self.add_behaviour(unsubscribe)
+                await unsubscribe.join(timeout=5)
+            # Send the buffered monitor events (e.g. STUDENT_FINISH) before disconnecting
+            await self.telemetry.flush()
+        return await super().stop()
+
+    class DirectoryInvalidationBehav(CyclicBehaviour):
+        """Drops the cached tutor list of a topic when the directory says it changed."""
         async def run(self):
-            msg = Message(to=MONITOR_AGENT_JID)
-            msg.set_metadata("protocol", "MonitorProtocol")
-            msg.set_metadata("performative", "inform")
-            msg.body = json.dumps({
-                "event": "STUDENT_START", "student": str(self.agent.jid),
-                "knowledge": self.agent.knowledge, "goal": self.agent.knowledge_goal,
-                "topic": self.agent.topic_needed, "timestamp": time.time()
-            })
+            msg = await self.receive(timeout=100)
+            if not msg:
+                return
+            try:
+                topic = decode(msg, Topic).topic
+            except CodecError as e:
+                self.agent.log.warning("Unreadable invalidation from {}: {}", msg.sender, e)
+                return
+            if self.agent.tutor_cache.invalidate(topic):
+                self.agent.log.debug("Tutor list for '{}' changed. Cache entry dropped.", topic)
+                self.agent.telemetry.report({
+                    "event": "DIRECTORY_INVALIDATED", "student": str(self.agent.jid),
+                    "topic": topic, "timestamp": clock.time()
+                })
+
+    class UnsubscribeBehav(OneShotBehaviour):
+        async def run(self):
+            msg = Message(to=DIRECTORY_AGENT_JID)
+            msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
+            msg.set_metadata("performative", "unsubscribe")
             await self.send(msg)
-    
+
     def is_goal_met(self):
         return self.knowledge >= self.knowledge_goal
 
+    async def backoff(self, reason, retry_after=None):
+        """Waits before retrying after a failure of kind `reason` and reports the retry."""
+        attempt, delay = self.retry.next_delay(reason, retry_after)
+        self.log.debug("Retrying '{}' in {:.1f}s (attempt {}).", reason, delay, attempt)
+        self.telemetry.report({
+            "event": "RETRY", "student": str(self.jid), "reason": reason,
+            "attempt": attempt, "delay": delay, "retry_after": retry_after,
+            "timestamp": clock.time()
+        })
+        await clock.sleep(delay)
+
+    def resource_request(self):
+        """Picks a resource replica and builds the request for our topic."""
+        replicas = self.resource_replicas
+        if replicas.choose() is None:
+            replicas.reset()  # Every listed replica turned us away; try them all again
+        self.resource_server = replicas.choose()
+        msg = Message(to=self.resource_server)
+        msg.set_metadata("protocol", PROTOCOL_RESOURCE)
+        msg.set_metadata("performative", "request")
+        msg.set_metadata("knowledge", f"{self.knowledge:.2f}")  # Materials are matched to our level
+        if self.learning_style:
+            msg.set_metadata("learning_style", self.learning_style)
+        encode(msg, Topic(self.topic_needed))
+        return msg
+
 class StudentFSM(FSMBehaviour):
-    async def on_start(self): print(f"{self.agent.name}: Starting FSM...")
+    def add_state(self, name, state, initial=False):
+        state.state_name = name
+        super().add_state(name=name, state=state, initial=initial)
+
+    async def on_start(self): self.agent.log.debug("Starting FSM...")
     async def on_end(self):
-        print(f"{self.agent.name}: FSM finished. Final knowledge: {self.agent.knowledge:.2f}")
+        self.agent.log.info("FSM finished. Final knowledge: {:.2f}", self.agent.knowledge)
         await self.agent.stop()
 
-class StartState(State):
+class StudentState(State):
+    """FSM state that tells the monitor when the student enters it (state distribution), if asked to."""
+    async def on_start(self):
+        if not self.agent.report_states:
+            return
+        self.agent.telemetry.report({
+            "event": "STUDENT_STATE", "student": str(self.agent.jid),
+            "state": self.state_name, "timestamp": clock.time()
+        })
+
+
+class StartState(StudentState):
+    started = False
+
     async def run(self):
-        print(f"{self.agent.name}: State: START. Knowledge: {self.agent.knowledge:.2f}")
-        await asyncio.sleep(1)
+        self.agent.log.debug("State: START. Knowledge: {:.2f}", self.agent.knowledge)
+        if not self.started:
+            # First pass only: retries have already backed off before coming back here
+            self.started = True
+            await clock.sleep(self.agent.retry.jitter(START_JITTER))
         self.set_next_state(STATE_REQUEST_RESOURCES)
 
 
-class RequestResourcesState(State):
+class RequestResourcesState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: REQUEST_RESOURCES. Asking for '{self.agent.topic_needed}'")
-        msg = Message(to=RESOURCE_AGENT_JID)
-        msg.set_metadata("protocol", "ResourceProtocol")
-        msg.set_metadata("performative", "request")
-        msg.body = self.agent.topic_needed
-        await self.send(msg)
+        if self.agent.resource_replicas.stale():
+            # Ask the directory which resource replicas exist and how loaded they are
+            self.agent.log.debug("State: REQUEST_RESOURCES. Asking the directory for resource replicas.")
+            msg = Message(to=DIRECTORY_AGENT_JID)
+            msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
+            msg.set_metadata("performative", "query")
+            msg.set_metadata("service", SERVICE_RESOURCE)
+            self.agent.directory_thread = await self.agent.conversations.send(msg)
+            self.set_next_state(STATE_AWAIT_REPLICAS)
+            return
+
+        msg = self.agent.resource_request()
+        self.agent.log.debug("State: REQUEST_RESOURCES. Asking {} for '{}'", msg.to, self.agent.topic_needed)
+        self.agent.resource_thread = await self.agent.conversations.send(msg)
         self.set_next_state(STATE_AWAIT_RESOURCES)
 
 
-class AwaitResourcesState(State):
+class AwaitReplicasState(StudentState):
+    """Records the replica loads from the directory, then sends the resource request."""
     async def run(self):
-        print(f"{self.agent.name}: State: AWAIT_RESOURCES. Waiting for resource...")
-        self.agent.received_resource_effectiveness = 0.0
+        conversations = self.agent.conversations
+        msg = await conversations.receive_reply(PROTOCOL_DIRECTORY, self.agent.directory_thread, 5)
+        conversations.close(PROTOCOL_DIRECTORY, self.agent.directory_thread)
+        replicas = self.agent.resource_replicas
+        if msg and msg.get_metadata("performative") == "inform":
+            loads = decode(msg, ReplicaLoads).loads
+            self.agent.log.debug("State: AWAIT_REPLICAS. Directory lists {} resource replica(s).", len(loads))
+            replicas.update(loads)
+        else:
+            replicas.keep()
+            self.agent.log.debug("State: AWAIT_REPLICAS. No replica list from the directory. Using {}.", list(replicas.loads))
 
-        template = Template()
-        template.set_metadata("protocol", PROTOCOL_RESOURCE)
-        template.sender = RESOURCE_AGENT_JID
-        self.set_template(template)
-        
-        msg = await self.receive(timeout=30) 
+        request = self.agent.resource_request()
+        self.agent.resource_thread = await conversations.send(request)
+        self.set_next_state(STATE_AWAIT_RESOURCES)
 
-        # Check for wrong protocol
-        if msg and msg.get_metadata("protocol") != PROTOCOL_RESOURCE:
-            print(f"{self.agent.name}: State: AWAIT_RESOURCES. Received WRONG protocol ({msg.get_metadata('protocol')}). Re-queueing.")
-            # This message is not for us. Transition to self to re-run the state.
-            self.set_next_state(STATE_AWAIT_RESOURCES) # This transition is now registered
-            return
 
-        # Process the (correct) message
+class AwaitResourcesState(StudentState):
+    async def run(self):
+        self.agent.log.debug("State: AWAIT_RESOURCES. Waiting for resource...")
+        self.agent.received_resource_effectiveness = 0.0
+
+        # Only replies to this request's conversation arrive here
+        conversations = self.agent.conversations
+        thread = self.agent.resource_thread
+        while True:
+            # If the server queued us, wait for the ETA it gave us (plus margin)
+            timeout = self.agent.resource_eta + 30 if self.agent.resource_eta else 30
+            msg = await conversations.receive_reply(PROTOCOL_RESOURCE, thread, timeout)
+            if not msg or msg.get_metadata("performative") != "agree":
+                break
+            # --- Server is busy but queued our request: keep waiting ---
+            ticket = decode(msg, QueueTicket)
+            self.agent.resource_eta = ticket.eta
+            self.agent.log.debug("Queued by resource server at position {} (ETA {:.0f}s).", ticket.queue_position, ticket.eta)
+        conversations.close(PROTOCOL_RESOURCE, thread)
+
         if msg:
             performative = msg.get_metadata("performative")
-            if performative == "inform":
-                print(f"{self.agent.name}: Received resource: {msg.body}")
+            self.agent.resource_eta = None
+            replicas = self.agent.resource_replicas
+            try:
+                payload = decode(msg, (Material, ResourceError))
+            except CodecError:
+                payload = None
+            if performative == "inform" and isinstance(payload, Material):
+                self.agent.log.info("Received resource: {} (difficulty {:.2f}) {}", payload.title, payload.difficulty, payload.url)
                 self.agent.received_resource_effectiveness = 0.4
+                replicas.reset()
+                self.agent.retry.succeeded("resource_busy")
             
-            elif performative == "failure" or "ERROR_SERVER_BUSY" in msg.body:
-                print(f"{self.agent.name}: Resource server is busy. Will try again later.")
-                await asyncio.sleep(10)
+            elif performative == "failure" or (isinstance(payload, ResourceError) and payload.code == ERROR_SERVER_BUSY):
+                retry_after = msg.get_metadata("retry_after")
+                replicas.mark_busy(str(msg.sender), float(retry_after) if retry_after else None)
+                if replicas.choose() is not None:
+                    # --- Fail over to another replica right away ---
+                    self.agent.log.debug("{} is busy. Failing over to another resource replica.", msg.sender)
+                    self.agent.telemetry.report({
+                        "event": "RESOURCE_FAILOVER", "student": str(self.agent.jid),
+                        "replica": str(msg.sender), "timestamp": clock.time()
+                    })
+                else:
+                    self.agent.log.debug("Resource server queue is full. Will try again later.")
+                    retry_after = replicas.retry_after
+                    replicas.reset()
+                    replicas.invalidate()  # Loads have changed; ask the directory again
+                    await self.agent.backoff("resource_busy", retry_after)
                 self.set_next_state(STATE_REQUEST_RESOURCES) # Go back and ask again
                 return
                 
             else:
-                print(f"{self.agent.name}: Did not receive resource or received error: {msg.body}")
+                self.agent.log.warning("Did not receive resource or received error: {}", msg.body)
         else:
-            print(f"{self.agent.name}: Resource request timed out. Moving on without it.")
+            self.agent.resource_eta = None
+            self.agent.log.debug("Resource request timed out. Moving on without it.")
 
         self.set_next_state(STATE_EVALUATE_KNOWLEDGE)
 
 
 
-class EvaluateKnowledgeState(State):
+class EvaluateKnowledgeState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: EVALUATE_KNOWLEDGE. (Attention: {self.agent.attention}%)")
+        self.agent.log.debug("State: EVALUATE_KNOWLEDGE. (Attention: {}%)", self.agent.attention)
 
         if self.agent.received_resource_effectiveness > 0:
-            print(f"{self.agent.name}: Studying the received resource...")
-            await asyncio.sleep(3)  # Study time
+            self.agent.log.debug("Studying the received resource...")
+            await clock.sleep(3)  # Study time
 
             # --- NEW: Calculate gain based on attention ---
             effectiveness_multiplier = self.agent.attention / 100
@@ -197,202 +476,228 @@ class EvaluateKnowledgeState(State):
             self.agent.received_resource_effectiveness = 0.0  # Reset
             self.agent.attention -= 30 # Studying costs attention
             
-            print(f"{self.agent.name}: Gained {gain:.2f} knowledge. (New total: {self.agent.knowledge:.2f})")
-            print(f"{self.agent.name}: Attention is now {self.agent.attention}%.")
+            self.agent.log.debug("Gained {:.2f} knowledge. (New total: {:.2f})", gain, self.agent.knowledge)
+            self.agent.log.debug("Attention is now {}%.", self.agent.attention)
 
         # Check outcomes in order
         if self.agent.is_goal_met():
-            print(f"{self.agent.name}: Knowledge goal met!")
+            self.agent.log.info("Knowledge goal met!")
             self.set_next_state(STATE_FINISH)
         
         elif self.agent.attention < 20:
-            print(f"{self.agent.name}: Attention too low. Taking a break.")
+            self.agent.log.debug("Attention too low. Taking a break.")
             self.set_next_state(STATE_TAKE_BREAK)
             
         else:
-            print(f"{self.agent.name}: Still need help. Querying directory.")
-            msg = Message(to=MONITOR_AGENT_JID)
-            msg.set_metadata("protocol", "MonitorProtocol")
-            msg.set_metadata("performative", "inform")
-            msg.body = json.dumps({
+            self.agent.log.debug("Still need help. Querying directory.")
+            self.agent.telemetry.report({
                 "event": "STUDENT_REQUEST_HELP", "student": str(self.agent.jid),
-                "topic": self.agent.topic_needed, "timestamp": time.time()
+                "topic": self.agent.topic_needed, "timestamp": clock.time()
             })
-            await self.send(msg)
             self.set_next_state(STATE_QUERY_DIRECTORY)
 
 
-class QueryDirectoryState(State):
+class QueryDirectoryState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: QUERY_DIRECTORY. Asking for '{self.agent.topic_needed}' tutors.")
+        topic = self.agent.topic_needed
+        cached = self.agent.tutor_cache.get(topic)
+        if cached:
+            self.agent.log.debug("State: QUERY_DIRECTORY. Using {} cached '{}' tutors.", len(cached), topic)
+            self.agent.available_tutors = cached
+            self.agent.telemetry.report({
+                "event": "DIRECTORY_CACHE_HIT", "student": str(self.agent.jid),
+                "topic": topic, "timestamp": clock.time()
+            })
+            self.set_next_state(STATE_START_CNP)
+            return
+
+        self.agent.log.debug("State: QUERY_DIRECTORY. Asking for '{}' tutors.", topic)
         msg = Message(to=DIRECTORY_AGENT_JID)
         msg.set_metadata("protocol", "DirectoryProtocol")
         msg.set_metadata("performative", "query")
-        msg.body = self.agent.topic_needed
-        await self.send(msg)
+        if self.agent.tutor_cache.ttl > 0:
+            msg.set_metadata("subscribe", "true")  # Get told when the answer changes
+        # Let the directory pre-filter on the load tutors publish to it
+        if self.agent.directory_top_k:
+            msg.set_metadata("top_k", str(self.agent.directory_top_k))
+        if self.agent.directory_available_only:
+            msg.set_metadata("available_only", "true")
+        encode(msg, Topic(topic))
+        self.agent.directory_thread = await self.agent.conversations.send(msg)
+        self.agent.telemetry.report({
+            "event": "DIRECTORY_QUERY", "student": str(self.agent.jid),
+            "topic": topic, "timestamp": clock.time()
+        })
         self.set_next_state(STATE_AWAIT_DIRECTORY)
 
-class AwaitDirectoryState(State):
+class AwaitDirectoryState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: AWAIT_DIRECTORY. Waiting for tutor list...")
-        msg = await self.receive(timeout=5)
+        self.agent.log.debug("State: AWAIT_DIRECTORY. Waiting for tutor list...")
+        conversations = self.agent.conversations
+        msg = await conversations.receive_reply(PROTOCOL_DIRECTORY, self.agent.directory_thread, 5)
+        conversations.close(PROTOCOL_DIRECTORY, self.agent.directory_thread)
         if msg and msg.get_metadata("performative") == "inform":
             try:
-                self.agent.available_tutors = json.loads(msg.body)
+                self.agent.available_tutors = list(decode(msg, TutorList).tutors)
                 if self.agent.available_tutors:
-                    print(f"{self.agent.name}: Received {len(self.agent.available_tutors)} tutors from directory.")
+                    self.agent.log.debug("Received {} tutors from directory.", len(self.agent.available_tutors))
+                    self.agent.tutor_cache.put(self.agent.topic_needed, self.agent.available_tutors)
+                    self.agent.retry.succeeded("directory")
                     self.set_next_state(STATE_START_CNP)
                 else:
-                    print(f"{self.agent.name}: Directory found no tutors. Trying again later.")
-                    await asyncio.sleep(10); self.set_next_state(STATE_START)
+                    self.agent.log.debug("Directory found no tutors. Trying again later.")
+                    await self.agent.backoff("directory"); self.set_next_state(STATE_START)
             except Exception as e:
-                print(f"{self.agent.name}: Failed to parse directory response: {e}")
+                self.agent.log.warning("Failed to parse directory response: {}", e)
                 self.set_next_state(STATE_START)
         else:
-            print(f"{self.agent.name}: Directory did not reply. Trying again later.")
-            await asyncio.sleep(10); self.set_next_state(STATE_START)
+            self.agent.log.debug("Directory did not reply. Trying again later.")
+            await self.agent.backoff("directory"); self.set_next_state(STATE_START)
 
 
-class StartCNPState(State):
+class StartCNPState(StudentState):
     async def run(self):
         tutors_to_contact = self.agent.available_tutors
         if not tutors_to_contact:
-            print(f"{self.agent.name}: State: START_CNP. No tutors found. Skipping.")
+            self.agent.log.debug("State: START_CNP. No tutors found. Skipping.")
             self.set_next_state(STATE_START); return
-        print(f"{self.agent.name}: State: START_CNP. Sending CFP for '{self.agent.topic_needed}' to {tutors_to_contact}")
-        self.agent.proposals = []
-        for tutor_jid in tutors_to_contact:
-            msg = Message(to=tutor_jid)
-            msg.set_metadata("protocol", "fipa-contract-net")
-            msg.set_metadata("performative", "cfp")
-            msg.body = self.agent.topic_needed
-            await self.send(msg)
+        self.agent.log.debug("State: START_CNP. Sending CFP for '{}' to {}", self.agent.topic_needed, tutors_to_contact)
+        self.agent.negotiation = await self.agent.cnp.start_negotiation(
+            self.agent.topic_needed, tutors_to_contact,
+            deadline=self.agent.proposal_deadline,
+            good_enough=self.agent.proposals_good_enough,
+        )
+        self.agent.telemetry.report({
+            "event": "CFP_SENT", "student": str(self.agent.jid),
+            "participants": len(tutors_to_contact), "timestamp": clock.time()
+        })
         self.set_next_state(STATE_AWAIT_PROPOSALS)
 
-class AwaitProposalsState(State):
+class AwaitProposalsState(StudentState):
+    """
+    Waits for the negotiation to close: every contacted tutor has answered
+    (propose or refuse), `proposals_good_enough` offers are in, or the
+    deadline passed.
+    """
     async def run(self):
-        print(f"{self.agent.name}: State: AWAIT_PROPOSALS. Collecting offers (5s)...")
-        start_time = asyncio.get_event_loop().time()
-        
-        template = Template()
-        template.set_metadata("protocol", PROTOCOL_CNP)
-        template.set_metadata("performative", "propose")
-        self.set_template(template)
+        negotiation = self.agent.negotiation
+        self.agent.log.debug("State: AWAIT_PROPOSALS. Collecting offers from {} tutor(s) (max {}s)...", len(negotiation.participants), self.agent.proposal_deadline)
+        await negotiation.wait()
+
+        for msg in negotiation.refusals:
+            self.agent.log.debug("{} refused the CFP.", msg.sender)
+        if negotiation.expired:
+            self.agent.log.debug("Deadline reached. {} tutor(s) did not answer.", len(negotiation.pending))
         
-        while asyncio.get_event_loop().time() - start_time < 5.0:
-            msg = await self.receive(timeout=1.0)
-            
-            # --- THE FIX: Check the protocol again, just in case ---
-            if msg and msg.get_metadata("protocol") == PROTOCOL_CNP and msg.get_metadata("performative") == "propose":
-                print(f"{self.agent.name}: Received proposal from {str(msg.sender)}")
-                self.agent.proposals.append(msg)
-            elif msg:
-                print(f"{self.agent.name}: State: AWAIT_PROPOSALS. Received WRONG protocol ({msg.get_metadata('protocol')}). Ignoring.")
-                # This message will be handled later
-        
-        if not self.agent.proposals:
-            print(f"{self.agent.name}: No proposals received. Will try again later.")
-            await asyncio.sleep(10); self.set_next_state(STATE_START)
+        if not negotiation.proposals:
+            self.agent.log.debug("No proposals received. Will try again later.")
+            await self.agent.backoff("proposals"); self.set_next_state(STATE_START)
         else:
+            self.agent.retry.succeeded("proposals")
+            self.agent.log.debug("Received {} proposal(s).", len(negotiation.proposals))
             self.set_next_state(STATE_SELECT_TUTOR)
 
 
-class SelectTutorState(State):
+class SelectTutorState(StudentState):
+    """
+    Accepts the best untried proposal of the current negotiation. The
+    others are kept: if the accepted tutor does not confirm,
+    AwaitTutoringState comes back here for the next best one instead of
+    running a new CFP.
+    """
     async def run(self):
-        print(f"{self.agent.name}: State: SELECT_TUTOR. Selecting best proposal...")
-        best_proposal = None
-        best_score = float('inf')
-        for msg in self.agent.proposals:
-            try:
-                offer = json.loads(msg.body)
-                wait_time = offer.get("wait_time", 99)
-                expertise = offer.get("expertise_level", 0.1)
-                score = wait_time + ((1 - expertise) * 20)
-                print(f"{self.agent.name}: Evaluated {str(msg.sender)}: wait={wait_time}, expertise={expertise}, score={score:.2f}")
-                if score < best_score:
-                    best_score = score
-                    best_proposal = msg
-            except Exception as e:
-                print(f"{self.agent.name}: Bad proposal from {str(msg.sender)}: {e}")
-        
-        if best_proposal:
-            print(f"{self.agent.name}: Accepting proposal from {str(best_proposal.sender)} (best score: {best_score:.2f})")
+        self.agent.log.debug("State: SELECT_TUTOR. Selecting best proposal...")
+        negotiation = self.agent.negotiation
+        if self.agent.log.enabled("DEBUG"):  # Ranking them only to log them
+            for score, msg, offer in negotiation.top(SHOW_TOP_PROPOSALS):
+                self.agent.log.debug("Evaluated {}: wait={}, expertise={}, score={:.2f}", msg.sender, offer.wait_time, offer.expertise_level, score)
+
+        candidate = negotiation.next_candidate()
+        if candidate:
+            best_score, best_proposal, _ = candidate
+            self.agent.log.info("Accepting proposal from {} (score: {:.2f}, {} fallback(s) left)", best_proposal.sender, best_score, len(negotiation.candidates))
             
             # --- NEW: Store the JID of the tutor we are waiting for ---
-            self.agent.selected_tutor = str(best_proposal.sender) 
+            self.agent.selected_tutor = best_proposal.sender.bare
 
             # ... (send monitor report) ...
-            msg = Message(to=MONITOR_AGENT_JID)
-            msg.set_metadata("protocol", "MonitorProtocol")
-            msg.set_metadata("performative", "inform")
-            msg.body = json.dumps({
+            self.agent.telemetry.report({
                 "event": "STUDENT_FOUND_TUTOR", "student": str(self.agent.jid),
-                "tutor": str(best_proposal.sender), "timestamp": time.time()
+                "tutor": str(best_proposal.sender), "timestamp": clock.time()
             })
-            await self.send(msg)
             
-            # ... (accept/reject logic is the same) ...
-            reply = best_proposal.make_reply()
-            reply.set_metadata("performative", "accept-proposal")
-            await self.send(reply)
-            for msg in self.agent.proposals:
-                if msg.sender != best_proposal.sender:
-                    reject_reply = msg.make_reply()
-                    reject_reply.set_metadata("performative", "reject-proposal")
-                    await self.send(reject_reply)
+            # Accept the winner; the others stay as fallbacks until the session is confirmed
+            await self.agent.cnp.accept(negotiation, best_proposal, reject_others=False)
             
             self.set_next_state(STATE_AWAIT_TUTORING)
         else:
-            print(f"{self.agent.name}: Could not select a proposal.")
+            self.agent.log.debug("Could not select a proposal.")
             self.set_next_state(STATE_START)
 
 
-class AwaitTutoringState(State):
+class AwaitTutoringState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: AWAIT_TUTORING. Waiting for confirmation from {self.agent.selected_tutor}...")
-
-        # --- Use a Template to ONLY match the inform from the selected tutor ---
-        template = Template()
-        template.set_metadata("protocol", PROTOCOL_CNP)
-        template.set_metadata("performative", "inform")
-        template.sender = self.agent.selected_tutor
-        
-        self.set_template(template) # <-- SET TEMPLATE HERE
-        msg = await self.receive(timeout=20) # <-- REMOVED FROM HERE
-
-        if msg:
-            print(f"{self.agent.name}: Tutor {str(msg.sender)} started session.")
-            await asyncio.sleep(5)
+        self.agent.log.debug("State: AWAIT_TUTORING. Waiting for confirmation from {}...", self.agent.selected_tutor)
+
+        # --- Replies come on the negotiation's conversation; only the selected tutor's count ---
+        negotiation = self.agent.negotiation
+        while True:
+            # If the tutor queued us, wait for the ETA it gave us (plus margin)
+            timeout = self.agent.tutoring_eta + 20 if self.agent.tutoring_eta else 20
+            msg = await self.agent.conversations.receive_reply(PROTOCOL_CNP, negotiation.thread, timeout)
+            if msg and msg.sender.bare != self.agent.selected_tutor:
+                self.agent.log.debug("Ignoring late {} from {}.", msg.get_metadata('performative'), msg.sender.bare)
+                continue
+            if not msg or msg.get_metadata("performative") != "agree":
+                break
+            # --- Tutor is busy but queued our session: keep waiting ---
+            ticket = decode(msg, QueueTicket)
+            self.agent.tutoring_eta = ticket.eta
+            self.agent.log.debug("Queued by {} at position {} (ETA {:.0f}s).", msg.sender, ticket.queue_position, ticket.eta)
+
+        self.agent.tutoring_eta = None
+        if not negotiation.candidates or (msg and msg.get_metadata("performative") == "inform"):
+            self.agent.conversations.close(PROTOCOL_CNP, negotiation.thread)  # No other tutor will be tried
+        if msg and msg.get_metadata("performative") == "inform":
+            self.agent.log.info("Tutor {} started session ({:.0f}s).", msg.sender, decode(msg, SessionStart).duration)
+            self.agent.retry.succeeded("tutoring")
+            # Release the tutors we kept as fallbacks
+            await self.agent.cnp.reject_candidates(negotiation)
+            await clock.sleep(5)
             self.agent.knowledge = 1.0
             self.agent.attention -= 20
-            print(f"{self.agent.name}: Session finished. Attention: {self.agent.attention}%")
+            self.agent.log.info("Session finished. Attention: {}%", self.agent.attention)
         else:
-            print(f"{self.agent.name}: Tutor did not confirm session. Will retry.")
+            if not msg and negotiation.accepted is not None:
+                # The tutor may still hold our session: withdraw it before trying anyone else
+                await self.agent.cnp.cancel(negotiation.accepted)
             self.agent.selected_tutor = None # Clear selection
-            self.set_next_state(STATE_START) # Go back to start
+            if negotiation.candidates:
+                self.agent.log.debug("Tutor did not confirm session. Trying the next best proposal.")
+                self.set_next_state(STATE_SELECT_TUTOR)
+            else:
+                self.agent.log.debug("Tutor did not confirm session. Will retry.")
+                await self.agent.backoff("tutoring")
+                self.set_next_state(STATE_START) # Go back to start
             return
 
         self.set_next_state(STATE_EVALUATE_KNOWLEDGE)
 
 
-class TakeBreakState(State):
+class TakeBreakState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: TAKE_BREAK. Resting to restore attention...")
-        await asyncio.sleep(10) # 10 second break
+        self.agent.log.debug("State: TAKE_BREAK. Resting to restore attention...")
+        await clock.sleep(10) # 10 second break
         self.agent.attention = 100 # Attention fully restored
-        print(f"{self.agent.name}: Break over. Attention restored to 100%.")
+        self.agent.log.debug("Break over. Attention restored to 100%.")
         self.set_next_state(STATE_EVALUATE_KNOWLEDGE) # Go back to check if goal is met
 
 
-class FinishState(State):
+class FinishState(StudentState):
     async def run(self):
-        print(f"{self.agent.name}: State: FINISH. Goal achieved.")
-        msg = Message(to=MONITOR_AGENT_JID)
-        msg.set_metadata("protocol", "MonitorProtocol")
-        msg.set_metadata("performative", "inform")
-        msg.body = json.dumps({
+        self.agent.log.info("State: FINISH. Goal achieved.")
+        self.agent.telemetry.report({
             "event": "STUDENT_FINISH", "student": str(self.agent.jid),
-            "knowledge": self.agent.knowledge, "timestamp": time.time()
+            "knowledge": self.agent.knowledge, "timestamp": clock.time()
         })
-        await self.send(msg)
         # The FSM will now stop
\ No newline at end of file
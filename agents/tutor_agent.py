@@ -2,135 +2,323 @@
 # (COMPLETE VERSION - INCLUDES DIRECTORY AND MONITOR LOGIC)
 
 import asyncio
-import json
 import random
-import time
 from spade.agent import Agent
 from spade.behaviour import CyclicBehaviour, OneShotBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from sim_clock import clock
+from logs import get_logger
+from metrics import ExponentialAverage
+from protocols.codec import CodecError, Expertise, Proposal, QueueTicket, SessionStart, Topic, TutorStatus, decode, encode
+from protocols.contract_net import ContractNetParticipantBehav
+from protocols.telemetry import TelemetryBehav, telemetry_template
+
 # Protocol definitions (must be consistent)
 PROTOCOL_CONTRACT_NET = "fipa-contract-net"
 PROTOCOL_DIRECTORY = "DirectoryProtocol"
 DIRECTORY_AGENT_JID = "directory@localhost"
 MONITOR_AGENT_JID = "monitor@localhost"
 
+# Directory registration retries
+REGISTRATION_ATTEMPTS = 3
+REGISTRATION_TIMEOUT = 10
+
+# Min simulated seconds between two status updates sent to the directory
+STATUS_INTERVAL = 2.0
+
+# Simulated tutoring session duration (seconds)
+SESSION_TIME_RANGE = (10, 20)
+AVERAGE_SESSION_TIME = sum(SESSION_TIME_RANGE) / 2
+
+# Quoting: "load_aware" (learned service times) or "static" (fixed average)
+DEFAULT_PRICING = "load_aware"
+SERVICE_TIME_ALPHA = 0.2  # Weight of each new observation in the moving averages
+QUOTE_MARGIN = 5          # Seconds added to every quoted wait (handshake)
+
 
 class TutorAgent(Agent):
     """
     Implements the tutor logic (CNP server).
     - Manages workload (availability).
-    - Makes proposals with priority logic.
-    - Registers with the DirectoryAgent on startup.
+    - Runs up to `max_sessions` sessions at once; extra students wait in a queue.
+    - Makes proposals with priority logic, quoting waits from the observed
+      session durations and queue drain rate (`pricing`).
+    - Optionally refuses CFPs when the predicted wait exceeds `max_quoted_wait`.
+    - Registers with the DirectoryAgent on startup (deregisters on stop).
+    - Publishes availability and queue length changes to the DirectoryAgent
+      (and the MonitorAgent).
     - Reports sessions to the MonitorAgent.
     """
 
+    # --- Load published to the directory: setting either flags a status change ---
+    @property
+    def is_available(self):
+        return self._is_available
+
+    @is_available.setter
+    def is_available(self, value):
+        self._is_available = value
+        self.status_changed.set()
+
+    @property
+    def session_queue_length(self):
+        return self._session_queue_length
+
+    @session_queue_length.setter
+    def session_queue_length(self, value):
+        self._session_queue_length = value
+        self.status_changed.set()
+
+    def status(self):
+        return {"available": self.is_available, "queue_length": self.session_queue_length}
+
+    def end_session(self, thread, task):
+        """
+        Frees the place on_accept() took, once the session task is over:
+        finished, failed, or cancelled (even before its first step ran).
+        """
+        self.sessions.pop(thread, None)
+        self.session_queue_length -= 1
+        if self.session_queue_length < self.max_sessions:
+            self.is_available = True  # Free up
+        if not task.cancelled():
+            self.log.info("Session finished. (Queue: {}). Available: {}", self.session_queue_length, self.is_available)
+
     async def setup(self):
+        self.log = get_logger("tutor", self.name)
+
         # --- Tutor Profile ---
+        self.status_changed = asyncio.Event()
         self.is_available = True
         self.expertise = self.get("expertise") or []  # Will be set from main.py
-        self.session_queue_length = 0
+        self.session_queue_length = 0  # Accepted sessions not yet finished (active + waiting)
+        self.max_sessions = self.get("max_sessions") or 1
+        self.session_slots = asyncio.Semaphore(self.max_sessions)
+        self.sessions = {}  # Thread -> accepted session task (queued or running)
+
+        # --- Wait-time pricing ---
+        self.pricing = self.get("pricing") or DEFAULT_PRICING
+        self.max_quoted_wait = self.get("max_quoted_wait")  # Admission control (None = accept all)
+        alpha = self.get("service_time_alpha") or SERVICE_TIME_ALPHA
+        self.service_time = ExponentialAverage(alpha, initial=AVERAGE_SESSION_TIME)  # Seconds per session
+        self.completion_interval = ExponentialAverage(alpha)  # Seconds between completions while students wait
+        self.last_backlogged_completion = None
         
         # --- CNP Behaviour ---
         cnp_template = Template()
         cnp_template.set_metadata("protocol", PROTOCOL_CONTRACT_NET)
         self.add_behaviour(self.CNPResponderBehav(), cnp_template)
 
+        # --- Monitor events are batched (protocols/telemetry.py) ---
+        self.telemetry = TelemetryBehav(MONITOR_AGENT_JID, **(self.get("telemetry") or {}))
+        self.add_behaviour(self.telemetry, telemetry_template())
+
         # --- Register with Directory Agent ---
-        self.add_behaviour(self.RegisterWithDirectoryBehav())
-        
-        print(f"{self.name}: Ready. Available: {self.is_available}. Expertise: {self.expertise}")
+        self.registered = asyncio.Event()  # Set once the directory acknowledges us
+        ack_template = Template()
+        ack_template.set_metadata("protocol", PROTOCOL_DIRECTORY)
+        ack_template.set_metadata("performative", "agree")
+        self.add_behaviour(self.RegisterWithDirectoryBehav(), ack_template)
+
+        # --- Publish load changes (nothing is ever received on this template) ---
+        self.status_interval = self.get("status_interval") or STATUS_INTERVAL
+        status_template = Template()
+        status_template.set_metadata("protocol", PROTOCOL_DIRECTORY)
+        status_template.set_metadata("performative", "status")
+        self.add_behaviour(self.PublishStatusBehav(), status_template)
+
+        self.log.info("Ready. Available: {}. Expertise: {}", self.is_available, self.expertise)
 
     # --- NEW BEHAVIOUR ---
     class RegisterWithDirectoryBehav(OneShotBehaviour):
         """
         A one-shot behaviour to register the tutor's expertise
         with the DirectoryAgent upon startup.
+        Retries until the directory acknowledges, then sets `agent.registered`.
+        """
+        async def run(self):
+            for attempt in range(1, REGISTRATION_ATTEMPTS + 1):
+                self.agent.log.debug("Registering with Directory... (attempt {})", attempt)
+                msg = Message(to=DIRECTORY_AGENT_JID)
+                msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
+                msg.set_metadata("performative", "register")
+                encode(msg, Expertise(tuple(self.agent.expertise)))
+                
+                await self.send(msg)
+                ack = await clock.receive(self, REGISTRATION_TIMEOUT)
+                if ack:
+                    self.agent.registered.set()
+                    self.agent.log.info("Registration acknowledged.")
+                    return
+            self.agent.log.warning("Directory never acknowledged registration.")
+
+    class PublishStatusBehav(CyclicBehaviour):
+        """
+        Sends a TutorStatus to the DirectoryAgent when it
+        differs from what was last sent, at most once per `status_interval`
+        simulated seconds (changes in between are coalesced).
+        """
+        async def on_start(self):
+            self.published = self.agent.status()  # What the directory assumes on registration
+
+        async def run(self):
+            await self.agent.registered.wait()
+            await self.agent.status_changed.wait()
+            self.agent.status_changed.clear()
+            status = self.agent.status()
+            if status == self.published:
+                return
+            msg = Message(to=DIRECTORY_AGENT_JID)
+            msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
+            msg.set_metadata("performative", "status")
+            encode(msg, TutorStatus(**status))
+            await self.send(msg)
+            self.published = status
+            self.agent.telemetry.report({
+                "event": "TUTOR_STATUS", "tutor": str(self.agent.jid), **status, "timestamp": clock.time()
+            })
+            await clock.sleep(self.agent.status_interval)
+
+    class DeregisterFromDirectoryBehav(OneShotBehaviour):
+        """
+        Removes the tutor from the DirectoryAgent's index before shutdown,
+        so students stop receiving it in query results.
         """
         async def run(self):
-            print(f"{self.agent.name}: Registering with Directory...")
             msg = Message(to=DIRECTORY_AGENT_JID)
             msg.set_metadata("protocol", PROTOCOL_DIRECTORY)
-            msg.set_metadata("performative", "register")
-            msg.body = json.dumps(self.agent.expertise)
-            
+            msg.set_metadata("performative", "deregister")
             await self.send(msg)
-            print(f"{self.agent.name}: Registration message sent.")
+
+    async def stop(self):
+        if self.is_alive():
+            deregister = self.DeregisterFromDirectoryBehav()
+            self.add_behaviour(deregister)
+            await deregister.join(timeout=5)
+            await self.telemetry.flush()
+        return await super().stop()
 
     def can_help(self, topic):
         """Checks if the tutor can help."""
         return topic in self.expertise
 
-    class CNPResponderBehav(CyclicBehaviour):
+    def drain_interval(self):
+        """Expected seconds between two session completions when students are waiting."""
+        if self.completion_interval.value is not None:
+            return self.completion_interval.value
+        return self.service_time.value / self.max_sessions  # Not observed yet: all slots busy
+
+    def estimate_wait(self, position):
+        """Seconds until a slot frees for the student at `position` in the waiting queue."""
+        if self.pricing == "static":
+            rounds = (position + self.max_sessions - 1) // self.max_sessions
+            return rounds * AVERAGE_SESSION_TIME
+        return position * self.drain_interval()
+
+    def quote_wait_time(self):
+        """Wait time advertised in proposals, based on the current queue depth."""
+        position = self.session_queue_length - self.max_sessions + 1
+        return self.estimate_wait(max(position, 0)) + QUOTE_MARGIN
+
+    def record_session(self, duration):
+        """Updates the service time and drain rate estimates when a session ends."""
+        self.service_time.add(duration)
+        now = clock.elapsed()
+        waiting = self.session_queue_length - self.max_sessions  # Before this session leaves
+        if waiting > 0:
+            if self.last_backlogged_completion is not None:
+                self.completion_interval.add(now - self.last_backlogged_completion)
+            self.last_backlogged_completion = now
+        else:
+            self.last_backlogged_completion = None  # Queue ran dry; next interval includes idle time
+
+    class CNPResponderBehav(ContractNetParticipantBehav):
         """
         Behaviour to handle the server-side of Contract Net Protocol.
         """
 
-        async def run(self):
-            msg = await self.receive(timeout=100)
-            if not msg:
-                return
+        async def make_offer(self, msg):
+            try:
+                topic = decode(msg, Topic).topic
+            except CodecError as e:
+                self.agent.log.warning("Unreadable CFP from {}: {}", msg.sender, e)
+                return None
+            self.agent.log.debug("Received CFP for {}", topic)
+
+            if not self.agent.can_help(topic):
+                # Refused explicitly so the student doesn't wait out its deadline
+                self.agent.log.debug("Cannot help (no expertise). Refusing.")
+                return None
+
+            # --- Priority Logic ---
+            wait_time = self.agent.quote_wait_time()
 
-            performative = msg.get_metadata("performative")
+            # --- Admission control: don't promise what we can't keep ---
+            if self.agent.max_quoted_wait is not None and wait_time > self.agent.max_quoted_wait:
+                self.agent.log.info("Predicted wait {:.0f}s is over {}s. Refusing.", wait_time, self.agent.max_quoted_wait)
+                self.agent.telemetry.report({
+                    "event": "CFP_REFUSED_LOAD", "tutor": str(self.agent.jid),
+                    "student": str(msg.sender), "wait_time": wait_time, "timestamp": clock.time()
+                })
+                return None
 
-            if performative == "cfp":
-                topic = msg.body
-                print(f"{self.agent.name}: Received CFP for {topic}")
+            base_expertise = 0.9 if self.agent.is_available else 0.7
+            self.agent.log.debug("Can help. Sending proposal (wait {:.0f}s).", wait_time)
 
-                if self.agent.can_help(topic):
-                    print(f"{self.agent.name}: Can help. Sending proposal.")
-                    reply = msg.make_reply()
-                    reply.set_metadata("performative", "propose")
+            return Proposal(wait_time, base_expertise)
 
-                    # --- Priority Logic ---
-                    wait_time = (self.agent.session_queue_length * 5) + 5 
+        async def on_accept(self, msg, offer):
+            # --- Workload Management ---
+            self.agent.log.info("Proposal ACCEPTED.")
+            self.agent.session_queue_length += 1
+            if self.agent.session_queue_length >= self.agent.max_sessions:
+                self.agent.is_available = False
+            position = self.agent.session_queue_length - self.agent.max_sessions
+            if position > 0:
+                # All slots busy: tell the student where it is in the queue
+                reply = msg.make_reply()
+                reply.set_metadata("performative", "agree")
+                encode(reply, QueueTicket(position, self.agent.estimate_wait(position)))
+                await self.send(reply)
+                self.agent.log.debug("All session slots busy. Queued student at position {}.", position)
 
-                    base_expertise = 0.9 if self.agent.is_available else 0.7
+            # Teach in the background so CFPs keep being answered
+            task = asyncio.create_task(self.conduct_session(msg))
+            self.agent.sessions[msg.thread] = task
+            task.add_done_callback(lambda task: self.agent.end_session(msg.thread, task))
 
-                    offer = {
-                        "wait_time": wait_time,
-                        "expertise_level": base_expertise
-                    }
-                    reply.body = json.dumps(offer)
-                    await self.send(reply)
-                else:
-                    print(f"{self.agent.name}: Cannot help (no expertise).")
+        async def on_reject(self, msg, offer):
+            self.agent.log.debug("Proposal REJECTED.")
+            # Do nothing, just wait for the next CFP
 
-            elif performative == "accept-proposal":
-                # --- Workload Management ---
-                print(f"{self.agent.name}: Proposal ACCEPTED.")
-                self.agent.session_queue_length += 1
-                self.agent.is_available = False  
+        async def on_cancel(self, msg):
+            # The student stopped waiting: free its place instead of teaching nobody
+            task = self.agent.sessions.get(msg.thread)
+            if task is not None:
+                self.agent.log.info("Session with {} cancelled by the student.", msg.sender)
+                task.cancel()
 
+        async def conduct_session(self, msg):
+            async with self.agent.session_slots:
                 # --- NEW: Report session start to monitor ---
-                monitor_msg = Message(to=MONITOR_AGENT_JID)
-                monitor_msg.set_metadata("protocol", "MonitorProtocol")
-                monitor_msg.set_metadata("performative", "inform")
-                monitor_msg.body = json.dumps({
+                self.agent.telemetry.report({
                     "event": "SESSION_START",
                     "tutor": str(self.agent.jid),
                     "student": str(msg.sender),
-                    "timestamp": time.time()
+                    "timestamp": clock.time()
                 })
-                await self.send(monitor_msg)
 
                 # Confirm to student
+                duration = random.randint(*SESSION_TIME_RANGE)
                 reply = msg.make_reply()
                 reply.set_metadata("performative", "inform")
-                reply.body = "OK, starting session."
+                encode(reply, SessionStart(duration))
                 await self.send(reply)
 
                 # Simulate session
-                print(f"{self.agent.name}: Conducting session... (Queue: {self.agent.session_queue_length})")
-                await asyncio.sleep(random.randint(10, 20))  # Session duration
-
-                self.agent.session_queue_length -=1
-                if self.agent.session_queue_length ==0:
-                    self.agent.is_available = True  # Free up
-                
-                print(f"{self.agent.name}: Session finished. (Queue: {self.agent.session_queue_length}). Available: {self.agent.is_available}")
-
-            elif performative == "reject-proposal":
-                print(f"{self.agent.name}: Proposal REJECTED.")
-                # Do nothing, just wait for the next CFP
\ No newline at end of file
+                self.agent.log.debug("Conducting session... (Queue: {})", self.agent.session_queue_length)
+                started = clock.elapsed()
+                await clock.sleep(duration)  # Session duration
+                self.agent.record_session(clock.elapsed() - started)
@@ -0,0 +1,98 @@
+# project/benchmarks/codec.py
+"""
+Micro-benchmark of the message codec (protocols/codec.py) against the
+JSON bodies the agents used before. For each kind of message it times
+writing and reading the body, and a decode() of a message that was
+already decoded (the parse-once cache, also what a loopback receiver
+gets), and counts the bytes of the body and of the whole XMPP stanza
+(body plus SPADE's metadata form) as it would go over the wire.
+
+Topics were plain strings before, so for those the codec only adds its
+version and tag; the session confirmation was free text.
+
+Run from the project root:
+    python -m benchmarks.codec
+"""
+
+import json
+import time
+
+import slixmpp
+from spade.message import Message
+
+from protocols.codec import (
+    Expertise, Material, Proposal, QueueTicket, ReplicaLoads, SessionStart, Topic, TutorList, TutorStatus, decode,
+    dumps, encode, loads,
+)
+
+ROUNDS = 20_000
+
+# name, protocol, performative, payload, the JSON body the agents sent before
+SAMPLES = [
+    ("cfp", "ContractNetProtocol", "cfp", Topic("mathematics"), "mathematics"),
+    ("proposal", "ContractNetProtocol", "propose", Proposal(17.5, 0.9),
+     {"wait_time": 17.5, "expertise_level": 0.9}),
+    ("queue ticket", "ContractNetProtocol", "agree", QueueTicket(3, 42.0), {"queue_position": 3, "eta": 42.0}),
+    ("session start", "ContractNetProtocol", "inform", SessionStart(15), "OK, starting session."),
+    ("expertise", "DirectoryProtocol", "register", Expertise(("mathematics", "physics")), ["mathematics", "physics"]),
+    ("tutor status", "DirectoryProtocol", "status", TutorStatus(True, 2), {"available": True, "queue_length": 2}),
+    ("tutor list", "DirectoryProtocol", "inform", TutorList(tuple(f"tutor{i}@localhost" for i in range(5))),
+     [f"tutor{i}@localhost" for i in range(5)]),
+    ("replica loads", "DirectoryProtocol", "inform",
+     ReplicaLoads({f"resource_manager{i}@localhost": 0.5 * i for i in range(3)}),
+     {f"resource_manager{i}@localhost": 0.5 * i for i in range(3)}),
+    ("material", "ResourceProtocol", "inform",
+     Material("https://www.math-videos.com/algebra-basics", "Algebra basics", 0.3, "visual"),
+     {"url": "https://www.math-videos.com/algebra-basics", "title": "Algebra basics",
+      "difficulty": 0.3, "style": "visual"}),
+]
+
+
+def per_call(func, rounds=ROUNDS):
+    """Microseconds per call of func()."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def stanza_bytes(client, protocol, performative, body):
+    msg = Message(to="student1@localhost", sender="tutor1@localhost", body=body, thread="a1b2c3d4e5f6")
+    msg.set_metadata("protocol", protocol)
+    msg.set_metadata("performative", performative)
+    return len(str(msg.prepare(client)).encode())
+
+
+def main():
+    client = slixmpp.ClientXMPP("tutor1@localhost", "")  # Only used to build stanzas, never connected
+    print(f"{'message':>13} | {'json w/r (us)':>14} | {'codec w/r (us)':>14} | {'cached (us)':>11} | "
+          f"{'body json/codec (B)':>19} | {'stanza json/codec (B)':>21}")
+    totals = [0, 0, 0, 0]
+    for name, protocol, performative, payload, old in SAMPLES:
+        if isinstance(old, str):
+            old_body = old
+            json_write = per_call(lambda: str(old))
+            json_read = per_call(lambda: str(old_body))
+        else:
+            old_body = json.dumps(old)
+            json_write = per_call(lambda: json.dumps(old))
+            json_read = per_call(lambda: json.loads(old_body))
+        body = dumps(payload)
+        assert loads(body) == payload
+        codec_write = per_call(lambda: dumps(payload))
+        codec_read = per_call(lambda: loads(body))
+        msg = encode(Message(), payload)
+        cached = per_call(lambda: decode(msg))
+
+        sizes = (len(old_body.encode()), len(body.encode()),
+                 stanza_bytes(client, protocol, performative, old_body),
+                 stanza_bytes(client, protocol, performative, body))
+        totals = [total + size for total, size in zip(totals, sizes)]
+        print(f"{name:>13} | {json_write:>6.2f} /{json_read:>6.2f} | {codec_write:>6.2f} /{codec_read:>6.2f} | "
+              f"{cached:>11.2f} | {sizes[0]:>9} /{sizes[1]:>8} | {sizes[2]:>10} /{sizes[3]:>9}")
+    print(f"{'total':>13} | {'':>14} | {'':>14} | {'':>11} | {totals[0]:>9} /{totals[1]:>8} | "
+          f"{totals[2]:>10} /{totals[3]:>9}")
+
+
+if __name__ == "__main__":
+    main()
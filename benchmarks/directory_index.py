@@ -0,0 +1,52 @@
+# project/benchmarks/directory_index.py
+"""
+Micro-benchmark for DirectoryAgent topic lookups.
+Compares the old full registry scan against the TutorIndex.
+
+Run from the project root:
+    python -m benchmarks.directory_index
+"""
+
+import random
+import time
+
+from agents.directory_agent import TutorIndex
+
+TOPICS = [f"topic{i}" for i in range(200)]
+QUERIES = 1000
+
+
+def scan_registry(registry, topic):
+    """The pre-index lookup: every tutor, every expertise list."""
+    return [jid for jid, expertise_list in registry.items() if topic in expertise_list]
+
+
+def build_index(n_tutors, seed=42):
+    rng = random.Random(seed)
+    index = TutorIndex()
+    for i in range(n_tutors):
+        index.register(f"tutor{i}@localhost", rng.sample(TOPICS, 3))
+    return index
+
+
+def time_queries(lookup, queries):
+    start = time.perf_counter()
+    for topic in queries:
+        lookup(topic)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    rng = random.Random(0)
+    queries = [rng.choice(TOPICS) for _ in range(QUERIES)]
+
+    print(f"{'tutors':>8} | {'scan (us/query)':>16} | {'index (us/query)':>17} | speedup")
+    for n_tutors in (10_000, 100_000):
+        index = build_index(n_tutors)
+        scan = time_queries(lambda t: scan_registry(index.by_tutor, t), queries)
+        indexed = time_queries(index.find, queries)
+        print(f"{n_tutors:>8} | {scan * 1e6:>16.1f} | {indexed * 1e6:>17.1f} | {scan / indexed:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# project/benchmarks/logging_overhead.py
+"""
+Benchmark of the logging layer (logs.py) against the unconditional prints
+it replaced. Many concurrent coroutines on one event loop each replay the
+log calls the agents make for one served resource request (the
+ResourceAgent's "Waiting..." loop, the student FSM states, the monitor's
+per-event line), and the loop's throughput is reported in events/s.
+
+Modes:
+  print           every line, f-string formatted and printed on the loop (before)
+  TRACE direct    every line through loguru, written on the loop
+  TRACE queued    every line, written by the background thread (enqueue)
+  INFO queued     the default configuration
+  large.yaml      INFO, students and tutors at WARNING (scenarios/large.yaml)
+  quiet           --quiet: warnings and errors only
+
+Output goes to a line-buffered temporary file (one write per line, like a
+terminal) unless --stdout is given. "written" is the time until the last
+line reached it, i.e. including the writer thread's backlog.
+
+Run from the project root:
+    python -m benchmarks.logging_overhead
+"""
+
+import argparse
+import asyncio
+import contextlib
+import sys
+import tempfile
+import time
+
+import logs
+
+AGENTS = 1000        # Concurrent coroutines ("agents")
+EVENTS = 20          # Resource requests per agent
+
+MODES = {
+    "print": None,
+    "TRACE direct": {"level": "TRACE", "enqueue": False},
+    "TRACE queued": {"level": "TRACE", "enqueue": True},
+    "INFO queued": {"level": "INFO", "enqueue": True},
+    "large.yaml": {"level": "INFO", "levels": {"student": "WARNING", "tutor": "WARNING"}},
+    "quiet": {"quiet": True, "enqueue": True},
+}
+
+
+async def printing_agent(index, events):
+    name = f"student{index}"
+    for _ in range(events):
+        print(f"resource_manager: Waiting... (Load: {1}/{2}, Queue: {0}/{10})")
+        print(f"resource_manager: Received request for '{'physics'}' from {name}@localhost")
+        print(f"{name}: State: AWAIT_RESOURCES. Waiting for resource...")
+        print(f"resource_manager: Sent reply: {'{...}'} ({'cache'})")
+        print(f"{name}: Received resource: {'Newton'} (difficulty {0.4:.2f}) {'https://example.org'}")
+        print(f"[Monitor]: Logged '{'RESOURCE_PROVIDED'}'")
+        await asyncio.sleep(0)
+
+
+async def logging_agent(index, events):
+    name = f"student{index}"
+    student = logs.get_logger("student", name)
+    resource = logs.get_logger("resource", "resource_manager")
+    monitor = logs.get_logger("monitor", "monitor")
+    for _ in range(events):
+        resource.trace("Waiting... (Load: {}/{}, Queue: {}/{})", 1, 2, 0, 10)
+        resource.debug("Received request for '{}' from {}", "physics", f"{name}@localhost")
+        student.debug("State: AWAIT_RESOURCES. Waiting for resource...")
+        resource.debug("Sent reply: {} ({})", "{...}", "cache")
+        student.info("Received resource: {} (difficulty {:.2f}) {}", "Newton", 0.4, "https://example.org")
+        monitor.trace("Logged '{}'", "RESOURCE_PROVIDED")
+        await asyncio.sleep(0)
+
+
+async def replay(agent, agents, events):
+    await asyncio.gather(*(agent(index, events) for index in range(agents)))
+
+
+def run(mode, agents, events, sink):
+    """(events/s on the loop, seconds until everything was written)."""
+    config = MODES[mode]
+    if config is None:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            asyncio.run(replay(printing_agent, agents, events))
+        sink.flush()
+        elapsed = time.perf_counter() - start
+        return agents * events / elapsed, elapsed
+
+    logs.configure(sink=sink, **config)
+    start = time.perf_counter()
+    asyncio.run(replay(logging_agent, agents, events))
+    elapsed = time.perf_counter() - start
+    logs.shutdown()
+    return agents * events / elapsed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=AGENTS)
+    parser.add_argument("--events", type=int, default=EVENTS, help="Resource requests per agent")
+    parser.add_argument("--stdout", action="store_true", help="Write to the terminal instead of a file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in MODES:
+        if args.stdout:
+            results.append((mode, *run(mode, args.agents, args.events, sys.stdout)))
+        else:
+            with tempfile.TemporaryFile("w", buffering=1) as sink:
+                results.append((mode, *run(mode, args.agents, args.events, sink)))
+
+    print(f"{args.agents} agents x {args.events} resource requests, 6 log calls each\n", file=sys.stderr)
+    print(f"{'mode':>13} | {'events/s':>10} | {'written (s)':>11}", file=sys.stderr)
+    for mode, rate, written in results:
+        print(f"{mode:>13} | {rate:>10.0f} | {written:>11.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# project/benchmarks/loopback.py
+"""
+Benchmark of the loopback transport (loopback.py) against SPADE's own
+delivery. Pairs of agents play request/reply: one behaviour sends a
+REQUEST, the peer's template-matched behaviour receives it and answers
+with make_reply(), and the requester waits for the answer. Every agent
+also has three behaviours whose templates never match, like the tutoring
+agents, so template matching is part of the cost.
+
+Transports:
+  container   SPADE's in-process shortcut (Container.send -> Agent.dispatch),
+              what agents of one process use over XMPP
+  loopback    loopback.install()
+
+With --server it also times starting --agents agents over XMPP (connect,
+register, presence) against loopback, which is where most of a large
+simulation's wall time goes.
+
+Run from the project root (`spade run` listening for --server):
+    python -m benchmarks.loopback
+    python -m benchmarks.loopback --server
+"""
+
+import argparse
+import asyncio
+import time
+
+from spade.agent import Agent
+from spade.behaviour import CyclicBehaviour, OneShotBehaviour
+from spade.message import Message
+from spade.template import Template
+
+import logs
+import loopback
+
+PAIRS = 50           # Requester/responder pairs
+ROUNDS = 100         # Request/reply round trips per pair
+AGENTS = 100         # Agents started for the startup timing
+OTHER_PROTOCOLS = ("cfp", "tutor_query", "feedback")
+
+
+class Idle(CyclicBehaviour):
+    async def run(self):
+        await self.receive(timeout=1)
+
+
+class Responder(CyclicBehaviour):
+    async def run(self):
+        msg = await self.receive(timeout=1)
+        if msg:
+            reply = msg.make_reply()
+            reply.set_metadata("performative", "inform")
+            reply.body = msg.body
+            await self.send(reply)
+
+
+class Requester(OneShotBehaviour):
+    def __init__(self, peer, rounds):
+        super().__init__()
+        self.peer = peer
+        self.rounds = rounds
+
+    async def run(self):
+        for index in range(self.rounds):
+            msg = Message(to=self.peer, body=str(index), thread=f"{self.agent.name}-{index}")
+            msg.set_metadata("protocol", "bench")
+            msg.set_metadata("performative", "request")
+            await self.send(msg)
+            reply = await self.receive(timeout=10)
+            if reply is None or reply.body != str(index):
+                raise RuntimeError(f"{self.agent.name}: reply {index} lost")
+
+
+def template(protocol, performative):
+    t = Template()
+    t.set_metadata("protocol", protocol)
+    t.set_metadata("performative", performative)
+    return t
+
+
+def build_pair(prefix, index):
+    """A requester and a responder agent (not started), each with its idle behaviours."""
+    requester = Agent(f"{prefix}req{index}@localhost", "password")
+    responder = Agent(f"{prefix}resp{index}@localhost", "password")
+    for agent in (requester, responder):
+        for protocol in OTHER_PROTOCOLS:
+            agent.add_behaviour(Idle(), template(protocol, "request"))
+    responder.add_behaviour(Responder(), template("bench", "request"))
+    return requester, responder
+
+
+async def request_reply(prefix, pairs, rounds):
+    """
+    Round trips per second. The behaviours run without Agent.start(), so
+    the container transport needs no server either.
+    """
+    pairs = [build_pair(prefix, index) for index in range(pairs)]
+    agents = [agent for pair in pairs for agent in pair]
+    for agent in agents:
+        agent._alive.set()
+        for behaviour in agent.behaviours:
+            behaviour.start()
+
+    started = time.perf_counter()
+    requesters = [Requester(str(responder.jid), rounds) for _, responder in pairs]
+    for (requester, _), behaviour in zip(pairs, requesters):
+        requester.add_behaviour(behaviour, template("bench", "inform"))  # Starts it: the agent is alive
+    await asyncio.gather(*(behaviour.join() for behaviour in requesters))
+    elapsed = time.perf_counter() - started
+
+    for agent in agents:
+        for behaviour in agent.behaviours:
+            behaviour.kill()
+        agent._alive.clear()
+    for behaviour in requesters:
+        if behaviour.exit_code is not None and isinstance(behaviour.exit_code, Exception):
+            raise behaviour.exit_code
+    return len(pairs) * rounds / elapsed
+
+
+async def startup(prefix, agents):
+    """Seconds to start and stop `agents` agents."""
+    population = [Agent(f"{prefix}{index}@localhost", "password") for index in range(agents)]
+    for agent in population:
+        agent.add_behaviour(Idle(), template("bench", "request"))
+    started = time.perf_counter()
+    await asyncio.gather(*(agent.start(auto_register=True) for agent in population))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(agent.stop() for agent in population))
+    return elapsed
+
+
+async def benchmark(args):
+    rates, startups = {}, {}
+    rates["container"] = await request_reply("container", args.pairs, args.rounds)
+    if args.server:
+        startups["xmpp"] = await startup("startup", args.agents)
+
+    loopback.install()
+    rates["loopback"] = await request_reply("loopback", args.pairs, args.rounds)
+    if args.server:
+        startups["loopback"] = await startup("lbstartup", args.agents)
+    return rates, startups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=PAIRS)
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="Round trips per pair")
+    parser.add_argument("--agents", type=int, default=AGENTS, help="Agents started for the startup timing")
+    parser.add_argument("--server", action="store_true",
+                        help="Also time agent startup over XMPP; needs `spade run`")
+    args = parser.parse_args()
+
+    logs.configure(quiet=True)
+    rates, startups = asyncio.run(benchmark(args))
+
+    print(f"{args.pairs} pairs x {args.rounds} request/reply round trips\n")
+    print(f"{'transport':>10} | {'round trips/s':>13} | {'vs container':>12}")
+    for transport, rate in rates.items():
+        print(f"{transport:>10} | {rate:>13.0f} | {rate / rates['container']:>11.1f}x")
+    if startups:
+        print(f"\nStarting and registering {args.agents} agents")
+        for transport, seconds in startups.items():
+            print(f"{transport:>10} | {seconds:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
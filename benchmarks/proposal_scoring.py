@@ -0,0 +1,59 @@
+# project/benchmarks/proposal_scoring.py
+"""
+Micro-benchmark for ranking contract-net proposals.
+Compares per-offer scoring + full sort (the old SelectTutorState) against
+the batch scoring path of WaitExpertisePolicy (NumPy for large rounds)
+plus a heap that only pops the few candidates actually tried.
+
+Run from the project root:
+    python -m benchmarks.proposal_scoring
+"""
+
+import heapq
+import random
+import time
+
+from protocols.codec import Proposal
+from protocols.contract_net import WaitExpertisePolicy, default_score, np
+
+ROUNDS = 200
+TRIED = 3  # Candidates popped per round (best + two fallbacks)
+
+
+def make_offers(n, rng):
+    return [Proposal(rng.randint(5, 60), rng.choice([0.7, 0.9])) for _ in range(n)]
+
+
+def sort_all(offers):
+    ranked = sorted(((default_score(offer), i) for i, offer in enumerate(offers)))
+    return ranked[:TRIED]
+
+
+def heap_batch(policy, offers):
+    scores = policy.score_batch(offers)
+    heap = list(zip(scores, range(len(offers))))
+    heapq.heapify(heap)
+    return [heapq.heappop(heap) for _ in range(min(TRIED, len(heap)))]
+
+
+def time_rounds(rank, rounds):
+    start = time.perf_counter()
+    for offers in rounds:
+        rank(offers)
+    return (time.perf_counter() - start) / len(rounds)
+
+
+def main():
+    rng = random.Random(0)
+    policy = WaitExpertisePolicy()
+    print(f"NumPy available: {np is not None}")
+    print(f"{'proposals':>10} | {'sort (us/round)':>16} | {'heap+batch (us/round)':>22} | speedup")
+    for n in (10, 100, 1_000, 10_000):
+        rounds = [make_offers(n, rng) for _ in range(ROUNDS)]
+        sorted_time = time_rounds(sort_all, rounds)
+        heap_time = time_rounds(lambda offers: heap_batch(policy, offers), rounds)
+        print(f"{n:>10} | {sorted_time * 1e6:>16.1f} | {heap_time * 1e6:>22.1f} | {sorted_time / heap_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
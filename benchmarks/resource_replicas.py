@@ -0,0 +1,93 @@
+# project/benchmarks/resource_replicas.py
+"""
+Simulated benchmark for the resource replica pool.
+Replays the same request arrivals against 1..N ResourceAgent replicas
+(same bandwidth and queue each) and compares how students pick one:
+uniformly at random, or with the ReplicaSet (power of two choices on
+loads that are refreshed only every `ttl` seconds), both failing over to
+another replica on ERROR_SERVER_BUSY.
+
+Run from the project root:
+    python -m benchmarks.resource_replicas
+"""
+
+import heapq
+import random
+
+from agents.resource_agent import DOWNLOAD_TIME_RANGE
+from agents.student_agent import ReplicaSet
+
+BANDWIDTH = 2        # Download slots per replica
+MAX_QUEUE = 10       # Waiting requests per replica
+DURATION = 3600      # Simulated seconds
+ARRIVALS = 1.0       # Requests per second
+LOAD_TTL = 10        # Seconds between refreshes of the advertised loads
+
+
+class Replica:
+    def __init__(self):
+        self.slots = [0.0] * BANDWIDTH  # When each download slot frees up
+        self.ends = []                  # Completion times of admitted requests
+
+    def in_system(self, now):
+        while self.ends and self.ends[0] <= now:
+            heapq.heappop(self.ends)
+        return len(self.ends)
+
+    def admit(self, now, rng):
+        """Wait (seconds) of an admitted request, or None for ERROR_SERVER_BUSY."""
+        if self.in_system(now) >= BANDWIDTH + MAX_QUEUE:
+            return None
+        start = max(now, heapq.heappop(self.slots))
+        end = start + rng.uniform(*DOWNLOAD_TIME_RANGE)
+        heapq.heappush(self.slots, end)
+        heapq.heappush(self.ends, end)
+        return start - now
+
+
+def run(n_replicas, policy, seed=0):
+    rng = random.Random(seed)
+    random.seed(seed)  # ReplicaSet samples with the module-level generator
+    replicas = {f"resource_manager{i}@localhost": Replica() for i in range(n_replicas)}
+    balancer = ReplicaSet(LOAD_TTL)
+    served, busy, waited = 0, 0, 0.0
+    refreshed = None
+
+    now = 0.0
+    while now < DURATION:
+        now += rng.expovariate(ARRIVALS)
+        if refreshed is None or now - refreshed >= LOAD_TTL:
+            balancer.loads = {jid: r.in_system(now) / BANDWIDTH for jid, r in replicas.items()}
+            refreshed = now
+
+        balancer.reset()
+        while True:
+            if policy == "random":
+                candidates = [jid for jid in replicas if jid not in balancer.busy]
+                jid = rng.choice(candidates) if candidates else None
+            else:
+                jid = balancer.choose()
+            if jid is None:
+                busy += 1
+                break
+            wait = replicas[jid].admit(now, rng)
+            if wait is not None:
+                served += 1
+                waited += wait
+                break
+            balancer.mark_busy(jid)  # Fail over
+
+    return served, busy, waited / served if served else 0.0
+
+
+def main():
+    print(f"{ARRIVALS} requests/s for {DURATION}s, {BANDWIDTH} slots + {MAX_QUEUE} queued per replica\n")
+    print(f"{'replicas':>8} | {'policy':>6} | {'served/min':>10} | {'busy':>6} | {'mean wait (s)':>13}")
+    for n_replicas in (1, 2, 4, 8):
+        for policy in ("random", "p2c"):
+            served, busy, wait = run(n_replicas, policy)
+            print(f"{n_replicas:>8} | {policy:>6} | {served / DURATION * 60:>10.1f} | {busy:>6} | {wait:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
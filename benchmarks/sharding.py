@@ -0,0 +1,67 @@
+# project/benchmarks/sharding.py
+"""
+Scaling benchmark for multi-process sharding.
+Runs main.py on one scenario with 1, 2, 4 and 8 worker processes and
+reports wall-clock time and student throughput for each.
+
+Needs an XMPP server in another terminal that routes messages between
+client connections: the workers' students only reach the directory and
+the tutors through it. A run that does not finish within --timeout is
+killed together with its workers and reported as such. Run from the
+project root:
+    python -m benchmarks.sharding --scenario scenarios/large.yaml
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from launcher import load_scenario, population_specs
+
+WORKER_COUNTS = (1, 2, 4, 8)
+RUN_TIMEOUT = 1800  # Wall-clock seconds before a run is killed
+
+
+def run(scenario_path, workers, shard_tutors, timeout=RUN_TIMEOUT):
+    """Wall-clock seconds of one run, or None if it timed out."""
+    command = [sys.executable, "main.py", "--scenario", scenario_path, "--workers", str(workers)]
+    if shard_tutors:
+        command.append("--shard-tutors")
+    start = time.perf_counter()
+    # Own process group, so a run that hangs is killed with its worker processes
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, start_new_session=True)
+    try:
+        returncode = process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+        return None
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="scenarios/large.yaml")
+    parser.add_argument("--shard-tutors", action="store_true")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT, help="Wall-clock seconds per run")
+    args = parser.parse_args()
+
+    _, students = population_specs(load_scenario(args.scenario))
+    print(f"{'workers':>8} | {'wall time (s)':>14} | {'students/min':>13} | speedup")
+    baseline = None
+    for workers in WORKER_COUNTS:
+        elapsed = run(args.scenario, workers, args.shard_tutors, args.timeout)
+        if elapsed is None:
+            print(f"{workers:>8} | {'timed out':>14} | {'':>13} |")
+            continue
+        baseline = baseline or elapsed
+        print(f"{workers:>8} | {elapsed:>14.1f} | {len(students) / elapsed * 60:>13.1f} | {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
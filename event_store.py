@@ -0,0 +1,239 @@
+"""
+event_store.py
+Append-only SQLite store for MonitorAgent events.
+
+Events are buffered and written in batches, one transaction per batch, on
+a dedicated writer thread so the event loop never waits on disk. The
+database runs in WAL mode, so it can be read (e.g. by the report below)
+while a simulation is still writing to it. Memory stays bounded: at most
+`batch_size` buffered events plus `max_pending_batches` batches in flight;
+past that, append() waits for the writer.
+
+Each run gets its own run_id. The monitor report can be recomputed from
+the stored events with SQL, without re-running the simulation:
+    python -m event_store events.db            # latest run
+    python -m event_store events.db --run ID   # a given run
+"""
+
+import argparse
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    student TEXT,
+    tutor TEXT,
+    topic TEXT,
+    knowledge REAL,
+    timestamp REAL,
+    log_time REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_type ON events (run_id, event, timestamp);
+CREATE INDEX IF NOT EXISTS events_by_student ON events (run_id, student, timestamp);
+CREATE INDEX IF NOT EXISTS events_by_tutor ON events (run_id, tutor, timestamp);
+CREATE INDEX IF NOT EXISTS events_by_time ON events (run_id, timestamp);
+"""
+
+INSERT = """
+INSERT INTO events (run_id, event, student, tutor, topic, knowledge, timestamp, log_time, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; fsync only at checkpoints
+    return connection
+
+
+class EventStore:
+    """Batched, off-loop writer of monitor events into one SQLite run."""
+
+    def __init__(self, path, run_id=None, batch_size=500, max_pending_batches=8):
+        self.path = path
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.batch_size = batch_size
+        self.max_pending_batches = max_pending_batches
+        self.buffer = []
+        self.in_flight = deque()  # Futures of batches handed to the writer thread
+        self.written = 0
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-store")
+        self.connection = None    # Only used on the writer thread
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def append(self, event):
+        """Buffers one event; writes the buffer once it holds `batch_size` events."""
+        self.buffer.append((
+            self.run_id, event["event"], event.get("student"), event.get("tutor"),
+            event.get("topic"), event.get("knowledge"), event.get("timestamp"),
+            event.get("log_time"), json.dumps(event),
+        ))
+        if len(self.buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Hands the buffered events to the writer thread (waits only if it is too far behind)."""
+        if self.buffer:
+            batch, self.buffer = self.buffer, []
+            loop = asyncio.get_running_loop()
+            self.in_flight.append(loop.run_in_executor(self.writer, self._write, batch))
+        while self.in_flight and (self.in_flight[0].done() or len(self.in_flight) > self.max_pending_batches):
+            await self.in_flight.popleft()
+
+    async def close(self):
+        """Writes everything still buffered and closes the database."""
+        await self.flush()
+        while self.in_flight:
+            await self.in_flight.popleft()
+        await self._run(self._close)
+        self.writer.shutdown()
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.writer, function, *args)
+
+    # --- Writer thread ---
+
+    def _open(self):
+        self.connection = connect(self.path)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute("INSERT OR IGNORE INTO runs VALUES (?, ?)", (self.run_id, time.time()))
+
+    def _write(self, batch):
+        with self.connection:  # One transaction per batch
+            self.connection.executemany(INSERT, batch)
+        self.written += len(batch)
+
+    def _close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+# --- Metrics recomputed from a stored run ---
+
+def latest_run(connection):
+    row = connection.execute("SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def resource_utilization(connection, run_id):
+    """{topic: resources provided}"""
+    return dict(connection.execute(
+        "SELECT topic, COUNT(*) FROM events WHERE run_id = ? AND event = 'RESOURCE_PROVIDED' GROUP BY topic",
+        (run_id,)))
+
+
+def tutor_workload(connection, run_id):
+    """{tutor jid: sessions started}"""
+    return dict(connection.execute(
+        "SELECT tutor, COUNT(*) FROM events WHERE run_id = ? AND event = 'SESSION_START' GROUP BY tutor",
+        (run_id,)))
+
+
+def time_to_help(connection, run_id):
+    """
+    Seconds from a student's first open help request to the tutor it found,
+    for every STUDENT_FOUND_TUTOR (same pairing as MonitorMetrics), sorted.
+    """
+    rows = connection.execute("""
+        WITH found AS (
+            SELECT student, timestamp,
+                   LAG(timestamp, 1, -1e18) OVER (PARTITION BY student ORDER BY timestamp) AS previous
+            FROM events WHERE run_id = :run AND event = 'STUDENT_FOUND_TUTOR'
+        )
+        SELECT found.timestamp - (
+            SELECT MIN(request.timestamp) FROM events AS request
+            WHERE request.run_id = :run AND request.student = found.student
+              AND request.event = 'STUDENT_REQUEST_HELP'
+              AND request.timestamp > found.previous AND request.timestamp <= found.timestamp
+        ) AS duration
+        FROM found WHERE duration IS NOT NULL ORDER BY duration
+    """, {"run": run_id})
+    return [duration for (duration,) in rows]
+
+
+def learning_gains(connection, run_id):
+    """{student jid: (topic, knowledge gain or None if it never finished)}"""
+    rows = connection.execute("""
+        SELECT start.student, start.topic, finish.knowledge - start.knowledge
+        FROM events AS start
+        LEFT JOIN events AS finish
+            ON finish.run_id = start.run_id AND finish.student = start.student
+           AND finish.event = 'STUDENT_FINISH'
+        WHERE start.run_id = ? AND start.event = 'STUDENT_START'
+    """, (run_id,))
+    return {student: (topic, gain) for student, topic, gain in rows}
+
+
+def quantile(values, q):
+    """q-quantile of already sorted `values` (nearest rank)."""
+    return values[int(q * (len(values) - 1))]
+
+
+def print_report(connection, run_id):
+    events = connection.execute("SELECT COUNT(*) FROM events WHERE run_id = ?", (run_id,)).fetchone()[0]
+    print(f"--- Stored run {run_id}: {events} events ---\n")
+
+    resources = resource_utilization(connection, run_id)
+    print(f"### 1. Resource Utilization")
+    print(f"* Total resources provided: {sum(resources.values())}")
+    for topic, count in resources.items():
+        print(f"    - {topic}: {count}")
+
+    workload = tutor_workload(connection, run_id)
+    print(f"\n### 2. Tutor Workload Balance")
+    print(f"* Total tutoring sessions: {sum(workload.values())}")
+    for tutor, count in workload.items():
+        print(f"    - {tutor.split('@')[0]}: {count} session(s)")
+
+    timings = time_to_help(connection, run_id)
+    print(f"\n### 3. Time to Resolve Difficulties")
+    if timings:
+        print(f"* Average time to find a tutor: {sum(timings) / len(timings):.2f}s")
+        print(f"* Max time: {timings[-1]:.2f}s / Min time: {timings[0]:.2f}s")
+        print(f"* p50: {quantile(timings, 0.5):.2f}s / p95: {quantile(timings, 0.95):.2f}s / p99: {quantile(timings, 0.99):.2f}s")
+    else:
+        print(f"* No tutor requests were successfully resolved.")
+
+    gains = learning_gains(connection, run_id)
+    finished = [gain for _, gain in gains.values() if gain is not None]
+    print(f"\n### 4. Student Learning Gains")
+    if finished:
+        print(f"* Average knowledge gain: {sum(finished) / len(finished):.2f}")
+    else:
+        print(f"* No student lifecycles were completed.")
+    print(f"* Total completed: {len(finished)} / {len(gains)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the monitor report from a stored run.")
+    parser.add_argument("path", help="SQLite event store written by the MonitorAgent")
+    parser.add_argument("--run", help="Run id (default: the latest run)")
+    args = parser.parse_args()
+
+    connection = connect(args.path)
+    run_id = args.run or latest_run(connection)
+    if run_id is None:
+        parser.error(f"{args.path} holds no runs")
+    print_report(connection, run_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+launcher.py
+Builds an agent population from a scenario file and starts it.
+
+A scenario (YAML, see scenarios/) lists explicit tutors/students and/or
+asks for generated ones (`count`), drawn from the topic weights and the
+knowledge range. Agents are started concurrently, at most
+`startup.concurrency` at a time, and tutors count as ready once the
+DirectoryAgent has acknowledged their registration.
+
+With sharding (see sharding.py) every process generates the same
+population from the scenario seed and starts only its own slice of it.
+"""
+
+import asyncio
+import random
+import time
+
+import yaml
+from spade.agent import Agent
+from spade.behaviour import CyclicBehaviour
+
+from sim_clock import clock
+from logs import get_logger
+from agents.student_agent import StudentAgent
+from agents.tutor_agent import TutorAgent
+from agents.resource_agent import ResourceAgent
+from protocols.contract_net import WaitExpertisePolicy
+
+DEFAULT_TOPICS = {"mathematics": 1, "physics": 1, "history": 1, "biology": 1}
+PASSWORD = "password"
+START_ATTEMPTS = 3
+
+log = get_logger("launcher", "[Launcher]")
+
+
+def load_scenario(path):
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def population_specs(scenario):
+    """(tutor_specs, student_specs) for the whole scenario. Same seed, same population."""
+    rng = random.Random(scenario.get("seed"))
+    return tutor_specs(scenario, rng), student_specs(scenario, rng)
+
+
+def shard(specs, index, count):
+    """The slice of `specs` that shard `index` of `count` is responsible for (round-robin)."""
+    return specs[index::count]
+
+
+def tutor_specs(scenario, rng):
+    """[{name, expertise}] for every tutor in the scenario."""
+    section = scenario.get("tutors") or {}
+    topics = scenario.get("topics") or DEFAULT_TOPICS
+    specs = [dict(spec) for spec in section.get("agents") or []]
+
+    low, high = section.get("expertise_per_tutor", [1, 2])
+    for i in range(section.get("count", 0)):
+        k = min(rng.randint(low, high), len(topics))
+        specs.append({"name": f"tutor{len(specs) + 1}", "expertise": weighted_sample(rng, topics, k)})
+    return specs
+
+
+def student_specs(scenario, rng):
+    """[{name, topic, knowledge[, learning_style]}] for every student in the scenario."""
+    section = scenario.get("students") or {}
+    topics = scenario.get("topics") or DEFAULT_TOPICS
+    specs = [dict(spec) for spec in section.get("agents") or []]
+
+    low, high = section.get("knowledge", [0.1, 0.4])
+    styles = section.get("learning_styles")
+    names, weights = zip(*topics.items())
+    for i in range(section.get("count", 0)):
+        spec = {
+            "name": f"student{len(specs) + 1}",
+            "topic": rng.choices(names, weights)[0],
+            "knowledge": round(rng.uniform(low, high), 2),
+        }
+        if styles:
+            spec["learning_style"] = rng.choice(styles)
+        specs.append(spec)
+    return specs
+
+
+def weighted_sample(rng, weights, k):
+    """k distinct keys of `weights`, drawn proportionally to their weight."""
+    pool = dict(weights)
+    chosen = []
+    for _ in range(k):
+        names, values = zip(*pool.items())
+        name = rng.choices(names, values)[0]
+        chosen.append(name)
+        del pool[name]
+    return chosen
+
+
+def build_tutors(scenario, specs):
+    domain = scenario.get("xmpp_domain", "localhost")
+    section = scenario.get("tutors") or {}
+    max_sessions = section.get("max_sessions", 1)
+    tutors = []
+    for spec in specs:
+        tutor = TutorAgent(f"{spec['name']}@{domain}", PASSWORD)
+        tutor.set("expertise", spec["expertise"])
+        tutor.set("max_sessions", spec.get("max_sessions", max_sessions))
+        tutor.set("telemetry", scenario.get("telemetry"))
+        for setting in ("status_interval", "pricing", "max_quoted_wait", "service_time_alpha"):
+            tutor.set(setting, spec.get(setting, section.get(setting)))
+        tutors.append(tutor)
+    return tutors
+
+
+def build_students(scenario, specs):
+    domain = scenario.get("xmpp_domain", "localhost")
+    section = scenario.get("students") or {}
+    scoring = section.get("scoring")  # WaitExpertisePolicy weights (None = default_score)
+    policy = WaitExpertisePolicy(**scoring) if scoring else None
+    dashboard = scenario.get("dashboard") or {}
+    report_states = dashboard.get("student_states")  # None: only when the dashboard is served
+    if report_states is None:
+        report_states = bool(dashboard.get("port"))
+    students = []
+    for spec in specs:
+        student = StudentAgent(f"{spec['name']}@{domain}", PASSWORD)
+        student.set("topic_needed", spec["topic"])
+        student.set("knowledge", spec["knowledge"])
+        student.set("learning_style", spec.get("learning_style"))
+        student.set("telemetry", scenario.get("telemetry"))
+        student.set("directory_cache_ttl", section.get("directory_cache_ttl"))
+        student.set("directory_top_k", section.get("directory_top_k"))
+        student.set("directory_available_only", section.get("directory_available_only"))
+        student.set("resource_replica_ttl", section.get("resource_replica_ttl"))
+        student.set("retry", section.get("retry"))
+        student.set("proposal_deadline", section.get("proposal_deadline"))
+        student.set("proposals_good_enough", section.get("proposals_good_enough"))
+        student.set("scoring_policy", policy)
+        student.set("report_states", report_states)
+        students.append(student)
+    return students
+
+
+def build_resources(scenario):
+    """
+    The `resource.replicas` ResourceAgents: resource_manager, then
+    resource_manager2, resource_manager3, ...
+    """
+    domain = scenario.get("xmpp_domain", "localhost")
+    section = scenario.get("resource") or {}
+    replicas = []
+    for i in range(1, (section.get("replicas") or 1) + 1):
+        replica = ResourceAgent(f"resource_manager{i if i > 1 else ''}@{domain}", PASSWORD)
+        for setting in ("max_bandwidth", "max_queue", "cache_size_mb", "catalogue", "status_interval"):
+            replica.set(setting, section.get(setting))
+        replica.set("telemetry", scenario.get("telemetry"))
+        replicas.append(replica)
+    return replicas
+
+
+class DynamicEnvironmentBehav(CyclicBehaviour):
+    """Every `period` simulated seconds, flips a random tutor's availability."""
+
+    def __init__(self, period):
+        super().__init__()
+        self.period = period
+
+    async def run(self):
+        await clock.sleep(self.period)
+        if not self.agent.tutors:
+            return
+        tutor_to_change = random.choice(self.agent.tutors)
+        new_availability = random.choice([True, False])
+        tutor_to_change.is_available = new_availability
+        self.agent.log.info("Tutor {}'s availability changed to: {}", tutor_to_change.name, new_availability)
+
+
+async def start_environment(scenario, tutors, name="environment"):
+    """Starts the agent that randomly changes the availability of `tutors`."""
+    domain = scenario.get("xmpp_domain", "localhost")
+    environment_agent = Agent(f"{name}@{domain}", PASSWORD)
+    environment_agent.tutors = tutors
+    environment_agent.log = get_logger("environment", "[Environment]")
+    await environment_agent.start(auto_register=True)
+    period = (scenario.get("environment") or {}).get("period", 30)
+    environment_agent.add_behaviour(DynamicEnvironmentBehav(period=period))
+    return environment_agent
+
+
+async def start_agents(agents, concurrency, attempts=START_ATTEMPTS):
+    """
+    Starts all agents, at most `concurrency` connecting at the same time.
+    A failed connection is retried; returns the agents that never started.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def start(agent):
+        async with slots:
+            for attempt in range(1, attempts + 1):
+                try:
+                    await agent.start(auto_register=True)
+                    return True
+                except Exception as e:
+                    log.warning("{} failed to start (attempt {}/{}): {}", agent.jid, attempt, attempts, e)
+            return False
+
+    started = await asyncio.gather(*(start(agent) for agent in agents))
+    return [agent for agent, ok in zip(agents, started) if not ok]
+
+
+async def wait_for_registration(tutors, timeout):
+    """Waits until the directory acknowledged every tutor. Returns the ones still missing."""
+    pending = [tutor for tutor in tutors if not tutor.registered.is_set()]
+    if pending:
+        waits = [asyncio.create_task(tutor.registered.wait()) for tutor in pending]
+        await asyncio.wait(waits, timeout=timeout)
+        for wait in waits:
+            wait.cancel()
+    return [tutor for tutor in tutors if not tutor.registered.is_set()]
+
+
+async def launch_population(scenario, tutors=None, students=None):
+    """
+    Starts the tutors (waiting for their registration acks), then the students.
+    `tutors` / `students` are spec lists to start instead of the whole
+    scenario population (e.g. one shard, or [] for none).
+    Returns (tutors, students, startup_metrics).
+    """
+    all_tutors, all_students = population_specs(scenario)
+    tutors = all_tutors if tutors is None else tutors
+    students = all_students if students is None else students
+    startup = scenario.get("startup") or {}
+    concurrency = startup.get("concurrency", 50)
+
+    started_at = time.perf_counter()
+    tutors = build_tutors(scenario, tutors)
+    failed = await start_agents(tutors, concurrency)
+    tutors = [tutor for tutor in tutors if tutor not in failed]
+    missing = await wait_for_registration(tutors, startup.get("registration_timeout", 30))
+    if missing:
+        log.warning("{} tutor(s) were not acknowledged by the directory.", len(missing))
+    tutors_ready_at = time.perf_counter()
+
+    students = build_students(scenario, students)
+    failed_students = await start_agents(students, concurrency)
+    students = [student for student in students if student not in failed_students]
+    failed += failed_students
+    finished_at = time.perf_counter()
+    if failed:
+        log.warning("{} agent(s) could not be started and were left out.", len(failed))
+
+    metrics = {
+        "agents": len(tutors) + len(students),
+        "tutors": len(tutors),
+        "students": len(students),
+        "failed_to_start": len(failed),
+        "tutors_unregistered": len(missing),
+        "tutor_startup_s": tutors_ready_at - started_at,
+        "student_startup_s": finished_at - tutors_ready_at,
+        "total_startup_s": finished_at - started_at,
+        "concurrency": concurrency,
+    }
+    return tutors, students, metrics
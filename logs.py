@@ -0,0 +1,173 @@
+"""
+logs.py
+Level-gated logging for the agents (loguru).
+
+Every agent logs through its own AgentLog (get_logger(kind, name)), and
+each agent type ("student", "tutor", "resource", ...) has its own level.
+A call below that level returns after one comparison: messages take
+loguru's "{}" arguments instead of f-strings, so nothing is formatted for
+records that are not written.
+
+Records that pass go to one sink. With `enqueue` (the default) the event
+loop only puts the formatted line on a queue and a writer thread does
+the I/O (QueuedSink), so agents never wait on the terminal. `quiet`
+raises every level to WARNING for benchmark runs.
+
+configure() is called once per process (main.py, and each sharding
+worker with the coordinator's settings()).
+"""
+
+import queue
+import sys
+import threading
+
+from loguru import logger
+
+LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+DEFAULT_LEVEL = "INFO"
+QUIET_LEVEL = "WARNING"  # Benchmark mode: problems only
+# {elapsed} rather than {time:...}: formatting a timestamp costs as much as the rest of the record
+FORMAT = "<green>{elapsed}</green> | <level>{level: <7}</level> | {extra[prefix]}{message}"
+
+_default_level = LEVELS[DEFAULT_LEVEL]
+_thresholds = {}   # agent type -> lowest level number written
+_settings = {}
+_sink = None       # QueuedSink in use, if any
+
+
+class QueuedSink:
+    """
+    loguru sink that hands each formatted line to a writer thread, which
+    writes whatever has piled up in one go. (loguru's own enqueue=True
+    pickles every record through a multiprocessing queue, which costs
+    the event loop more than writing the line itself.)
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lines = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self.drain, name="log-writer", daemon=True)
+        self.writer.start()
+
+    def write(self, line):
+        self.lines.put(line)
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    def drain(self):
+        while True:
+            batch = [self.lines.get()]
+            while not self.lines.empty():
+                batch.append(self.lines.get_nowait())
+            self.stream.write("".join(item for item in batch if isinstance(item, str)))
+            self.stream.flush()
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()  # A flush() marker: everything before it is written
+                elif item is None:
+                    return
+
+    def complete(self):
+        """Blocks until every line written so far reached the stream."""
+        if self.writer.is_alive():
+            written = threading.Event()
+            self.lines.put(written)
+            written.wait()
+
+    def stop(self):
+        """Called by loguru when the sink is removed."""
+        if self.writer.is_alive():
+            self.lines.put(None)
+            self.writer.join()
+
+
+def _level_number(level):
+    try:
+        return LEVELS[level.upper()]
+    except KeyError:
+        raise ValueError(f"unknown log level {level!r} (one of {', '.join(LEVELS)})") from None
+
+
+def configure(level=DEFAULT_LEVEL, levels=None, quiet=False, enqueue=True, json=False, sink=None):
+    """
+    Sets the default level, the per agent type `levels` ({"student": "DEBUG"})
+    and the sink (stdout unless given). Replaces any previous configuration.
+    """
+    global _default_level, _sink
+    levels = levels or {}
+    _settings.clear()
+    _settings.update(level=level, levels=dict(levels), quiet=quiet, enqueue=enqueue, json=json)
+
+    if quiet:
+        _default_level = _level_number(QUIET_LEVEL)
+        _thresholds.clear()
+    else:
+        _default_level = _level_number(level)
+        _thresholds.clear()
+        _thresholds.update({kind: _level_number(name) for kind, name in levels.items()})
+
+    logger.remove()
+    stream = sink or sys.stdout
+    _sink = QueuedSink(stream) if enqueue else None
+    logger.add(_sink or stream, level=min([_default_level, *_thresholds.values()]), format=FORMAT,
+               serialize=json, colorize=sink is None and stream.isatty())
+
+
+def settings():
+    """Keyword arguments for configure() that reproduce this configuration in a worker process."""
+    return dict(_settings)
+
+
+def flush():
+    """Waits until every queued record has been written (e.g. before printing a report)."""
+    if _sink is not None:
+        _sink.complete()
+
+
+def shutdown():
+    """Writes what is queued and removes the sink; nothing is logged until configure() again."""
+    global _sink
+    logger.remove()
+    _sink = None
+
+
+class AgentLog:
+    """
+    Logger of one agent. `log.info("{}: got {}", a, b)` only formats and
+    writes when INFO is enabled for the agent's type.
+    """
+
+    __slots__ = ("kind", "logger")
+
+    def __init__(self, kind, name=None):
+        self.kind = kind
+        self.logger = logger.bind(agent_type=kind, agent=name, prefix=f"{name}: " if name else "")
+
+    def enabled(self, level):
+        """Whether `level` records are written (to skip work done only for a message)."""
+        return LEVELS[level] >= _thresholds.get(self.kind, _default_level)
+
+    def log(self, level, message, *args):
+        if LEVELS[level] >= _thresholds.get(self.kind, _default_level):
+            self.logger.log(level, message, *args)
+
+    def trace(self, message, *args):
+        self.log("TRACE", message, *args)
+
+    def debug(self, message, *args):
+        self.log("DEBUG", message, *args)
+
+    def info(self, message, *args):
+        self.log("INFO", message, *args)
+
+    def warning(self, message, *args):
+        self.log("WARNING", message, *args)
+
+    def error(self, message, *args):
+        self.log("ERROR", message, *args)
+
+
+def get_logger(kind, name=None):
+    """An AgentLog for agent type `kind`; `name` prefixes every message."""
+    return AgentLog(kind, name)
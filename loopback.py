@@ -0,0 +1,135 @@
+"""
+loopback.py
+In-process transport: runs the agents without an XMPP server.
+
+SPADE's Container already hands a message straight to its recipient when
+both agents live in this process, but every agent still connects,
+authenticates and registers with the XMPP server when it starts, and
+each delivery spawns two tasks and formats debug strings whether or not
+SPADE's debug logging is on.
+
+install() switches the whole process to the loopback transport:
+- Agent.start() skips the XMPP connection: setup() runs and the
+  behaviours start right away. stop() only kills the behaviours.
+- A message to an agent of this process is copied, as if it had been
+  parsed from a stanza (the receiver can make_reply() / set_metadata()
+  without touching the sender's object), and put straight into the
+  mailbox of every behaviour whose Template matches it, in send order.
+  matches() applies SPADE's Template semantics (including ~, &, | and ^)
+  without the debug string SPADE formats for every successful match.
+- A message to any other JID is dropped and counted: there is no server
+  to route it.
+
+Call it before agents are created. Every agent has to be in one process
+(no sharding workers), and XMPP presence and SPADE's message traces (web
+UI) are not available.
+"""
+
+from collections import Counter
+
+from spade.agent import Agent
+from spade.behaviour import CyclicBehaviour, FSMBehaviour
+from spade.message import Message
+from spade.template import ANDTemplate, NOTTemplate, ORTemplate, Template, XORTemplate
+
+from logs import get_logger
+
+log = get_logger("loopback", "[Loopback]")
+
+# Deliveries, messages no behaviour matched, messages to agents outside this process
+stats = Counter()
+_installed = False
+
+
+def installed():
+    return _installed
+
+
+def install():
+    """Makes every agent of this process use the loopback transport (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    Agent._async_start = _start
+    Agent._async_stop = _stop
+    CyclicBehaviour.send = _send
+    _installed = True
+
+
+async def _start(self, auto_register=True):
+    """Agent.start() without connecting to a server."""
+    await self._hook_plugin_before_connection()
+    await self._hook_plugin_after_connection()
+    await self.setup()
+    self._alive.set()
+    for behaviour in self.behaviours:
+        if not behaviour.is_running:
+            behaviour.set_agent(self)
+            if isinstance(behaviour, FSMBehaviour):
+                for state in behaviour.get_states().values():
+                    state.set_agent(self)
+            behaviour.start()
+
+
+async def _stop(self):
+    for behaviour in self.behaviours:
+        behaviour.kill()
+    if self.web.is_started():
+        await self.web.runner.cleanup()
+    self._alive.clear()
+
+
+async def _send(self, msg):
+    """Behaviour.send(): delivers to the recipient's behaviours in this process."""
+    if msg.empty_sender():
+        msg.sender = self.agent.jid
+    deliver(self.agent.container, msg)
+    msg.sent = True
+
+
+def deliver(container, msg):
+    to = msg.to.bare
+    if not container.has_agent(to):
+        if not stats[f"undeliverable:{to}"]:
+            log.warning("No agent {} in this process; its messages are dropped.", to)
+        stats[f"undeliverable:{to}"] += 1
+        stats["undeliverable"] += 1
+        return
+
+    received = Message.__new__(Message)  # Fields were validated when the sender set them
+    received.__dict__.update(msg.__dict__, sent=False, metadata=dict(msg.metadata))
+    matched = False
+    for behaviour in container.get_agent(to).behaviours:
+        if behaviour.template is None or matches(behaviour.template, received):
+            behaviour.queue.put_nowait(received)
+            matched = True
+    if matched:
+        stats["delivered"] += 1
+    else:
+        stats["unmatched"] += 1
+        log.debug("No behaviour of {} matched a message from {}", to, msg.sender)
+
+
+def matches(template, msg):
+    """Template.match(msg), minus the logging."""
+    kind = type(template)
+    if kind is Template:
+        if not template.empty_to() and msg.to != template.to:
+            return False
+        if not template.empty_sender() and msg.sender != template.sender:
+            return False
+        if template.body and msg.body != template.body:
+            return False
+        if template.thread and msg.thread != template.thread:
+            return False
+        metadata = msg.metadata
+        return all(metadata.get(key) == value for key, value in template.metadata.items())
+    if kind is NOTTemplate:
+        return not matches(template.expr, msg)
+    if kind is ANDTemplate:
+        return matches(template.expr1, msg) & matches(template.expr2, msg)
+    if kind is ORTemplate:
+        return matches(template.expr1, msg) | matches(template.expr2, msg)
+    if kind is XORTemplate:
+        return matches(template.expr1, msg) ^ matches(template.expr2, msg)
+    return template.match(msg)  # A custom template class
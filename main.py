@@ -1,129 +1,184 @@
 # project/main.py
-# (MODIFIED VERSION - LAUNCHES MULTIPLE STUDENTS)
+# (MODIFIED VERSION - LAUNCHES THE POPULATION FROM A SCENARIO FILE)
 
+import argparse
 import asyncio
 import spade
-import random
-from spade.behaviour import PeriodicBehaviour
+
+import logs
+import loopback
+from sim_clock import MIN_REAL_TIMEOUT, clock, track_messages
+from launcher import load_scenario, launch_population, start_environment, build_resources
+from sharding import run_shards, merge_startup
+from visualization.dashboard import start_dashboard, stop_dashboard
 
 # Import agent classes
-from agents.student_agent import StudentAgent
-from agents.tutor_agent import TutorAgent
-from agents.resource_agent import ResourceAgent
 from agents.directory_agent import DirectoryAgent
 from agents.monitor_agent import MonitorAgent
 
-# ... (DynamicEnvironmentBehav class remains the same) ...
-class DynamicEnvironmentBehav(PeriodicBehaviour):
-    async def run(self):
-        if not self.agent.tutors:
-            return
-        tutor_to_change = random.choice(self.agent.tutors)
-        new_availability = random.choice([True, False])
-        tutor_to_change.is_available = new_availability
-        print(f"[Environment]: Tutor {tutor_to_change.name}'s availability changed to: {new_availability}")
-
-
-async def main():
-    print("Starting the multi-agent system...")
+log = logs.get_logger("launcher")
+
+# Real seconds between checks for running students (virtual time moves on in between)
+FINISH_POLL_INTERVAL = 0.05
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the tutoring simulation.")
+    parser.add_argument("--scenario", default="scenarios/default.yaml",
+                        help="Scenario file describing the tutor/student population")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Simulation speed factor (10 = ten times faster than real time)")
+    parser.add_argument("--virtual", action="store_true", default=None,
+                        help="Virtual time: jump straight to the next scheduled wakeup when idle")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Run the students in N worker processes (0 = everything in this process)")
+    parser.add_argument("--shard-tutors", action="store_true", default=None,
+                        help="With --workers, also spread the tutors over the worker processes")
+    parser.add_argument("--transport", default=None, choices=["xmpp", "loopback"],
+                        help="loopback: deliver messages in memory, no XMPP server needed")
+    parser.add_argument("--event-store", default=None, metavar="PATH",
+                        help="Also persist every monitor event to this SQLite file (one more run per use)")
+    parser.add_argument("--dashboard", type=int, default=None, metavar="PORT",
+                        help="Serve the live metrics dashboard on this port")
+    parser.add_argument("--log-level", default=None, choices=list(logs.LEVELS),
+                        help="Default log level of every agent type")
+    parser.add_argument("--quiet", action="store_true", default=None,
+                        help="Benchmark mode: log warnings and errors only")
+    return parser
+
+
+async def wait_until_finished(agents):
+    """spade.wait_until_finished(), but polling often enough that virtual time cannot run far past the last student."""
+    while any(agent.is_alive() for agent in agents):
+        await asyncio.sleep(FINISH_POLL_INTERVAL)
+
+
+async def main(scenario, workers=0, shard_tutors=False, dashboard_port=None):
+    """Runs the scenario until every student finished. Returns the final monitor snapshot."""
+    log.info("Starting the multi-agent system... (speed x{}, virtual time: {})", clock.speed, clock.virtual)
 
     # A list to keep track of all server agents
     agents = []
 
-    # --- (All agent startup logic is the same) ---
+    monitor_config = scenario.get("monitor") or {}
     monitor = MonitorAgent("monitor@localhost", "password")
+    monitor.set("event_store", monitor_config.get("event_store"))
+    monitor.set("event_log_size", monitor_config.get("event_log_size"))
+    monitor.set("flush_interval", monitor_config.get("flush_interval"))
     await monitor.start(auto_register=True)
     agents.append(monitor)
-    print("Monitor Agent started.")
+    log.info("Monitor Agent started.")
+
+    dashboard = None
+    if dashboard_port:
+        dashboard = await start_dashboard(
+            dashboard_port, (scenario.get("dashboard") or {}).get("interval", 1.0))
 
     directory = DirectoryAgent("directory@localhost", "password")
     await directory.start(auto_register=True)
     agents.append(directory)
-    print("Directory Agent started.")
-
-    resource_mgr = ResourceAgent("resource_manager@localhost", "password")
-    await resource_mgr.start(auto_register=True)
-    agents.append(resource_mgr)
-
-    tutor1 = TutorAgent("tutor1@localhost", "password")
-    tutor1.set("expertise", ["mathematics", "physics"])
-    await tutor1.start(auto_register=True)
-    agents.append(tutor1)
-
-    tutor2 = TutorAgent("tutor2@localhost", "password")
-    tutor2.set("expertise", ["physics"])
-    await tutor2.start(auto_register=True)
-    agents.append(tutor2)
-    
-    tutor3 = TutorAgent("tutor3@localhost", "password")
-    tutor3.set("expertise", ["biology", "history"])
-    await tutor3.start(auto_register=True)
-    agents.append(tutor3)
-    print("Tutor agents started and registered.")
-
-    environment_agent = spade.agent.Agent("environment@localhost", "password")
-    environment_agent.tutors = [tutor1, tutor2, tutor3] 
-    await environment_agent.start(auto_register=True)
-    env_behav = DynamicEnvironmentBehav(period=30)
-    environment_agent.add_behaviour(env_behav)
-    agents.append(environment_agent)
-    
-    print("Server agents started. Waiting 5s before launching students...")
-    await asyncio.sleep(5) 
-
-    student_agents = []
-
-    # --- (Creating all 5 students is the same) ---
-    student1 = StudentAgent("student1@localhost", "password")
-    student1.set("topic_needed", "biology") # Changed for this test
-    student1.set("knowledge", 0.1)
-    await student1.start(auto_register=True)
-    student_agents.append(student1)
-
-    student2 = StudentAgent("student2@localhost", "password")
-    student2.set("topic_needed", "mathematics")
-    student2.set("knowledge", 0.3)
-    await student2.start(auto_register=True)
-    student_agents.append(student2)
-
-    student3 = StudentAgent("student3@localhost", "password")
-    student3.set("topic_needed", "history")
-    student3.set("knowledge", 0.2)
-    await student3.start(auto_register=True)
-    student_agents.append(student3)
-
-    student4 = StudentAgent("student4@localhost", "password")
-    student4.set("topic_needed", "mathematics")
-    student4.set("knowledge", 0.4)
-    await student4.start(auto_register=True)
-    student_agents.append(student4)
-
-    student5 = StudentAgent("student5@localhost", "password")
-    student5.set("topic_needed", "physics")
-    student5.set("knowledge", 0.1)
-    await student5.start(auto_register=True)
-    student_agents.append(student5)
-
-    print(f"System ready. {len(student_agents)} students are starting the learning process.")
-
-    # --- (Waiting for students is the same) ---
-    wait_tasks = [spade.wait_until_finished(s) for s in student_agents]
-    await asyncio.gather(*wait_tasks)
-
-    print("All students have finished learning. Shutting down the system...")
-
-    # --- (Stopping agents is the same) ---
-    for agent in agents:
-        await agent.stop()
-    
+    log.info("Directory Agent started.")
+
+    # Resource replicas register with the directory, so it has to be up first
+    resource_replicas = build_resources(scenario)
+    for resource_mgr in resource_replicas:
+        await resource_mgr.start(auto_register=True)
+        agents.append(resource_mgr)
+    log.info("{} Resource Agent replica(s) started.", len(resource_replicas))
+
+    if workers:
+        tutors, student_agents, startup = await run_sharded(scenario, workers, shard_tutors)
+    else:
+        # --- Tutors first (ready once the directory acknowledged them), then students ---
+        tutors, student_agents, startup = await launch_population(scenario)
+        log.info("[Launcher]: Started {} agents in {:.2f}s (tutors ready after {:.2f}s, concurrency {}).",
+                 startup["agents"], startup["total_startup_s"], startup["tutor_startup_s"], startup["concurrency"])
+
+        environment_agent = await start_environment(scenario, tutors)
+        log.info("System ready. {} students are starting the learning process.", len(student_agents))
+
+        await wait_until_finished(student_agents)
+        await environment_agent.stop()
+
+    log.info("All students have finished learning. Shutting down the system...")
+    monitor.set("startup", startup)
+
+    # Students and tutors first, so tutors can still deregister from the directory
     for student in student_agents:
         await student.stop()
+    for tutor in tutors:
+        await tutor.stop()
+
+    if dashboard:
+        await stop_dashboard(*dashboard)
+
+    # Monitor last: it prints its report on stop
+    for agent in reversed(agents):
+        await agent.stop()
+
+    if loopback.installed():
+        log.info("[Loopback]: {} messages delivered, {} unmatched, {} undeliverable.",
+                 loopback.stats["delivered"], loopback.stats["unmatched"], loopback.stats["undeliverable"])
+    log.info("System shut down.")
+    return dict(monitor.snapshot(), startup=startup)
+
+
+async def run_sharded(scenario, workers, shard_tutors):
+    """
+    Starts the tutors here (unless sharded), then runs the students in
+    `workers` processes until they all finished (see sharding.py).
+    Returns (local tutors, local students, merged startup metrics).
+    """
+    tutors, students, startup = await launch_population(
+        scenario, tutors=[] if shard_tutors else None, students=[])
+    environment_agent = await start_environment(scenario, tutors) if tutors else None
 
-    # --- THE FIX: Wait 1 second for monitor to print its report ---
-    await asyncio.sleep(5)
+    log.info("System ready. Running the students in {} worker process(es)...", workers)
+    worker_startup = await run_shards(scenario, workers, shard_tutors)
+    startup = merge_startup([startup] + worker_startup, workers)
+    log.info("[Launcher]: {} worker(s) started {} students (slowest worker took {:.2f}s).",
+             workers, startup["students"], startup["student_startup_s"])
 
-    print("System shut down.")
+    if environment_agent:
+        await environment_agent.stop()
+    return tutors, students, startup
 
 
 if __name__ == "__main__":
-    spade.run(main())
\ No newline at end of file
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 0:
+        parser.error("--workers must be 0 or more")
+    scenario = load_scenario(args.scenario)
+    clock_config = scenario.get("clock") or {}
+    clock.configure(
+        speed=args.speed if args.speed is not None else clock_config.get("speed", 1.0),
+        virtual=args.virtual if args.virtual is not None else clock_config.get("virtual", False),
+        min_real_timeout=clock_config.get("min_real_timeout", MIN_REAL_TIMEOUT),
+    )
+    if clock.virtual:
+        track_messages()
+    sharding = scenario.get("sharding") or {}
+    workers = args.workers if args.workers is not None else sharding.get("workers", 0)
+    shard_tutors = args.shard_tutors if args.shard_tutors is not None else sharding.get("shard_tutors", False)
+    if workers and clock.virtual:
+        parser.error("virtual time needs every agent in one process; use --speed with --workers")
+    transport = args.transport or scenario.get("transport", "xmpp")
+    if transport == "loopback":
+        if workers:
+            parser.error("the loopback transport needs every agent in one process; drop --workers")
+        loopback.install()
+    if args.event_store is not None:
+        scenario["monitor"] = dict(scenario.get("monitor") or {}, event_store=args.event_store)
+    dashboard_port = args.dashboard if args.dashboard is not None else (scenario.get("dashboard") or {}).get("port")
+    scenario["dashboard"] = dict(scenario.get("dashboard") or {}, port=dashboard_port)  # Students (and workers) see it
+    log_config = dict(scenario.get("logging") or {})
+    if args.log_level is not None:
+        log_config["level"] = args.log_level
+    if args.quiet is not None:
+        log_config["quiet"] = args.quiet
+    logs.configure(**log_config)
+    try:
+        spade.run(main(scenario, workers, shard_tutors, dashboard_port))
+    finally:
+        logs.shutdown()
@@ -0,0 +1,108 @@
+"""
+metrics.py
+Streaming statistics used by the MonitorAgent and the TutorAgent.
+
+The classes take one value at a time and keep bounded state, so a metric
+can be read at any moment of a run without keeping (or re-scanning) the
+values themselves.
+"""
+
+import math
+
+
+class QuantileSketch:
+    """
+    Streaming quantiles with bounded memory.
+    Values are counted in logarithmic buckets, each `precision` wide
+    relative to its value, so every quantile is within `precision`
+    (relative error) of the exact one however many values were added.
+    Values <= 0 share one bucket and read back as 0.
+    """
+
+    def __init__(self, precision=0.01):
+        self.gamma = (1 + precision) / (1 - precision)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}  # bucket index -> count
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), or None if nothing was added."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)  # Bucket midpoint
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class StreamingStats:
+    """Count, mean, min, max (and optionally quantiles) of a stream of values."""
+
+    def __init__(self, quantiles=False):
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch() if quantiles else None
+
+    def add(self, value):
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self.sketch:
+            self.sketch.add(value)
+
+    def quantile(self, q):
+        return self.sketch.quantile(q) if self.sketch else None
+
+    def snapshot(self):
+        """The current values as a JSON-friendly dict."""
+        result = {"count": self.count, "mean": self.mean if self.count else None,
+                  "min": self.min, "max": self.max}
+        if self.sketch:
+            for q in (0.5, 0.95, 0.99):
+                result[f"p{round(q * 100)}"] = self.sketch.quantile(q)
+        return result
+
+
+class ExponentialAverage:
+    """Exponentially weighted moving average; `alpha` is the weight of each new value."""
+
+    def __init__(self, alpha=0.2, initial=None):
+        self.alpha = alpha
+        self.value = initial
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+def gini(values):
+    """Gini coefficient of non-negative values: 0 = perfectly even, towards 1 = all on one."""
+    values = sorted(values)
+    total = sum(values)
+    if not values or total == 0:
+        return 0.0
+    n = len(values)
+    weighted = sum((i + 1) * value for i, value in enumerate(values))
+    return (2 * weighted) / (n * total) - (n + 1) / n
@@ -7,6 +7,9 @@ Decentralized Adaptive Learning System.
 # The unique string identifying the context of our interactions
 TUTORING_ONTOLOGY = "decentralized-tutoring-v1"
 
+# Version of the message body encoding (protocols/codec.py); bump on incompatible changes
+CONTENT_VERSION = 1
+
 # FIPA-ACL Performatives used in the Contract Net Protocol
 PERFORMATIVE_CFP = "cfp"
 PERFORMATIVE_PROPOSE = "propose"
@@ -14,4 +17,5 @@ PERFORMATIVE_REFUSE = "refuse"
 PERFORMATIVE_ACCEPT_PROPOSAL = "accept-proposal"
 PERFORMATIVE_REJECT_PROPOSAL = "reject-proposal"
 PERFORMATIVE_INFORM = "inform"
-PERFORMATIVE_FAILURE = "failure"
\ No newline at end of file
+PERFORMATIVE_FAILURE = "failure"
+PERFORMATIVE_CANCEL = "cancel"
\ No newline at end of file
@@ -0,0 +1,287 @@
+# project/protocols/codec.py
+"""
+Typed message bodies (content language) of the tutoring ontology (onthology.py).
+
+Every body the student, tutor, directory and resource agents exchange is
+one of the payload classes below (frozen dataclasses with __slots__), or
+empty for messages whose performative says it all (accept-proposal,
+reject-proposal, cancel, failure, registration), written as one compact
+line:
+
+    <version><tag>|field|field...      e.g. "1P|17.5|0.9" for a Proposal
+
+The version lets a receiver reject bodies it cannot read instead of
+misreading them, and the one-letter tag says which payload it is, so a
+reply that can be either (a Material or a ResourceError) decodes without
+guessing. Lists and dicts are flattened into trailing fields; "|" and
+"%" inside text are percent-escaped.
+
+encode(msg, payload) sets msg.body; decode(msg) parses it once and keeps
+the payload on the message, so asking again (or a loopback copy of the
+message, see loopback.py) costs nothing. Payloads are immutable, so the
+sender and receiver can share them.
+"""
+
+from dataclasses import dataclass
+
+from onthology import CONTENT_VERSION as CODEC_VERSION
+
+SEPARATOR = "|"
+_VERSION = str(CODEC_VERSION)
+
+# Error codes of ResourceError
+ERROR_NOT_FOUND = "ERROR_NOT_FOUND"
+ERROR_SERVER_BUSY = "ERROR_SERVER_BUSY"
+
+
+class CodecError(ValueError):
+    """A body that is not a (readable) payload of this codec version."""
+
+
+def _escape(text):
+    if SEPARATOR in text or "%" in text:
+        return text.replace("%", "%25").replace(SEPARATOR, "%7C")
+    return text
+
+
+def _unescape(field):
+    if "%" in field:
+        return field.replace("%7C", SEPARATOR).replace("%25", "%")
+    return field
+
+
+@dataclass(frozen=True)
+class Topic:
+    """A topic: CFPs, refusals, directory queries and invalidations, resource requests."""
+    __slots__ = ("topic",)
+    topic: str
+
+    TAG = "T"
+
+    def fields(self):
+        return [_escape(self.topic)]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(_unescape(fields[0]))
+
+
+@dataclass(frozen=True)
+class Proposal:
+    """A tutor's offer in the contract net."""
+    __slots__ = ("wait_time", "expertise_level")
+    wait_time: float
+    expertise_level: float
+
+    TAG = "P"
+
+    def fields(self):
+        return [repr(self.wait_time), repr(self.expertise_level)]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(float(fields[0]), float(fields[1]))
+
+
+@dataclass(frozen=True)
+class QueueTicket:
+    """Request accepted but queued (tutor session or resource download)."""
+    __slots__ = ("queue_position", "eta")
+    queue_position: int
+    eta: float
+
+    TAG = "Q"
+
+    def fields(self):
+        return [str(self.queue_position), repr(self.eta)]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(int(fields[0]), float(fields[1]))
+
+
+@dataclass(frozen=True)
+class SessionStart:
+    """A tutor confirms the session is starting, and how long it will take."""
+    __slots__ = ("duration",)
+    duration: float
+
+    TAG = "C"
+
+    def fields(self):
+        return [repr(self.duration)]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(float(fields[0]))
+
+
+@dataclass(frozen=True)
+class Expertise:
+    """The topics a tutor registers with the directory."""
+    __slots__ = ("topics",)
+    topics: tuple
+
+    TAG = "E"
+
+    def fields(self):
+        return [_escape(topic) for topic in self.topics]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(tuple(_unescape(field) for field in fields))
+
+
+@dataclass(frozen=True)
+class TutorStatus:
+    """A tutor's load, as published to the directory."""
+    __slots__ = ("available", "queue_length")
+    available: bool
+    queue_length: int
+
+    TAG = "S"
+
+    def fields(self):
+        return ["1" if self.available else "0", str(self.queue_length)]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(fields[0] == "1", int(fields[1]))
+
+
+@dataclass(frozen=True)
+class TutorList:
+    """The directory's answer to a topic query."""
+    __slots__ = ("tutors",)
+    tutors: tuple
+
+    TAG = "L"
+
+    def fields(self):
+        return [_escape(jid) for jid in self.tutors]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(tuple(_unescape(field) for field in fields))
+
+
+@dataclass(frozen=True)
+class ReplicaLoad:
+    """A resource replica's load (requests per download slot), as published to the directory."""
+    __slots__ = ("load",)
+    load: float
+
+    TAG = "R"
+
+    def fields(self):
+        return [repr(self.load)]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(float(fields[0]))
+
+
+@dataclass(frozen=True)
+class ReplicaLoads:
+    """The directory's answer to a service query: {jid: load} of every replica."""
+    __slots__ = ("loads",)
+    loads: dict
+
+    TAG = "D"
+
+    def fields(self):
+        fields = []
+        for jid, load in self.loads.items():
+            fields += (_escape(jid), repr(load))
+        return fields
+
+    @classmethod
+    def parse(cls, fields):
+        return cls({_unescape(fields[index]): float(fields[index + 1]) for index in range(0, len(fields), 2)})
+
+
+@dataclass(frozen=True)
+class Material:
+    """A learning material served by a resource replica."""
+    __slots__ = ("url", "title", "difficulty", "style")
+    url: str
+    title: str  # None: untitled
+    difficulty: float
+    style: str  # None: any style
+
+    TAG = "M"
+
+    def fields(self):
+        return [_escape(self.url), _escape(self.title or ""), repr(self.difficulty), _escape(self.style or "")]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(_unescape(fields[0]), _unescape(fields[1]) or None, float(fields[2]), _unescape(fields[3]) or None)
+
+
+@dataclass(frozen=True)
+class ResourceError:
+    """A resource request that could not be served (ERROR_NOT_FOUND, ERROR_SERVER_BUSY)."""
+    __slots__ = ("code",)
+    code: str
+
+    TAG = "X"
+
+    def fields(self):
+        return [self.code]
+
+    @classmethod
+    def parse(cls, fields):
+        return cls(fields[0])
+
+
+PAYLOADS = {cls.TAG: cls for cls in (
+    Topic, Proposal, QueueTicket, SessionStart, Expertise, TutorStatus, TutorList,
+    ReplicaLoad, ReplicaLoads, Material, ResourceError,
+)}
+
+
+def dumps(payload):
+    """The body for `payload`."""
+    return SEPARATOR.join([f"{CODEC_VERSION}{payload.TAG}", *payload.fields()])
+
+
+def loads(body):
+    """The payload written by dumps(). Raises CodecError for anything else."""
+    if not body:
+        raise CodecError("empty body")
+    fields = body.split(SEPARATOR)
+    head = fields[0]
+    if head[:-1] != _VERSION:
+        raise CodecError(f"unsupported body version in {body[:20]!r} (expected {CODEC_VERSION})")
+    cls = PAYLOADS.get(head[-1])
+    if cls is None:
+        raise CodecError(f"unknown payload tag in {body[:20]!r}")
+    try:
+        return cls.parse(fields[1:])
+    except (IndexError, ValueError) as e:
+        raise CodecError(f"malformed {cls.__name__} body {body[:40]!r}: {e}") from None
+
+
+def encode(msg, payload):
+    """Sets `msg.body` to `payload`, which decode() then returns without parsing."""
+    msg.body = dumps(payload)
+    msg._payload = (msg.body, payload)
+    return msg
+
+
+def decode(msg, kind=None):
+    """
+    The payload of `msg`, parsed at most once per body. With `kind`
+    (a payload class or a tuple of them) any other payload is a CodecError.
+    """
+    cached = getattr(msg, "_payload", None)
+    if cached is not None and cached[0] is msg.body:
+        payload = cached[1]
+    else:
+        payload = loads(msg.body)
+        msg._payload = (msg.body, payload)
+    if kind is not None and not isinstance(payload, kind):
+        expected = kind.__name__ if isinstance(kind, type) else " or ".join(k.__name__ for k in kind)
+        raise CodecError(f"expected {expected}, got {type(payload).__name__}")
+    return payload
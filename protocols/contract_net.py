@@ -0,0 +1,407 @@
+# project/protocols/contract_net.py
+"""
+Reusable FIPA Contract Net engine.
+
+- ContractNetInitiatorBehav: runs any number of concurrent negotiations for
+  one agent. Each negotiation is a conversation (message thread); proposals
+  and refusals are routed to it by thread id, and all deadlines live in one
+  timer heap (on the shared simulation clock) instead of a polling loop per negotiation.
+- ContractNetParticipantBehav: answers CFPs. Subclasses only decide what to
+  offer and what to do on accept/reject.
+
+Proposals are ranked by a pluggable ScoringPolicy when the negotiation
+closes, all at once (vectorised with NumPy for large rounds), and kept in
+a heap so the initiator can fall back to the next-best offer.
+
+CFPs carry a codec.Topic and proposals a codec.Proposal (protocols/codec.py).
+"""
+
+import asyncio
+import heapq
+import itertools
+import uuid
+from abc import ABC, abstractmethod
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: scoring falls back to plain Python
+    np = None
+from spade.behaviour import CyclicBehaviour
+from spade.message import Message
+from spade.template import Template
+
+from sim_clock import clock
+from logs import get_logger
+from protocols.codec import CodecError, Proposal, Topic, decode, encode
+from onthology import (
+    PERFORMATIVE_CFP,
+    PERFORMATIVE_PROPOSE,
+    PERFORMATIVE_REFUSE,
+    PERFORMATIVE_ACCEPT_PROPOSAL,
+    PERFORMATIVE_REJECT_PROPOSAL,
+    PERFORMATIVE_FAILURE,
+    PERFORMATIVE_CANCEL,
+)
+
+PROTOCOL_CONTRACT_NET = "fipa-contract-net"
+
+log = get_logger("contract_net")
+
+# Rounds with at least this many proposals are scored with NumPy
+VECTORIZE_THRESHOLD = 64
+
+
+def default_score(offer):
+    """Lower is better: expected wait plus a penalty for low expertise."""
+    return offer.wait_time + (1 - offer.expertise_level) * 20
+
+
+class ScoringPolicy(ABC):
+    """
+    Turns offers into scores (lower is better).
+    Subclasses implement `score`; `score_batch` may be overridden with a
+    vectorised version for large proposal sets.
+    """
+
+    @abstractmethod
+    def score(self, offer):
+        """Score of one codec.Proposal."""
+
+    def score_batch(self, offers):
+        return [self.score(offer) for offer in offers]
+
+
+class FunctionPolicy(ScoringPolicy):
+    """Wraps a plain `score(offer)` function."""
+
+    def __init__(self, function):
+        self.function = function
+
+    def score(self, offer):
+        return self.function(offer)
+
+
+class WaitExpertisePolicy(ScoringPolicy):
+    """
+    wait_time * wait_weight + (1 - expertise_level) * expertise_penalty.
+    With the default weights this is `default_score`.
+    """
+
+    def __init__(self, wait_weight=1.0, expertise_penalty=20.0):
+        self.wait_weight = wait_weight
+        self.expertise_penalty = expertise_penalty
+
+    def score(self, offer):
+        return offer.wait_time * self.wait_weight + (1 - offer.expertise_level) * self.expertise_penalty
+
+    def score_batch(self, offers):
+        if np is None or len(offers) < VECTORIZE_THRESHOLD:
+            return super().score_batch(offers)
+        wait = np.fromiter((offer.wait_time for offer in offers), float, len(offers))
+        expertise = np.fromiter((offer.expertise_level for offer in offers), float, len(offers))
+        return (wait * self.wait_weight + (1 - expertise) * self.expertise_penalty).tolist()
+
+
+def as_policy(score):
+    """Accepts a ScoringPolicy or a plain scoring function."""
+    return score if isinstance(score, ScoringPolicy) else FunctionPolicy(score)
+
+
+def cnp_template(*performatives):
+    """Template matching contract-net messages with any of the given performatives."""
+    result = None
+    for performative in performatives:
+        template = Template()
+        template.set_metadata("protocol", PROTOCOL_CONTRACT_NET)
+        template.set_metadata("performative", performative)
+        result = template if result is None else result | template
+    return result
+
+
+class DeadlineHeap:
+    """
+    Single timer for many deadlines.
+    Keeps (when, key) pairs in a heap and arms one clock.call_later() for the
+    earliest; `on_expire(key)` is called for every key whose deadline passes.
+    Cancelled keys are dropped lazily when they reach the top.
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire
+        self.heap = []
+        self.deadlines = {}  # key -> when (only live entries)
+        self.handle = None
+        self.armed_for = None
+
+    def schedule(self, key, timeout):
+        when = clock.elapsed() + clock.timeout(timeout)
+        self.deadlines[key] = when
+        heapq.heappush(self.heap, (when, key))
+        self.rearm()
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def rearm(self):
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)  # Cancelled or rescheduled entry
+        earliest = self.heap[0][0] if self.heap else None
+        if self.handle and self.armed_for == earliest:
+            return  # Already armed for the earliest deadline
+        if self.handle:
+            self.handle.cancel()
+            self.handle = None
+        self.armed_for = earliest
+        if earliest is not None:
+            self.handle = clock.call_later(earliest - clock.elapsed(), self.fire)
+
+    def fire(self):
+        self.handle = None
+        now = clock.elapsed()
+        while self.heap and self.heap[0][0] <= now:
+            when, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == when:
+                del self.deadlines[key]
+                self.on_expire(key)
+        self.rearm()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+
+class Negotiation:
+    """
+    One CFP round: who was asked, what came back, and when it is over.
+    Once finished, `proposals` holds (score, message, offer) and the
+    `candidates` heap the proposals not yet tried, best first.
+    """
+
+    def __init__(self, thread, topic, participants, good_enough=None):
+        self.thread = thread
+        self.topic = topic
+        self.participants = set(participants)
+        self.pending = set(participants)  # Not yet proposed/refused
+        self.good_enough = good_enough    # Finish after this many proposals
+        self.offers = []                  # [(message, offer)] as they arrive
+        self.proposals = []               # [(score, message, offer)], scored on finish
+        self.candidates = []              # Heap of (score, seq, message, offer) not yet tried
+        self.accepted = None              # Proposal message accepted last
+        self.refusals = []
+        self.expired = False
+        self.done = asyncio.get_running_loop().create_future()
+
+    def ranked(self):
+        """Proposals ordered best (lowest score) first."""
+        return sorted(self.proposals, key=lambda proposal: proposal[0])
+
+    def top(self, k):
+        """The k best proposals, best first, without sorting them all."""
+        return heapq.nsmallest(k, self.proposals, key=lambda proposal: proposal[0])
+
+    def next_candidate(self):
+        """Removes and returns the best untried (score, message, offer), or None."""
+        if not self.candidates:
+            return None
+        score, _, msg, offer = heapq.heappop(self.candidates)
+        return score, msg, offer
+
+    def rank(self, policy):
+        """Scores every offer in one batch and builds the candidate heap."""
+        scores = policy.score_batch([offer for _, offer in self.offers])
+        self.proposals = [(score, msg, offer) for score, (msg, offer) in zip(scores, self.offers)]
+        sequence = itertools.count()  # Tie-breaker: messages don't compare
+        self.candidates = [(score, next(sequence), msg, offer) for score, msg, offer in self.proposals]
+        heapq.heapify(self.candidates)
+
+    def finish(self, policy):
+        if not self.done.done():
+            self.rank(policy)
+            self.done.set_result(self)
+
+    async def wait(self):
+        return await self.done
+
+
+class ContractNetInitiatorBehav(CyclicBehaviour):
+    """
+    Initiator side of the Contract Net Protocol.
+    Add it with `cnp_template(PERFORMATIVE_PROPOSE, PERFORMATIVE_REFUSE)` so
+    it receives every answer; answers are matched to negotiations by thread.
+    """
+
+    def __init__(self, policy=None):
+        super().__init__()
+        self.policy = as_policy(policy or WaitExpertisePolicy())
+        self.negotiations = {}  # thread -> Negotiation
+        self.deadlines = DeadlineHeap(self.expire)
+
+    async def start_negotiation(self, topic, participants, deadline=5.0, good_enough=None):
+        """Sends a CFP to every participant and returns the open Negotiation."""
+        thread = str(uuid.uuid4())
+        cfp = Topic(topic)
+        cfps = []
+        for jid in participants:
+            msg = Message(to=jid)
+            msg.set_metadata("protocol", PROTOCOL_CONTRACT_NET)
+            msg.set_metadata("performative", PERFORMATIVE_CFP)
+            msg.thread = thread
+            encode(msg, cfp)
+            cfps.append(msg)
+        negotiation = Negotiation(thread, topic, [msg.to.bare for msg in cfps], good_enough)
+        self.negotiations[thread] = negotiation
+        for msg in cfps:
+            await self.send(msg)
+        if negotiation.pending:
+            self.deadlines.schedule(thread, deadline)
+        else:
+            self.close(thread)
+        return negotiation
+
+    async def negotiate(self, topic, participants, deadline=5.0, good_enough=None):
+        """Runs a full CFP round and returns the finished Negotiation."""
+        negotiation = await self.start_negotiation(topic, participants, deadline, good_enough)
+        return await negotiation.wait()
+
+    async def accept(self, negotiation, proposal_msg, reject_others=True):
+        """
+        Accepts one proposal and (optionally) rejects every other one.
+        With reject_others=False the other candidates stay available as
+        fallbacks; call reject_candidates() once they are not needed.
+        """
+        reply = proposal_msg.make_reply()
+        reply.set_metadata("performative", PERFORMATIVE_ACCEPT_PROPOSAL)
+        await self.send(reply)
+        negotiation.accepted = proposal_msg
+        if reject_others:
+            for _, msg, _ in negotiation.proposals:
+                if msg is not proposal_msg:
+                    await self.reject(msg)
+            negotiation.candidates.clear()
+
+    async def reject_candidates(self, negotiation):
+        """Rejects every proposal that was not tried."""
+        while negotiation.candidates:
+            _, msg, _ = negotiation.next_candidate()
+            await self.reject(msg)
+
+    async def reject(self, proposal_msg):
+        reply = proposal_msg.make_reply()
+        reply.set_metadata("performative", PERFORMATIVE_REJECT_PROPOSAL)
+        await self.send(reply)
+
+    async def cancel(self, proposal_msg):
+        """Withdraws an accepted proposal (e.g. the participant never confirmed in time)."""
+        reply = proposal_msg.make_reply()
+        reply.set_metadata("performative", PERFORMATIVE_CANCEL)
+        await self.send(reply)
+
+    def close(self, thread):
+        negotiation = self.negotiations.pop(thread, None)
+        self.deadlines.cancel(thread)
+        if negotiation:
+            negotiation.finish(self.policy)
+
+    def expire(self, thread):
+        negotiation = self.negotiations.pop(thread, None)
+        if negotiation:
+            negotiation.expired = True
+            negotiation.finish(self.policy)
+
+    def handle(self, msg):
+        """Routes one propose/refuse to its negotiation. Returns False if unknown."""
+        negotiation = self.negotiations.get(msg.thread)
+        if negotiation is None:
+            return False  # Late answer to a closed negotiation
+        sender = msg.sender.bare
+        if sender not in negotiation.pending:
+            # Only the first answer of each participant counts towards good_enough
+            log.debug("{}: Ignoring answer from {} (not asked, or already answered).", self.agent.name, sender)
+            return True
+        performative = msg.get_metadata("performative")
+        negotiation.pending.discard(sender)
+
+        if performative == PERFORMATIVE_PROPOSE:
+            try:
+                negotiation.offers.append((msg, decode(msg, Proposal)))
+            except CodecError as e:
+                log.warning("{}: Bad proposal from {}: {}", self.agent.name, sender, e)
+        elif performative == PERFORMATIVE_REFUSE:
+            negotiation.refusals.append(msg)
+
+        enough = negotiation.good_enough and len(negotiation.offers) >= negotiation.good_enough
+        if not negotiation.pending or enough:
+            self.close(msg.thread)
+        return True
+
+    async def run(self):
+        msg = await self.receive(timeout=100)
+        if msg:
+            self.handle(msg)
+
+    async def on_end(self):
+        for thread in list(self.negotiations):
+            self.expire(thread)
+
+
+class ContractNetParticipantBehav(CyclicBehaviour):
+    """
+    Participant side of the Contract Net Protocol.
+    Subclasses implement `make_offer` (return a codec.Proposal, or None to
+    refuse) and `on_accept` / `on_reject` / `on_cancel`. Open proposals are
+    tracked per thread and forgotten after `proposal_ttl` seconds without
+    an answer; accepting a forgotten (or unknown) proposal gets a 'failure'.
+    """
+
+    def __init__(self, proposal_ttl=30.0):
+        super().__init__()
+        self.proposal_ttl = proposal_ttl
+        self.open_proposals = {}  # thread -> offer
+        self.deadlines = DeadlineHeap(self.open_proposals.pop)
+
+    async def make_offer(self, msg):
+        return None
+
+    async def on_accept(self, msg, offer):
+        pass
+
+    async def on_reject(self, msg, offer):
+        pass
+
+    async def on_cancel(self, msg):
+        pass
+
+    async def run(self):
+        msg = await self.receive(timeout=100)
+        if not msg:
+            return
+
+        performative = msg.get_metadata("performative")
+        if performative == PERFORMATIVE_CFP:
+            offer = await self.make_offer(msg)
+            reply = msg.make_reply()
+            if offer is None:
+                reply.set_metadata("performative", PERFORMATIVE_REFUSE)
+                reply.body = msg.body
+            else:
+                reply.set_metadata("performative", PERFORMATIVE_PROPOSE)
+                encode(reply, offer)
+                if msg.thread:
+                    self.open_proposals[msg.thread] = offer
+                    self.deadlines.schedule(msg.thread, self.proposal_ttl)
+            await self.send(reply)
+
+        elif performative in (PERFORMATIVE_ACCEPT_PROPOSAL, PERFORMATIVE_REJECT_PROPOSAL):
+            offer = self.open_proposals.pop(msg.thread, None)
+            self.deadlines.cancel(msg.thread)
+            if performative == PERFORMATIVE_REJECT_PROPOSAL:
+                await self.on_reject(msg, offer)
+            elif offer is not None:
+                await self.on_accept(msg, offer)
+            else:
+                # Nothing is promised any more: the initiator must not wait for a confirmation
+                reply = msg.make_reply()
+                reply.set_metadata("performative", PERFORMATIVE_FAILURE)
+                await self.send(reply)
+
+        elif performative == PERFORMATIVE_CANCEL:
+            await self.on_cancel(msg)
@@ -0,0 +1,117 @@
+# project/protocols/conversations.py
+"""
+Request/reply conversations routed by thread id.
+
+Instead of swapping templates on one behaviour and receiving whatever
+arrives next, an agent adds one ConversationRouterBehav, with a template
+matching every reply it expects. `send(msg)` gives the message a fresh
+thread id (replies made with make_reply() keep it), and
+`receive_reply(protocol, thread, timeout)` returns the next reply of
+exactly that conversation.
+
+Replies that arrive before anyone waits for them (or for a conversation
+that is still open but busy) are parked in a Mailbox under (protocol,
+thread) instead of being dropped, and handed out on the next receive.
+Replies to a conversation that was closed (e.g. after a timeout) are
+dropped on arrival.
+"""
+
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from spade.behaviour import CyclicBehaviour
+
+from sim_clock import clock
+
+# Conversations with parked messages kept at most (oldest dropped first)
+DEFAULT_MAX_PARKED = 1000
+# Closed conversations remembered to drop their late replies (oldest forgotten first)
+DEFAULT_MAX_CLOSED = 1000
+
+
+class Mailbox:
+    """Messages per (protocol, thread), and the futures waiting for them."""
+
+    def __init__(self, max_parked=DEFAULT_MAX_PARKED, max_closed=DEFAULT_MAX_CLOSED):
+        self.max_parked = max_parked
+        self.max_closed = max_closed
+        self.parked = OrderedDict()  # (protocol, thread) -> deque of messages
+        self.waiters = {}            # (protocol, thread) -> Future
+        self.closed = OrderedDict()  # (protocol, thread) -> None, most recently closed last
+        self.delivered = 0           # Handed straight to a waiting conversation
+        self.parked_count = 0        # Parked until someone asked for them
+        self.dropped = 0             # Parked and never asked for
+        self.late = 0                # Arrived after their conversation was closed
+
+    def deliver(self, msg):
+        key = (msg.get_metadata("protocol"), msg.thread)
+        if key in self.closed:
+            self.late += 1
+            return
+        waiter = self.waiters.pop(key, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(msg)
+            self.delivered += 1
+            return
+        self.parked.setdefault(key, deque()).append(msg)
+        self.parked.move_to_end(key)
+        self.parked_count += 1
+        while len(self.parked) > self.max_parked:
+            _, messages = self.parked.popitem(last=False)
+            self.dropped += len(messages)
+
+    async def get(self, protocol, thread, timeout=None):
+        """The next message of the conversation, or None after `timeout` simulated seconds."""
+        key = (protocol, thread)
+        messages = self.parked.get(key)
+        if messages:
+            msg = messages.popleft()
+            if not messages:
+                del self.parked[key]
+            return msg
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[key] = waiter
+        try:
+            return await clock.wait_for(waiter, timeout)
+        finally:
+            if self.waiters.get(key) is waiter:
+                del self.waiters[key]
+
+    def close(self, protocol, thread):
+        """Forgets a finished conversation and anything still parked for it; later replies are dropped."""
+        key = (protocol, thread)
+        self.dropped += len(self.parked.pop(key, ()))
+        self.closed[key] = None
+        self.closed.move_to_end(key)
+        while len(self.closed) > self.max_closed:
+            self.closed.popitem(last=False)
+
+
+class ConversationRouterBehav(CyclicBehaviour):
+    """
+    Receives the replies of the agent's conversations and routes them by
+    (protocol, thread). Add it with a template matching every reply the
+    agent waits for; the waiting side calls send()/receive() on it.
+    """
+
+    def __init__(self, max_parked=DEFAULT_MAX_PARKED, max_closed=DEFAULT_MAX_CLOSED):
+        super().__init__()
+        self.mailbox = Mailbox(max_parked, max_closed)
+
+    async def send(self, msg):
+        """Starts a conversation (unless `msg` already has a thread) and returns its thread id."""
+        if not msg.thread:
+            msg.thread = str(uuid.uuid4())
+        await super().send(msg)
+        return msg.thread
+
+    async def receive_reply(self, protocol, thread, timeout=None):
+        return await self.mailbox.get(protocol, thread, timeout)
+
+    def close(self, protocol, thread):
+        self.mailbox.close(protocol, thread)
+
+    async def run(self):
+        msg = await self.receive(timeout=100)
+        if msg:
+            self.mailbox.deliver(msg)
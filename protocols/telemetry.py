@@ -0,0 +1,76 @@
+# project/protocols/telemetry.py
+"""
+Batched telemetry for the MonitorAgent.
+
+Agents call `report(event)` instead of sending one MonitorProtocol message
+per event. TelemetryBehav buffers the events and sends them as a single
+message, body {"events": [...]}, once `max_batch` events are buffered or
+`max_delay` simulated seconds after the first one, whichever comes first. Agents
+call `flush()` before stopping so nothing buffered is lost.
+"""
+
+import asyncio
+import json
+from spade.behaviour import CyclicBehaviour
+from spade.message import Message
+from spade.template import Template
+
+from sim_clock import clock
+
+PROTOCOL_MONITOR = "MonitorProtocol"
+MONITOR_AGENT_JID = "monitor@localhost"
+
+# Longest the behaviour idles before re-checking the buffer (simulated seconds)
+IDLE_TIMEOUT = 100
+
+
+def telemetry_template():
+    """
+    Template for TelemetryBehav. It never receives anything, but a
+    behaviour without a template would get a copy of every message.
+    """
+    template = Template()
+    template.set_metadata("protocol", PROTOCOL_MONITOR)
+    template.set_metadata("performative", "inform")
+    return template
+
+
+class TelemetryBehav(CyclicBehaviour):
+
+    def __init__(self, monitor_jid=MONITOR_AGENT_JID, max_batch=50, max_delay=1.0):
+        super().__init__()
+        self.monitor_jid = monitor_jid
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.buffer = []
+        self.pending = asyncio.Event()  # At least one event is buffered
+        self.full = asyncio.Event()     # `max_batch` events are buffered
+        self.messages_sent = 0
+        self.events_sent = 0
+
+    def report(self, event):
+        """Buffers one event (a dict with at least 'event' and 'timestamp')."""
+        self.buffer.append(event)
+        self.pending.set()
+        if len(self.buffer) >= self.max_batch:
+            self.full.set()
+
+    async def flush(self):
+        """Sends everything buffered as one message."""
+        self.pending.clear()
+        self.full.clear()
+        if not self.buffer:
+            return
+        events, self.buffer = self.buffer, []
+        msg = Message(to=self.monitor_jid)
+        msg.set_metadata("protocol", PROTOCOL_MONITOR)
+        msg.set_metadata("performative", "inform")
+        msg.body = json.dumps({"events": events})
+        await self.send(msg)
+        self.messages_sent += 1
+        self.events_sent += len(events)
+
+    async def run(self):
+        if await clock.wait_for(self.pending.wait(), IDLE_TIMEOUT):
+            await clock.wait_for(self.full.wait(), self.max_delay)
+        await self.flush()
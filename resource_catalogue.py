@@ -0,0 +1,189 @@
+"""
+resource_catalogue.py
+Learning materials served by the ResourceAgent.
+
+A catalogue answers one question: which material should a student with
+a given knowledge level (and learning style) get for a topic? Materials
+are dicts with id, topic, difficulty (0.0 - 1.0), style, url, title and
+size_mb.
+
+- DictCatalogue: the original four built-in links, one per topic.
+- SQLiteCatalogue: any number of materials in a SQLite file. Opening it
+  reads nothing; the (topic, style, difficulty) index is created on the
+  first lookup if the file does not have it yet, and every lookup is an
+  index seek (O(log n)).
+
+Build a catalogue file from a JSON list of materials, or generate a
+synthetic one:
+    python -m resource_catalogue import catalogue.db materials.json
+    python -m resource_catalogue generate catalogue.db --per-topic 20000
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+
+# A material is picked slightly above what the student already knows
+DIFFICULTY_STEP = 0.1
+DEFAULT_SIZE_MB = 20
+LEARNING_STYLES = ["visual", "auditory", "reading", "kinesthetic"]
+
+COLUMNS = ("id", "topic", "difficulty", "style", "url", "title", "size_mb")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS materials (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    difficulty REAL NOT NULL,
+    style TEXT,
+    url TEXT NOT NULL,
+    title TEXT,
+    size_mb REAL NOT NULL DEFAULT 20
+)
+"""
+INDEX = "CREATE INDEX IF NOT EXISTS materials_lookup ON materials (topic, style, difficulty)"
+
+
+def target_difficulty(knowledge):
+    return min((knowledge or 0.0) + DIFFICULTY_STEP, 1.0)
+
+
+class DictCatalogue:
+    """One material per topic, whatever the student's level or style."""
+
+    def __init__(self, resources):
+        self.materials = {
+            topic: {"id": topic, "topic": topic, "difficulty": 0.5, "style": None,
+                    "url": url, "title": topic, "size_mb": DEFAULT_SIZE_MB}
+            for topic, url in resources.items()
+        }
+
+    def lookup(self, topic, knowledge=None, style=None):
+        return self.materials.get(topic)
+
+    def close(self):
+        pass
+
+
+class SQLiteCatalogue:
+    """Materials in a SQLite file, looked up through a (topic, style, difficulty) index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.indexed = False
+
+    def ensure_index(self):
+        """Creates the lookup index the first time it is needed (once per file)."""
+        if not self.indexed:
+            with self.connection:
+                self.connection.execute(INDEX)
+            self.indexed = True
+
+    def lookup(self, topic, knowledge=None, style=None):
+        """
+        The material for `topic` closest to (at or just above) the student's
+        level, preferring the student's learning style.
+        """
+        self.ensure_index()
+        target = target_difficulty(knowledge)
+        for wanted_style in ([style, None] if style else [None]):
+            material = self._seek(topic, wanted_style, target)
+            if material:
+                return material
+        return None
+
+    def _seek(self, topic, style, target):
+        # Two index seeks: the easiest material at/above the target, else the hardest below it
+        style_filter = "style = :style" if style else "1"
+        for comparison, order in ((">=", "ASC"), ("<", "DESC")):
+            row = self.connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM materials "
+                f"WHERE topic = :topic AND {style_filter} AND difficulty {comparison} :target "
+                f"ORDER BY difficulty {order} LIMIT 1",
+                {"topic": topic, "style": style, "target": target},
+            ).fetchone()
+            if row:
+                return dict(row)
+        return None
+
+    def close(self):
+        self.connection.close()
+
+
+def open_catalogue(path=None, resources=None):
+    """SQLiteCatalogue for `path`, or a DictCatalogue of `resources` if there is none."""
+    if path:
+        return SQLiteCatalogue(path)
+    return DictCatalogue(resources or {})
+
+
+# --- Building catalogue files ---
+
+def create(path):
+    connection = sqlite3.connect(path)
+    connection.execute(SCHEMA)
+    return connection
+
+
+def import_json(path, source):
+    """
+    Adds the materials of a JSON list (dicts with the COLUMNS keys except id).
+    A material without a title is titled after its topic, as in DictCatalogue.
+    """
+    with open(source) as f:
+        materials = json.load(f)
+    connection = create(path)
+    with connection:
+        connection.executemany(
+            "INSERT INTO materials (topic, difficulty, style, url, title, size_mb) "
+            "VALUES (:topic, :difficulty, :style, :url, :title, :size_mb)",
+            ({"style": None, "size_mb": DEFAULT_SIZE_MB, **material, "title": material.get("title") or material["topic"]}
+             for material in materials),
+        )
+    connection.close()
+    return len(materials)
+
+
+def generate(path, topics, per_topic, seed=0):
+    """Writes `per_topic` synthetic materials for each topic."""
+    rng = random.Random(seed)
+    connection = create(path)
+    with connection:
+        for topic in topics:
+            connection.executemany(
+                "INSERT INTO materials (topic, difficulty, style, url, title, size_mb) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (topic, round(rng.random(), 3), rng.choice(LEARNING_STYLES),
+                     f"https://materials.example.com/{topic}/{i}", f"{topic.title()} #{i}",
+                     rng.randint(5, 50))
+                    for i in range(per_topic)
+                ),
+            )
+    connection.close()
+    return len(topics) * per_topic
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a resource catalogue file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    from_json = commands.add_parser("import", help="Add materials from a JSON list")
+    from_json.add_argument("path")
+    from_json.add_argument("source")
+    synthetic = commands.add_parser("generate", help="Generate synthetic materials")
+    synthetic.add_argument("path")
+    synthetic.add_argument("--per-topic", type=int, default=20000)
+    synthetic.add_argument("--topics", nargs="+", default=["mathematics", "physics", "history", "biology"])
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_json(args.path, args.source)
+    else:
+        count = generate(args.path, args.topics, args.per_topic)
+    print(f"Added {count} materials to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
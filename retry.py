@@ -0,0 +1,46 @@
+"""
+retry.py
+Retry timing for agents that poll busy services (the student FSM).
+
+A fixed sleep makes every student that was turned away at the same
+moment come back at the same moment. RetryPolicy waits a random time
+between 0 and a window that doubles with each failed attempt (capped),
+counted separately for each kind of retry, and never earlier than a
+retry-after hint the server gave.
+"""
+
+import random
+
+DEFAULT_BASE = 5.0   # Simulated seconds; window of the first retry
+DEFAULT_CAP = 60.0   # Largest window
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter, per retry reason."""
+
+    def __init__(self, base=DEFAULT_BASE, cap=DEFAULT_CAP, seed=None):
+        self.base = base
+        self.cap = cap
+        self.rng = random.Random(seed)
+        self.attempts = {}  # reason -> consecutive failures
+
+    def window(self, attempt):
+        """Longest wait before retry number `attempt` (1-based)."""
+        return min(self.cap, self.base * 2 ** (attempt - 1))
+
+    def next_delay(self, reason, retry_after=None):
+        """
+        Counts a failure for `reason`. Returns (attempt, seconds to wait):
+        uniform in [0, window], starting after `retry_after` if given.
+        """
+        attempt = self.attempts.get(reason, 0) + 1
+        self.attempts[reason] = attempt
+        return attempt, (retry_after or 0.0) + self.rng.uniform(0, self.window(attempt))
+
+    def jitter(self, seconds):
+        """A uniform wait in [0, seconds]: spreads out agents that would start together."""
+        return self.rng.uniform(0, seconds)
+
+    def succeeded(self, reason):
+        """The next failure for `reason` starts from the first window again."""
+        self.attempts.pop(reason, None)
@@ -0,0 +1,117 @@
+"""
+sharding.py
+Runs the student (and optionally tutor) population in worker processes.
+
+The coordinator process (main.py --workers N) keeps the Monitor, Directory
+and Resource agents, plus the tutors unless they are sharded too. Each
+worker process generates the same population from the scenario seed,
+starts its round-robin slice of it in its own SPADE event loop against the
+same XMPP server, and returns its startup metrics when its students are
+done. Every agent still reports to the single MonitorAgent, so its report
+covers the whole population.
+
+Workers share the coordinator's clock origin (sim_clock.settings()), so
+monitor timestamps from different processes are comparable, and its
+logging configuration (logs.settings()). Virtual time needs every agent
+in one process and is not supported here.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import spade
+
+import logs
+from sim_clock import clock
+from launcher import population_specs, shard, launch_population, start_environment
+
+# Startup metrics that add up across processes (the rest are durations or per-process settings)
+COUNTED_METRICS = ("agents", "tutors", "students", "failed_to_start", "tutors_unregistered")
+
+
+def run_worker(scenario, index, count, clock_settings, log_settings, shard_tutors, students_done):
+    """Process entry point: runs shard `index` of `count` and returns its startup metrics."""
+    clock.configure(**clock_settings)
+    logs.configure(**log_settings)
+    result = {}
+
+    async def main():
+        result.update(await worker_main(scenario, index, count, shard_tutors, students_done))
+
+    try:
+        spade.run(main())
+    finally:
+        logs.shutdown()
+    return result
+
+
+async def worker_main(scenario, index, count, shard_tutors, students_done):
+    tutor_specs, student_specs = population_specs(scenario)
+    tutors, students, startup = await launch_population(
+        scenario,
+        tutors=shard(tutor_specs, index, count) if shard_tutors else [],
+        students=shard(student_specs, index, count),
+    )
+    log = logs.get_logger("launcher", f"[Worker {index}]")
+    environment = None
+    if tutors:
+        environment = await start_environment(scenario, tutors, name=f"environment-w{index}")
+    log.info("Started {} students and {} tutors in {:.2f}s.",
+             len(students), len(tutors), startup["total_startup_s"])
+
+    await asyncio.gather(*(spade.wait_until_finished(s) for s in students))
+    log.info("All {} students have finished.", len(students))
+
+    if tutors:
+        # Students in other workers may still be negotiating with our tutors
+        try:
+            await asyncio.to_thread(students_done.wait)
+        except threading.BrokenBarrierError:
+            log.warning("Another worker failed. Shutting down.")
+
+    if environment:
+        await environment.stop()
+    for student in students:
+        await student.stop()
+    for tutor in tutors:
+        await tutor.stop()
+    return startup
+
+
+async def run_shards(scenario, count, shard_tutors=False):
+    """
+    Runs `count` worker processes to completion.
+    Returns their startup metrics; re-raises the first worker failure.
+    """
+    loop = asyncio.get_running_loop()
+    context = multiprocessing.get_context("spawn")  # No event loop state leaks into workers
+    with context.Manager() as manager, ProcessPoolExecutor(count, mp_context=context) as pool:
+        students_done = manager.Barrier(count)
+        futures = [
+            loop.run_in_executor(pool, run_worker, scenario, index, count,
+                                 clock.settings(), logs.settings(), shard_tutors, students_done)
+            for index in range(count)
+        ]
+        pending = futures
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            if any(future.exception() for future in done):
+                students_done.abort()  # Don't leave the other workers waiting for it
+        return [future.result() for future in futures]
+
+
+def merge_startup(metrics, workers):
+    """
+    Combines the startup metrics of the coordinator and every worker.
+    Processes start in parallel, so durations are the slowest process's;
+    `concurrency` is a per-process limit, so it is the largest one.
+    """
+    merged = {key: sum(m[key] for m in metrics) for key in COUNTED_METRICS}
+    merged["concurrency"] = max(m["concurrency"] for m in metrics)
+    merged["tutor_startup_s"] = max(m["tutor_startup_s"] for m in metrics)
+    merged["student_startup_s"] = max(m["student_startup_s"] for m in metrics)
+    merged["total_startup_s"] = merged["tutor_startup_s"] + merged["student_startup_s"]
+    merged["workers"] = workers
+    return merged
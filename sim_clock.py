@@ -0,0 +1,250 @@
+"""
+sim_clock.py
+Shared simulation clock for the Decentralized Adaptive Learning System.
+
+Every behaviour that waits, times out or timestamps an event goes through
+the module-level `clock`, so a run can be sped up without changing the
+agents:
+
+- speed mode (default, speed=1.0 is wall-clock): simulated time runs
+  `speed` times faster than real time and sleeps/timeouts shrink with it.
+  Message latency does not shrink, so a timeout never lasts less than
+  `min_real_timeout` real seconds (see timeout()).
+- virtual mode: simulated time only moves when no timer was touched for
+  VIRTUAL_SETTLE_TIME and no message is in flight (sent but not yet taken
+  out of a running behaviour's mailbox, see track_messages()); it then
+  jumps straight to the next scheduled wakeup. Meant for runs where all
+  agents share one process. A mailbox that nobody drains does not freeze
+  the clock: time moves anyway after VIRTUAL_MAX_HOLD real seconds
+  without progress.
+
+Timestamps from `clock.time()` are in simulated seconds, so metrics are
+comparable across speed factors.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+
+from logs import get_logger
+
+log = get_logger("clock", "[Clock]")
+
+# Real seconds a timeout lasts at least in speed mode (replies take real time whatever the speed)
+MIN_REAL_TIMEOUT = 2.0
+# Real seconds the virtual clock waits for in-flight work before jumping
+VIRTUAL_SETTLE_TIME = 0.02
+# Real seconds the virtual clock waits for queued messages that are not being received
+VIRTUAL_MAX_HOLD = 5.0
+# Real timeout handed to receive() while a virtual timeout is pending
+REAL_FOREVER = 10 ** 9
+
+
+class _VirtualHandle:
+    """Cancellable entry in the virtual timer queue (like asyncio.TimerHandle)."""
+
+    def __init__(self, when, callback):
+        self._when = when
+        self.callback = callback
+        self.cancelled = False
+        self.fired = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def when(self):
+        return self._when
+
+
+class SimClock:
+
+    def __init__(self, speed=1.0, virtual=False):
+        self.configure(speed, virtual)
+
+    def configure(self, speed=1.0, virtual=False, origin=None, real_start=None, min_real_timeout=MIN_REAL_TIMEOUT):
+        """
+        Sets the speed factor / virtual mode. Call before starting agents.
+        `origin` / `real_start` let another process share this clock's
+        time zero (see settings()); by default simulated time starts "now".
+        """
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self.virtual = virtual
+        self.min_real_timeout = min_real_timeout
+        self.origin = time.time() if origin is None else origin
+        self.real_start = time.monotonic() if real_start is None else real_start
+        self.now = 0.0                     # Virtual seconds since origin
+        self.timers = []                   # Virtual mode: (when, seq, handle)
+        self.sequence = itertools.count()
+        self.activity = 0                  # Bumped on every timer change
+        self.driver = None
+        self.in_flight = 0                 # Virtual mode: messages dispatched, not yet in a mailbox
+        self.mailboxes = weakref.WeakSet()  # Virtual mode: started behaviours
+        self.held_since = None             # Real time the driver started waiting on messages
+
+    def settings(self):
+        """Keyword arguments for configure() that reproduce this clock in a worker process."""
+        return {"speed": self.speed, "virtual": self.virtual,
+                "origin": self.origin, "real_start": self.real_start,
+                "min_real_timeout": self.min_real_timeout}
+
+    # --- Reading the clock ---
+
+    def elapsed(self):
+        """Simulated seconds since the clock was configured."""
+        if self.virtual:
+            return self.now
+        return (time.monotonic() - self.real_start) * self.speed
+
+    def time(self):
+        """Simulated UNIX timestamp (drop-in for time.time())."""
+        return self.origin + self.elapsed()
+
+    # --- Waiting ---
+
+    def timeout(self, seconds):
+        """
+        Simulated seconds a timeout of `seconds` really lasts: in speed mode
+        at least `min_real_timeout` real seconds, so replies that take real
+        time to arrive are not given up on at high speed factors.
+        """
+        if self.virtual or not seconds:
+            return seconds
+        return max(seconds, self.min_real_timeout * self.speed)
+
+    def call_later(self, delay, callback):
+        """Runs `callback()` after `delay` simulated seconds. Returns a cancellable handle."""
+        if not self.virtual:
+            return asyncio.get_running_loop().call_later(max(delay, 0) / self.speed, callback)
+        handle = _VirtualHandle(self.now + max(delay, 0), callback)
+        heapq.heappush(self.timers, (handle.when(), next(self.sequence), handle))
+        self.activity += 1
+        self._ensure_driver()
+        return handle
+
+    async def sleep(self, seconds):
+        """asyncio.sleep() in simulated seconds."""
+        if not self.virtual:
+            await asyncio.sleep(seconds / self.speed)
+            return
+        future = asyncio.get_running_loop().create_future()
+        handle = self.call_later(seconds, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    async def wait_for(self, awaitable, timeout):
+        """Awaits `awaitable` for up to `timeout` simulated seconds; None on timeout."""
+        if timeout is None:
+            return await awaitable
+        if not self.virtual:
+            try:
+                return await asyncio.wait_for(awaitable, self.timeout(timeout) / self.speed)
+            except asyncio.TimeoutError:
+                return None
+        task = asyncio.ensure_future(awaitable)
+        handle = self.call_later(timeout, task.cancel)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if not handle.fired:
+                raise  # We were cancelled from outside, not timed out
+            return None
+        finally:
+            handle.cancel()
+
+    async def receive(self, behaviour, timeout):
+        """behaviour.receive(timeout) with the timeout in simulated seconds."""
+        if not self.virtual:
+            return await behaviour.receive(timeout=self.timeout(timeout) / self.speed)
+        return await self.wait_for(behaviour.receive(timeout=REAL_FOREVER), timeout)
+
+    # --- Virtual time driver ---
+
+    def _ensure_driver(self):
+        if self.driver is None or self.driver.done():
+            self.driver = asyncio.get_running_loop().create_task(self._drive())
+
+    async def _drive(self):
+        """Jumps to the next wakeup once nothing has touched the clock or the mailboxes for a while."""
+        waiting_on = None
+        while self.timers:
+            seen = self.activity
+            await asyncio.sleep(VIRTUAL_SETTLE_TIME)
+            if seen != self.activity:
+                continue  # Agents are still busy; let them settle
+            pending = self.pending_messages()
+            if pending:
+                if pending != waiting_on:
+                    waiting_on, self.held_since = pending, time.monotonic()
+                    continue  # Messages are being delivered/received
+                if time.monotonic() - self.held_since < VIRTUAL_MAX_HOLD:
+                    continue
+                log.warning("{} message(s) not received for {}s; moving time anyway.", pending, VIRTUAL_MAX_HOLD)
+            waiting_on = None
+            self._fire_next()
+
+    def pending_messages(self):
+        """Messages in flight or waiting in the mailbox of a running behaviour (virtual mode)."""
+        queued = sum(behaviour.queue.qsize() for behaviour in list(self.mailboxes)
+                     if behaviour.is_running and behaviour.queue is not None and not behaviour.is_killed())
+        return self.in_flight + queued
+
+    def _fire_next(self):
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        if not self.timers:
+            return
+        when = self.timers[0][0]
+        self.now = max(self.now, when)
+        while self.timers and self.timers[0][0] <= when:
+            _, _, handle = heapq.heappop(self.timers)
+            if not handle.cancelled:
+                handle.fired = True
+                handle.callback()
+        self.activity += 1
+
+
+# The clock shared by every agent in the process
+clock = SimClock()
+
+
+def track_messages():
+    """
+    Lets the virtual clock see messages (call before agents start, idempotent).
+    Started behaviours register their mailbox, SPADE's in-process dispatch
+    is counted until the message is in the mailbox, and enqueue() puts it
+    there directly instead of through one more task.
+    """
+    from spade.agent import Agent
+    from spade.behaviour import CyclicBehaviour
+
+    if getattr(Agent.dispatch, "tracked", False):
+        return
+    start, dispatch = CyclicBehaviour.start, Agent.dispatch
+
+    def tracked_start(self):
+        start(self)
+        clock.mailboxes.add(self)
+
+    async def enqueue(self, message):
+        self.queue.put_nowait(message)
+
+    def delivered(_task):
+        clock.in_flight -= 1
+
+    def tracked_dispatch(self, msg):
+        tasks = dispatch(self, msg)
+        clock.in_flight += len(tasks)
+        for task in tasks:
+            task.add_done_callback(delivered)
+        return tasks
+
+    tracked_dispatch.tracked = True
+    CyclicBehaviour.start = tracked_start
+    CyclicBehaviour.enqueue = enqueue
+    Agent.dispatch = tracked_dispatch
@@ -0,0 +1,16 @@
+"""
+Shared fixtures of the unit tests. Run from the project root:
+    python -m pytest -q tests
+"""
+
+import pytest
+
+from sim_clock import clock
+
+
+@pytest.fixture
+def virtual_clock():
+    """The shared clock in virtual mode: timeouts pass as soon as nothing else is running."""
+    clock.configure(virtual=True)
+    yield clock
+    clock.configure()
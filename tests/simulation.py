@@ -0,0 +1,319 @@
+# project/tests/simulation.py
+"""
+Benchmark / load-test harness.
+
+Runs the simulation (main.main) once for every combination of the given
+parameters - students x tutors x resource bandwidth x topic skew - each
+run in a fresh process, and writes one JSON file with, per run:
+throughput (students finished per minute), p50/p95/p99 time to help,
+messages sent per protocol, peak RSS and startup time. Two result files
+can be compared to catch regressions in the Student, Tutor, Resource and
+Directory agents run over run (--compare exits with 1 on a regression).
+
+Topic skew is a Zipf exponent over the scenario's topics: 0 makes every
+topic equally likely, 1.5 puts most students (and expertise) on the first
+one. Every other setting comes from the base scenario.
+
+Needs an XMPP server on localhost. --start-server runs `spade run` in a
+temporary directory for the duration of the benchmark, so nothing leaves
+the machine. With --transport loopback the agents message each other in
+memory (loopback.py) and no server is needed at all. Run from the
+project root:
+    python -m tests.simulation --start-server --students 50 200 --bandwidth 2 10 --skew 0 1.5
+    python -m tests.simulation --transport loopback --students 50 200
+    python -m tests.simulation --compare baseline.json results.json
+"""
+
+import argparse
+import contextlib
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+DEFAULT_SCENARIO = "scenarios/large.yaml"
+DEFAULT_OUTPUT = "simulation-results.json"
+XMPP_ADDRESS = ("127.0.0.1", 5222)
+SERVER_STARTUP_TIMEOUT = 30   # Seconds to wait for `spade run` to accept connections
+RUN_TIMEOUT = 1800            # Wall-clock seconds before a run is killed
+TOLERANCE = 0.10              # Relative change counted as a regression by --compare
+
+# (result key, label, True if higher is better)
+COMPARED = (
+    ("throughput_per_min", "students/min", True),
+    ("time_to_help.p95", "p95 help (s)", False),
+    ("messages_total", "messages", False),
+    ("peak_rss_mb", "peak RSS (MB)", False),
+)
+
+
+def zipf_weights(topics, skew):
+    """{topic: weight} with the i-th topic (0-based) weighted 1 / (i + 1) ** skew."""
+    return {topic: round(1 / (rank + 1) ** skew, 4) for rank, topic in enumerate(topics)}
+
+
+def build_scenario(base, students, tutors, bandwidth, skew):
+    """The base scenario with a generated population of the given size and shape."""
+    from launcher import DEFAULT_TOPICS
+
+    scenario = copy.deepcopy(base)
+    scenario["topics"] = zipf_weights(base.get("topics") or DEFAULT_TOPICS, skew)
+    scenario["tutors"] = dict(base.get("tutors") or {}, agents=[], count=tutors)
+    scenario["students"] = dict(base.get("students") or {}, agents=[], count=students)
+    scenario["resource"] = dict(base.get("resource") or {}, max_bandwidth=bandwidth)
+    # Measure the agents, not the event store, the dashboard or the terminal
+    scenario["monitor"] = dict(base.get("monitor") or {}, event_store=None, event_log_size=0)
+    scenario["dashboard"] = {"port": None}
+    scenario["sharding"] = {"workers": 0}
+    scenario["logging"] = {"quiet": True}
+    return scenario
+
+
+def count_messages(counts):
+    """Counts every message any behaviour sends, by its 'protocol' metadata."""
+    from spade.behaviour import CyclicBehaviour  # Base class of every SPADE behaviour
+
+    send = CyclicBehaviour.send
+
+    async def counting_send(self, msg):
+        counts[msg.get_metadata("protocol") or "none"] += 1
+        return await send(self, msg)
+
+    CyclicBehaviour.send = counting_send
+
+
+def peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, KB on Linux
+
+
+def run_simulation(scenario, speed, transport, connection):
+    """Process entry point: runs one scenario and sends back its measurements."""
+    try:
+        import spade
+        import logs
+        import loopback
+        import main
+        from sim_clock import clock
+
+        clock.configure(speed=speed)
+        logs.configure(quiet=True, sink=sys.stderr)
+        if transport == "loopback":
+            loopback.install()  # Before count_messages(), which wraps the installed send
+        messages = Counter()
+        count_messages(messages)
+        snapshot = {}
+
+        async def simulate():
+            snapshot.update(await main.main(scenario))
+
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # The monitor report
+            spade.run(simulate())
+        wall = time.perf_counter() - started
+        logs.shutdown()
+
+        finished = snapshot["students_finished"]
+        connection.send({
+            "ok": True,
+            "wall_s": round(wall, 2),
+            "simulated_s": round(snapshot["runtime"], 2),
+            "startup_s": round(snapshot["startup"]["total_startup_s"], 2),
+            "students_started": snapshot["students_started"],
+            "students_finished": finished,
+            "throughput_per_min": round(finished / wall * 60, 2),
+            "throughput_per_sim_min": round(finished / snapshot["runtime"] * 60, 2) if snapshot["runtime"] else None,
+            "time_to_help": snapshot["time_to_help"],
+            "learning_gain": snapshot["learning_gain"],
+            "resources_provided": snapshot["resources_provided"],
+            "retries": sum(snapshot["retries_by_reason"].values()),
+            "events": snapshot["events"],
+            "messages": dict(messages),
+            "messages_total": sum(messages.values()),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+    except Exception as e:
+        connection.send({"ok": False, "error": repr(e)})
+    finally:
+        connection.close()
+
+
+def run_isolated(scenario, speed, transport, timeout):
+    """Runs one scenario in a fresh process (so peak RSS is its own). Returns its measurements."""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_simulation, args=(scenario, speed, transport, sender))
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout):
+            return receiver.recv()
+        return {"ok": False, "error": f"timed out after {timeout}s"}
+    except EOFError:
+        return {"ok": False, "error": f"worker died (exit code {process.exitcode})"}
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+
+def xmpp_server_up():
+    with contextlib.suppress(OSError), socket.create_connection(XMPP_ADDRESS, timeout=1):
+        return True
+    return False
+
+
+@contextlib.contextmanager
+def xmpp_server(start):
+    """Makes sure an XMPP server is listening on localhost; starts `spade run` if asked to."""
+    if not start:
+        if not xmpp_server_up():
+            sys.exit(f"No XMPP server on {XMPP_ADDRESS[0]}:{XMPP_ADDRESS[1]}; run `spade run` or pass --start-server")
+        yield
+        return
+
+    if xmpp_server_up():
+        sys.exit("An XMPP server is already running; drop --start-server to use it")
+    with tempfile.TemporaryDirectory() as workdir:  # The server's database lives and dies here
+        server = subprocess.Popen(["spade", "run"], cwd=workdir,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+            while not xmpp_server_up():
+                if server.poll() is not None or time.monotonic() > deadline:
+                    sys.exit("`spade run` did not start an XMPP server")
+                time.sleep(0.2)
+            yield
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def git_commit():
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True,
+                              capture_output=True, text=True).stdout.strip()
+    return None
+
+
+def benchmark(args):
+    from launcher import load_scenario
+
+    base = load_scenario(args.scenario)
+    speed = args.speed if args.speed is not None else (base.get("clock") or {}).get("speed", 1.0)
+    grid = list(itertools.product(args.students, args.tutors, args.bandwidth, args.skew))
+    results = {
+        "harness": 1,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "scenario": args.scenario,
+        "speed": speed,
+        "transport": args.transport,
+        "runs": [],
+    }
+
+    print(f"{len(grid) * args.repeat} run(s) of {args.scenario} at speed x{speed} over {args.transport}\n")
+    print(f"{'students':>8} {'tutors':>6} {'bw':>3} {'skew':>4} | {'wall (s)':>8} | {'students/min':>12} | "
+          f"{'p50':>6} {'p95':>6} {'p99':>6} | {'messages':>8} | {'RSS (MB)':>8}")
+    server = xmpp_server(args.start_server) if args.transport == "xmpp" else contextlib.nullcontext()
+    with server:
+        for (students, tutors, bandwidth, skew), repeat in itertools.product(grid, range(args.repeat)):
+            params = {"students": students, "tutors": tutors, "bandwidth": bandwidth, "skew": skew, "repeat": repeat}
+            scenario = build_scenario(base, students, tutors, bandwidth, skew)
+            result = dict(params=params, **run_isolated(scenario, speed, args.transport, args.timeout))
+            results["runs"].append(result)
+            print_run(result)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+def print_run(result):
+    p = result["params"]
+    prefix = f"{p['students']:>8} {p['tutors']:>6} {p['bandwidth']:>3} {p['skew']:>4}"
+    if not result["ok"]:
+        print(f"{prefix} | FAILED: {result['error']}")
+        return
+    help_time = result["time_to_help"]
+    quantiles = " ".join(f"{help_time.get(q):>6.1f}" if help_time.get(q) is not None else f"{'-':>6}"
+                         for q in ("p50", "p95", "p99"))
+    print(f"{prefix} | {result['wall_s']:>8.1f} | {result['throughput_per_min']:>12.1f} | {quantiles} | "
+          f"{result['messages_total']:>8} | {result['peak_rss_mb']:>8.1f}")
+
+
+def lookup(result, key):
+    for part in key.split("."):
+        result = (result or {}).get(part)
+    return result
+
+
+def compare(old_path, new_path, tolerance):
+    """Prints the change of the key metrics per run. Returns the number of regressions."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    key = lambda run: tuple(sorted(run["params"].items()))
+    baseline = {key(run): run for run in old["runs"] if run["ok"]}
+
+    print(f"{old.get('commit')} -> {new.get('commit')} (regression: {tolerance:.0%} worse)\n")
+    regressions = 0
+    for run in new["runs"]:
+        before = baseline.get(key(run))
+        label = " ".join(f"{name}={value}" for name, value in run["params"].items())
+        if before is None or not run["ok"]:
+            print(f"{label}: {'not in baseline' if before is None else 'FAILED: ' + run['error']}")
+            regressions += not run["ok"]
+            continue
+        changes = []
+        for metric, name, higher_is_better in COMPARED:
+            a, b = lookup(before, metric), lookup(run, metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            flag = " REGRESSION" if worse > tolerance else ""
+            regressions += bool(flag)
+            changes.append(f"{name} {a:g} -> {b:g} ({change:+.0%}){flag}")
+        print(f"{label}: " + "; ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default=DEFAULT_SCENARIO, help="Base scenario (everything but the grid)")
+    parser.add_argument("--students", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--tutors", type=int, nargs="+", default=[10])
+    parser.add_argument("--bandwidth", type=int, nargs="+", default=[2, 10], help="Download slots per resource replica")
+    parser.add_argument("--skew", type=float, nargs="+", default=[0.0, 1.5], help="Zipf exponent of topic popularity")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per combination")
+    parser.add_argument("--speed", type=float, default=None, help="Simulation speed (default: the scenario's)")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT, help="Wall-clock seconds per run")
+    parser.add_argument("--transport", choices=["xmpp", "loopback"], default="xmpp",
+                        help="loopback: agents message each other in memory, no XMPP server")
+    parser.add_argument("--start-server", action="store_true", help="Run `spade run` for the benchmark")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+    benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Message codec (protocols/codec.py): round trips and unreadable bodies."""
+
+import pytest
+from spade.message import Message
+
+from protocols.codec import (
+    PAYLOADS, CodecError, Expertise, Material, Proposal, QueueTicket, ReplicaLoad, ReplicaLoads, ResourceError,
+    SessionStart, Topic, TutorList, TutorStatus, decode, dumps, encode, loads,
+)
+
+PAYLOAD_SAMPLES = [
+    Topic("mathematics"),
+    Topic("100% | tricky"),
+    Proposal(17.5, 0.9),
+    QueueTicket(3, 42.0),
+    SessionStart(15.0),
+    Expertise(("mathematics", "physics")),
+    Expertise(()),
+    TutorStatus(True, 2),
+    TutorStatus(False, 0),
+    TutorList(("tutor1@localhost", "tutor2@localhost")),
+    ReplicaLoad(0.25),
+    ReplicaLoads({"resource_manager0@localhost": 0.0, "resource_manager1@localhost": 1.5}),
+    Material("https://www.math-videos.com/algebra-basics", "Algebra | basics", 0.3, "visual"),
+    Material("https://example.org/any", "Any style", 0.5, None),
+    ResourceError("ERROR_SERVER_BUSY"),
+]
+
+
+@pytest.mark.parametrize("payload", PAYLOAD_SAMPLES)
+def test_round_trip(payload):
+    assert loads(dumps(payload)) == payload
+
+
+def test_every_payload_is_sampled():
+    assert {type(payload) for payload in PAYLOAD_SAMPLES} == set(PAYLOADS.values())
+
+
+def test_escaped_text_stays_one_field():
+    assert dumps(Topic("a|b%c")) == "1T|a%7Cb%25c"
+
+
+@pytest.mark.parametrize("body", ["", "mathematics", "2T|mathematics", "1?|x", "1P|17.5", "1P|fast|0.9"])
+def test_unreadable_bodies_raise(body):
+    with pytest.raises(CodecError):
+        loads(body)
+
+
+def test_decode_parses_once_and_follows_body_changes():
+    msg = encode(Message(), Proposal(1.0, 0.5))
+    assert decode(msg) is decode(msg)
+    msg.body = dumps(Topic("physics"))
+    assert decode(msg) == Topic("physics")
+
+
+def test_decode_checks_the_expected_kind():
+    msg = encode(Message(), Topic("physics"))
+    assert decode(msg, (Topic, TutorList)) == Topic("physics")
+    with pytest.raises(CodecError, match="expected Proposal, got Topic"):
+        decode(msg, Proposal)
@@ -0,0 +1,221 @@
+"""Contract net engine (protocols/contract_net.py): deadlines, negotiations, answers."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from spade.message import Message
+
+from onthology import (
+    PERFORMATIVE_ACCEPT_PROPOSAL, PERFORMATIVE_CFP, PERFORMATIVE_FAILURE, PERFORMATIVE_PROPOSE,
+    PERFORMATIVE_REFUSE, PERFORMATIVE_REJECT_PROPOSAL,
+)
+from protocols.codec import Proposal, Topic, encode
+from protocols.contract_net import (
+    ContractNetInitiatorBehav, ContractNetParticipantBehav, DeadlineHeap, Negotiation, ScoringPolicy,
+    WaitExpertisePolicy, as_policy,
+)
+
+STUDENT = "student1@localhost"
+TUTORS = ["tutor1@localhost", "tutor2@localhost", "tutor3@localhost"]
+
+
+def answer(sender, performative, thread="t1", offer=None):
+    msg = Message(to=STUDENT, sender=sender, thread=thread, metadata={"performative": performative})
+    if offer is not None:
+        encode(msg, offer)
+    return msg
+
+
+def initiator_with(negotiation):
+    initiator = ContractNetInitiatorBehav()
+    initiator.agent = SimpleNamespace(name="student1")
+    initiator.negotiations[negotiation.thread] = negotiation
+    return initiator
+
+
+def test_deadline_heap_expires_in_order_and_skips_cancelled(virtual_clock):
+    async def scenario():
+        expired = []
+        heap = DeadlineHeap(expired.append)
+        heap.schedule("late", 10)
+        heap.schedule("early", 5)
+        heap.schedule("cancelled", 1)
+        heap.cancel("cancelled")
+        assert len(heap) == 2
+        await virtual_clock.sleep(20)
+        return expired, heap
+
+    expired, heap = asyncio.run(scenario())
+    assert expired == ["early", "late"]
+    assert len(heap) == 0
+
+
+def test_deadline_heap_reschedule_keeps_the_latest_deadline(virtual_clock):
+    async def scenario():
+        expired = []
+        heap = DeadlineHeap(lambda key: expired.append((key, virtual_clock.elapsed())))
+        heap.schedule("key", 5)
+        heap.schedule("key", 15)
+        await virtual_clock.sleep(20)
+        return expired
+
+    assert asyncio.run(scenario()) == [("key", 15)]
+
+
+def test_negotiation_ranks_best_first_and_hands_out_candidates():
+    async def scenario():
+        negotiation = Negotiation("t1", "mathematics", TUTORS)
+        offers = [Proposal(30.0, 0.9), Proposal(0.0, 0.5), Proposal(5.0, 1.0)]
+        for tutor, offer in zip(TUTORS, offers):
+            negotiation.offers.append((answer(tutor, PERFORMATIVE_PROPOSE), offer))
+        negotiation.finish(WaitExpertisePolicy())
+        return negotiation, await negotiation.wait()
+
+    negotiation, finished = asyncio.run(scenario())
+    assert finished is negotiation
+    assert [offer.wait_time for _, _, offer in negotiation.ranked()] == [5.0, 0.0, 30.0]
+    assert [offer.wait_time for _, _, offer in negotiation.top(1)] == [5.0]
+    tried = [negotiation.next_candidate()[2].wait_time for _ in range(3)]
+    assert tried == [5.0, 0.0, 30.0]
+    assert negotiation.next_candidate() is None
+
+
+def test_scoring_policy_must_implement_score():
+    class Unfinished(ScoringPolicy):
+        def score_batch(self, offers):
+            return [0.0] * len(offers)
+
+    with pytest.raises(TypeError):
+        Unfinished()
+    offers = [Proposal(1.0, 0.5), Proposal(2.0, 1.0)]
+    assert as_policy(lambda offer: offer.wait_time).score_batch(offers) == [1.0, 2.0]
+
+
+def test_handle_closes_once_every_participant_answered():
+    async def scenario():
+        negotiation = Negotiation("t1", "mathematics", TUTORS[:2])
+        initiator = initiator_with(negotiation)
+        initiator.handle(answer(TUTORS[0], PERFORMATIVE_PROPOSE, offer=Proposal(1.0, 0.8)))
+        assert not negotiation.done.done()
+        initiator.handle(answer(TUTORS[1], PERFORMATIVE_REFUSE))
+        return negotiation, initiator
+
+    negotiation, initiator = asyncio.run(scenario())
+    assert negotiation.done.done() and not negotiation.expired
+    assert len(negotiation.proposals) == 1 and len(negotiation.refusals) == 1
+    assert "t1" not in initiator.negotiations
+    assert initiator.handle(answer(TUTORS[0], PERFORMATIVE_PROPOSE, offer=Proposal(1.0, 0.8))) is False
+
+
+def test_handle_finishes_early_when_good_enough():
+    async def scenario():
+        negotiation = Negotiation("t1", "mathematics", TUTORS, good_enough=2)
+        initiator = initiator_with(negotiation)
+        for tutor in TUTORS[:2]:
+            initiator.handle(answer(tutor, PERFORMATIVE_PROPOSE, offer=Proposal(1.0, 0.8)))
+        return negotiation
+
+    negotiation = asyncio.run(scenario())
+    assert negotiation.done.done()
+    assert negotiation.pending == {TUTORS[2]}
+    assert len(negotiation.proposals) == 2
+
+
+def test_handle_counts_one_answer_per_participant():
+    async def scenario():
+        negotiation = Negotiation("t1", "mathematics", TUTORS, good_enough=2)
+        initiator = initiator_with(negotiation)
+        offer = Proposal(1.0, 0.8)
+        initiator.handle(answer(TUTORS[0], PERFORMATIVE_PROPOSE, offer=offer))
+        initiator.handle(answer(TUTORS[0], PERFORMATIVE_PROPOSE, offer=offer))         # Duplicate
+        initiator.handle(answer("intruder@localhost", PERFORMATIVE_PROPOSE, offer=offer))  # Not asked
+        return negotiation
+
+    negotiation = asyncio.run(scenario())
+    assert not negotiation.done.done()
+    assert len(negotiation.offers) == 1
+    assert negotiation.pending == set(TUTORS[1:])
+
+
+def test_negotiation_expires_at_its_deadline(virtual_clock):
+    async def scenario():
+        initiator = ContractNetInitiatorBehav()
+        negotiation = Negotiation("t1", "mathematics", TUTORS)
+        initiator.negotiations["t1"] = negotiation
+        initiator.deadlines.schedule("t1", 5.0)
+        initiator.handle(answer(TUTORS[0], PERFORMATIVE_PROPOSE, offer=Proposal(1.0, 0.8)))
+        finished = await negotiation.wait()
+        return finished, virtual_clock.elapsed()
+
+    negotiation, elapsed = asyncio.run(scenario())
+    assert negotiation.expired
+    assert elapsed == 5.0
+    assert len(negotiation.proposals) == 1
+
+
+class RecordingParticipant(ContractNetParticipantBehav):
+    """Offers a fixed proposal and records what it sends and is told."""
+
+    def __init__(self, proposal_ttl=30.0):
+        super().__init__(proposal_ttl)
+        self.queue = asyncio.Queue()
+        self.sent = []
+        self.accepted = []
+
+    async def make_offer(self, msg):
+        return Proposal(2.0, 0.9)
+
+    async def on_accept(self, msg, offer):
+        self.accepted.append(offer)
+
+    async def send(self, msg):
+        self.sent.append(msg)
+
+    async def answer(self, performative, thread="t1", payload=None):
+        msg = Message(to=TUTORS[0], sender=STUDENT, thread=thread, metadata={"performative": performative})
+        if payload is not None:
+            encode(msg, payload)
+        self.queue.put_nowait(msg)
+        await self.run()
+        return self.sent[-1] if self.sent else None
+
+
+def test_participant_accepts_an_open_proposal(virtual_clock):
+    async def scenario():
+        participant = RecordingParticipant()
+        reply = await participant.answer(PERFORMATIVE_CFP, payload=Topic("mathematics"))
+        assert reply.get_metadata("performative") == PERFORMATIVE_PROPOSE
+        await participant.answer(PERFORMATIVE_ACCEPT_PROPOSAL)
+        return participant
+
+    participant = asyncio.run(scenario())
+    assert participant.accepted == [Proposal(2.0, 0.9)]
+    assert len(participant.sent) == 1
+    assert not participant.open_proposals
+
+
+def test_participant_fails_an_accept_for_an_expired_proposal(virtual_clock):
+    async def scenario():
+        participant = RecordingParticipant(proposal_ttl=10.0)
+        await participant.answer(PERFORMATIVE_CFP, payload=Topic("mathematics"))
+        await virtual_clock.sleep(15)
+        reply = await participant.answer(PERFORMATIVE_ACCEPT_PROPOSAL)
+        return participant, reply
+
+    participant, reply = asyncio.run(scenario())
+    assert participant.accepted == []
+    assert reply.get_metadata("performative") == PERFORMATIVE_FAILURE
+
+
+def test_participant_forgets_a_rejected_proposal(virtual_clock):
+    async def scenario():
+        participant = RecordingParticipant()
+        await participant.answer(PERFORMATIVE_CFP, payload=Topic("mathematics"))
+        await participant.answer(PERFORMATIVE_REJECT_PROPOSAL)
+        reply = await participant.answer(PERFORMATIVE_ACCEPT_PROPOSAL)
+        return participant, reply
+
+    participant, reply = asyncio.run(scenario())
+    assert participant.accepted == []
+    assert reply.get_metadata("performative") == PERFORMATIVE_FAILURE
@@ -0,0 +1,75 @@
+"""Reply routing by conversation (protocols/conversations.py): parking, waiting, closing."""
+
+import asyncio
+
+from spade.message import Message
+
+from protocols.conversations import Mailbox
+
+
+def reply(thread, protocol="DirectoryProtocol", body=None):
+    return Message(thread=thread, body=body, metadata={"protocol": protocol})
+
+
+def test_reply_that_arrives_first_is_parked():
+    async def scenario():
+        mailbox = Mailbox()
+        mailbox.deliver(reply("t1", body="first"))
+        mailbox.deliver(reply("t1", body="second"))
+        return mailbox, [await mailbox.get("DirectoryProtocol", "t1", 1) for _ in range(2)]
+
+    mailbox, received = asyncio.run(scenario())
+    assert [msg.body for msg in received] == ["first", "second"]
+    assert mailbox.parked_count == 2 and not mailbox.parked
+
+
+def test_waiting_conversation_gets_its_reply_only(virtual_clock):
+    async def scenario():
+        mailbox = Mailbox()
+        waiting = asyncio.ensure_future(mailbox.get("DirectoryProtocol", "t1", 10))
+        await asyncio.sleep(0)
+        mailbox.deliver(reply("t2"))
+        mailbox.deliver(reply("t1", protocol="ResourceProtocol"))
+        mailbox.deliver(reply("t1"))
+        return mailbox, await waiting
+
+    mailbox, received = asyncio.run(scenario())
+    assert (received.get_metadata("protocol"), received.thread) == ("DirectoryProtocol", "t1")
+    assert mailbox.delivered == 1
+    assert set(mailbox.parked) == {("DirectoryProtocol", "t2"), ("ResourceProtocol", "t1")}
+
+
+def test_get_times_out_with_none(virtual_clock):
+    async def scenario():
+        mailbox = Mailbox()
+        return mailbox, await mailbox.get("DirectoryProtocol", "t1", 5), virtual_clock.elapsed()
+
+    mailbox, received, elapsed = asyncio.run(scenario())
+    assert received is None and elapsed == 5
+    assert not mailbox.waiters
+
+
+def test_oldest_parked_conversation_is_dropped():
+    mailbox = Mailbox(max_parked=2)
+    for thread in ("t1", "t2", "t3"):
+        mailbox.deliver(reply(thread))
+    assert list(mailbox.parked) == [("DirectoryProtocol", "t2"), ("DirectoryProtocol", "t3")]
+    assert mailbox.dropped == 1
+
+
+def test_close_drops_parked_and_late_replies():
+    mailbox = Mailbox()
+    mailbox.deliver(reply("t1"))
+    mailbox.close("DirectoryProtocol", "t1")
+    mailbox.deliver(reply("t1"))
+    assert not mailbox.parked
+    assert (mailbox.dropped, mailbox.late) == (1, 1)
+
+
+def test_closed_conversations_are_bounded():
+    mailbox = Mailbox(max_closed=2)
+    for thread in ("t1", "t2", "t3"):
+        mailbox.close("DirectoryProtocol", thread)
+    assert list(mailbox.closed) == [("DirectoryProtocol", "t2"), ("DirectoryProtocol", "t3")]
+    mailbox.deliver(reply("t1"))  # Forgotten: parked like any unexpected reply
+    assert mailbox.late == 0 and ("DirectoryProtocol", "t1") in mailbox.parked
@@ -0,0 +1,62 @@
+"""Directory tutor index (agents/directory_agent.py): registration, lookups, ranking."""
+
+import random
+
+from agents import directory_agent
+from agents.directory_agent import TutorIndex
+
+
+def index_of(**expertise):
+    index = TutorIndex()
+    for name, topics in expertise.items():
+        index.register(f"{name}@localhost", topics)
+    return index
+
+
+def test_find_by_topic():
+    index = index_of(tutor1=["mathematics", "physics"], tutor2=["physics"], tutor3=["history"])
+    assert sorted(index.find("physics")) == ["tutor1@localhost", "tutor2@localhost"]
+    assert index.find("biology") == []
+    assert len(index) == 3
+
+
+def test_register_again_replaces_expertise_and_keeps_status():
+    index = index_of(tutor1=["mathematics"])
+    index.update_status("tutor1@localhost", False, 4)
+    index.register("tutor1@localhost", ["physics"])
+    assert index.find("mathematics") == []
+    assert index.find("physics") == ["tutor1@localhost"]
+    assert index.status["tutor1@localhost"] == (False, 4)
+
+
+def test_deregister_removes_empty_topics():
+    index = index_of(tutor1=["mathematics"], tutor2=["mathematics", "physics"])
+    assert index.deregister("tutor2@localhost")
+    assert not index.deregister("tutor2@localhost")
+    assert "physics" not in index.by_topic
+    assert index.find("mathematics") == ["tutor1@localhost"]
+
+
+def test_status_of_unknown_tutor_is_ignored():
+    index = TutorIndex()
+    index.update_status("ghost@localhost", True, 0)
+    assert index.status == {}
+
+
+def test_top_k_and_available_only():
+    index = index_of(tutor1=["mathematics"], tutor2=["mathematics"], tutor3=["mathematics"])
+    index.update_status("tutor1@localhost", False, 0)
+    index.update_status("tutor2@localhost", True, 3)
+    index.update_status("tutor3@localhost", True, 1)
+    assert index.find("mathematics", top_k=2) == ["tutor3@localhost", "tutor2@localhost"]
+    assert sorted(index.find("mathematics", available_only=True)) == ["tutor2@localhost", "tutor3@localhost"]
+    assert index.find("mathematics", top_k=5, available_only=True) == ["tutor3@localhost", "tutor2@localhost"]
+
+
+def test_top_k_spreads_ties(monkeypatch):
+    monkeypatch.setattr(directory_agent.random, "random", random.Random(1).random)  # Not the global RNG's state
+    index = index_of(**{f"tutor{i}": ["mathematics"] for i in range(10)})
+    picked = set()
+    for _ in range(50):
+        picked.update(index.find("mathematics", top_k=2))
+    assert len(picked) == 10
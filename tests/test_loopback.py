@@ -0,0 +1,67 @@
+"""Loopback transport (loopback.py): Template matching and undeliverable messages."""
+
+import itertools
+
+import pytest
+from spade.container import Container
+from spade.message import Message
+from spade.template import Template
+
+import loopback
+
+
+def template(**metadata):
+    result = Template()
+    for key, value in metadata.items():
+        result.set_metadata(key, value)
+    return result
+
+
+PROPOSE = template(protocol="fipa-contract-net", performative="propose")
+REFUSE = template(protocol="fipa-contract-net", performative="refuse")
+INFORM = template(performative="inform")
+
+TEMPLATES = [
+    Template(),
+    Template(sender="tutor1@localhost"),
+    Template(to="student1@localhost", thread="t1"),
+    Template(body="1Tmathematics"),
+    PROPOSE,
+    PROPOSE | REFUSE,
+    PROPOSE & INFORM,
+    PROPOSE ^ INFORM,
+    ~INFORM,
+    ~(PROPOSE | REFUSE) & Template(sender="tutor1@localhost"),
+]
+
+MESSAGES = [
+    Message(to=to, sender=sender, thread=thread, body=body,
+            metadata={"protocol": "fipa-contract-net", "performative": performative})
+    for to, sender, thread, body, performative in itertools.product(
+        ["student1@localhost", "student2@localhost"],
+        ["tutor1@localhost", "tutor2@localhost"],
+        ["t1", None],
+        ["1Tmathematics", None],
+        ["propose", "refuse", "inform"],
+    )
+]
+
+
+@pytest.mark.parametrize("spade_template", TEMPLATES)
+def test_matches_agrees_with_spade(spade_template):
+    for msg in MESSAGES:
+        assert loopback.matches(spade_template, msg) == spade_template.match(msg), msg
+
+
+def test_metadata_must_all_be_equal():
+    msg = Message(metadata={"protocol": "fipa-contract-net", "performative": "propose"})
+    assert loopback.matches(PROPOSE, msg)
+    assert not loopback.matches(template(protocol="fipa-contract-net", performative="propose", extra="1"), msg)
+    assert not loopback.matches(PROPOSE, Message(metadata={"performative": "propose"}))
+
+
+def test_message_to_another_process_is_dropped_and_counted():
+    before = loopback.stats["undeliverable"]
+    loopback.deliver(Container(), Message(to="nobody@elsewhere", sender="student1@localhost", body="1Tmathematics"))
+    assert loopback.stats["undeliverable"] == before + 1
+    assert loopback.stats["undeliverable:nobody@elsewhere"] >= 1
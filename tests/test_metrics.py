@@ -0,0 +1,53 @@
+"""Streaming statistics (metrics.py)."""
+
+import random
+
+import pytest
+
+from metrics import ExponentialAverage, QuantileSketch, StreamingStats, gini
+
+
+def test_quantiles_within_precision():
+    rng = random.Random(3)
+    values = sorted(rng.expovariate(0.1) for _ in range(10_000))
+    sketch = QuantileSketch(precision=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.0, 0.5, 0.95, 0.99, 1.0):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_quantile_of_zeros_and_nothing():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0, -1, 0, 10):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.01)
+
+
+def test_streaming_stats_snapshot():
+    stats = StreamingStats(quantiles=True)
+    assert stats.snapshot()["mean"] is None
+    for value in (1, 2, 3, 4):
+        stats.add(value)
+    snapshot = stats.snapshot()
+    assert (snapshot["count"], snapshot["mean"], snapshot["min"], snapshot["max"]) == (4, 2.5, 1, 4)
+    assert snapshot["p50"] == pytest.approx(2, rel=0.01)
+    assert StreamingStats().quantile(0.5) is None
+
+
+def test_exponential_average():
+    average = ExponentialAverage(alpha=0.5)
+    assert average.add(10) == 10
+    assert average.add(20) == 15
+    assert ExponentialAverage(initial=4).value == 4
+
+
+def test_gini():
+    assert gini([]) == 0.0
+    assert gini([0, 0]) == 0.0
+    assert gini([5, 5, 5, 5]) == 0.0
+    assert gini([0, 0, 0, 12]) == pytest.approx(0.75)
+    assert gini([3, 1, 2]) == gini([1, 2, 3])
@@ -0,0 +1,38 @@
+"""LRU content cache of the resource replicas (agents/resource_agent.py)."""
+
+from agents.resource_agent import ContentCache
+
+
+def test_get_and_miss():
+    cache = ContentCache(100)
+    cache.put("algebra", "video", 20)
+    assert cache.get("algebra") == "video"
+    assert cache.get("optics") is None
+    assert "algebra" in cache and "optics" not in cache
+
+
+def test_least_recently_served_is_evicted():
+    cache = ContentCache(50)
+    cache.put("a", "A", 20)
+    cache.put("b", "B", 20)
+    cache.get("a")
+    cache.put("c", "C", 20)
+    assert "b" not in cache
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.size == 40
+
+
+def test_put_again_replaces_size():
+    cache = ContentCache(50)
+    cache.put("a", "A", 20)
+    cache.put("a", "A2", 30)
+    assert cache.get("a") == "A2"
+    assert cache.size == 30
+
+
+def test_material_larger_than_cache_is_not_kept():
+    cache = ContentCache(10)
+    cache.put("small", "S", 5)
+    cache.put("huge", "H", 20)
+    assert "huge" not in cache
+    assert "small" in cache and cache.size == 5
@@ -0,0 +1,61 @@
+"""Resource catalogues (resource_catalogue.py): lookups and catalogue files."""
+
+import json
+
+from protocols.codec import Material, dumps, loads
+from resource_catalogue import DictCatalogue, SQLiteCatalogue, generate, import_json
+
+
+def catalogue_of(tmp_path, materials):
+    source = tmp_path / "materials.json"
+    source.write_text(json.dumps(materials))
+    path = str(tmp_path / "catalogue.db")
+    assert import_json(path, str(source)) == len(materials)
+    return SQLiteCatalogue(path)
+
+
+def as_payload(material):
+    return Material(material["url"], material["title"], material["difficulty"], material["style"])
+
+
+def test_untitled_import_is_titled_after_its_topic_and_encodes(tmp_path):
+    catalogue = catalogue_of(tmp_path, [{"topic": "biology", "difficulty": 0.4, "url": "https://example.org/cells"}])
+    material = catalogue.lookup("biology", knowledge=0.2)
+    catalogue.close()
+    assert material["title"] == "biology"
+    assert material["style"] is None and material["size_mb"] == 20
+    assert loads(dumps(as_payload(material))) == as_payload(material)
+
+
+def test_untitled_material_encodes_as_an_empty_field():
+    payload = Material("https://example.org/cells", None, 0.4, None)
+    assert dumps(payload) == "1M|https://example.org/cells||0.4|"
+    assert loads(dumps(payload)) == payload
+
+
+def test_lookup_prefers_style_and_the_next_level(tmp_path):
+    catalogue = catalogue_of(tmp_path, [
+        {"topic": "physics", "difficulty": 0.3, "style": "visual", "url": "https://example.org/easy", "title": "Easy"},
+        {"topic": "physics", "difficulty": 0.6, "style": "visual", "url": "https://example.org/next", "title": "Next"},
+        {"topic": "physics", "difficulty": 0.6, "style": "reading", "url": "https://example.org/text", "title": "Text"},
+    ])
+    assert catalogue.lookup("physics", knowledge=0.4, style="visual")["title"] == "Next"
+    assert catalogue.lookup("physics", knowledge=0.9, style="visual")["title"] == "Next"  # Hardest below the target
+    assert catalogue.lookup("physics", knowledge=0.4, style="kinesthetic")["title"] in ("Next", "Text")
+    assert catalogue.lookup("history") is None
+    catalogue.close()
+
+
+def test_generated_catalogue_answers_every_topic(tmp_path):
+    path = str(tmp_path / "catalogue.db")
+    assert generate(path, ["mathematics", "history"], per_topic=50, seed=1) == 100
+    catalogue = SQLiteCatalogue(path)
+    for topic in ("mathematics", "history"):
+        assert catalogue.lookup(topic, knowledge=0.5)["topic"] == topic
+    catalogue.close()
+
+
+def test_dict_catalogue_titles_by_topic():
+    catalogue = DictCatalogue({"mathematics": "https://www.math-videos.com/algebra-basics"})
+    assert catalogue.lookup("mathematics", knowledge=0.9)["title"] == "mathematics"
+    assert catalogue.lookup("physics") is None
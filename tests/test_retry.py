@@ -0,0 +1,38 @@
+"""Retry backoff (retry.py)."""
+
+from retry import RetryPolicy
+
+
+def test_window_doubles_up_to_cap():
+    policy = RetryPolicy(base=5.0, cap=30.0)
+    assert [policy.window(attempt) for attempt in range(1, 6)] == [5.0, 10.0, 20.0, 30.0, 30.0]
+
+
+def test_delays_stay_in_window_and_count_per_reason():
+    policy = RetryPolicy(base=5.0, cap=60.0, seed=1)
+    for expected in range(1, 5):
+        attempt, delay = policy.next_delay("directory")
+        assert attempt == expected
+        assert 0 <= delay <= policy.window(attempt)
+    assert policy.next_delay("tutoring")[0] == 1
+
+
+def test_retry_after_is_a_floor():
+    policy = RetryPolicy(base=5.0, seed=2)
+    for _ in range(20):
+        policy.succeeded("resource_busy")
+        _, delay = policy.next_delay("resource_busy", retry_after=12.0)
+        assert 12.0 <= delay <= 17.0
+
+
+def test_success_resets_the_window():
+    policy = RetryPolicy(seed=3)
+    policy.next_delay("directory")
+    policy.next_delay("directory")
+    policy.succeeded("directory")
+    assert policy.next_delay("directory")[0] == 1
+
+
+def test_same_seed_same_delays():
+    first, second = RetryPolicy(seed=7), RetryPolicy(seed=7)
+    assert [first.next_delay("x") for _ in range(5)] == [second.next_delay("x") for _ in range(5)]
@@ -0,0 +1,41 @@
+"""Sharding helpers (sharding.py, launcher.py): population slices and merged startup metrics."""
+
+import pytest
+
+from launcher import load_scenario, population_specs, shard
+from sharding import merge_startup
+
+
+def startup(agents, concurrency, tutor_s, student_s, tutors=0):
+    return {"agents": agents, "tutors": tutors, "students": agents - tutors, "failed_to_start": 0,
+            "tutors_unregistered": 0, "concurrency": concurrency,
+            "tutor_startup_s": tutor_s, "student_startup_s": student_s, "total_startup_s": tutor_s + student_s}
+
+
+@pytest.mark.parametrize("count", [1, 2, 4, 8])
+def test_shards_cover_every_student_once(count):
+    _, students = population_specs(load_scenario("scenarios/large.yaml"))
+    names = [spec["name"] for index in range(count) for spec in shard(students, index, count)]
+    assert sorted(names) == sorted(spec["name"] for spec in students)
+    sizes = [len(shard(students, index, count)) for index in range(count)]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_every_process_generates_the_same_population():
+    scenario = load_scenario("scenarios/large.yaml")
+    assert population_specs(scenario) == population_specs(scenario)
+
+
+def test_merge_adds_counts_and_keeps_the_slowest_durations():
+    coordinator = startup(105, 25, 3.0, 0.0, tutors=100)
+    workers = [startup(450, 25, 0.0, 4.0), startup(450, 25, 0.0, 6.5)]
+    merged = merge_startup([coordinator] + workers, 2)
+    assert (merged["agents"], merged["tutors"], merged["students"]) == (1005, 100, 905)
+    assert merged["tutor_startup_s"] == 3.0 and merged["student_startup_s"] == 6.5
+    assert merged["total_startup_s"] == 9.5
+    assert merged["workers"] == 2
+
+
+def test_merge_keeps_concurrency_per_process():
+    merged = merge_startup([startup(10, 10, 1.0, 0.0)] + [startup(10, 10, 0.0, 1.0)] * 4, 4)
+    assert merged["concurrency"] == 10
@@ -0,0 +1,36 @@
+"""Student directory cache invalidation (agents/student_agent.py)."""
+
+import asyncio
+from types import SimpleNamespace
+
+from spade.message import Message
+
+from agents.student_agent import StudentAgent, TutorListCache
+from logs import get_logger
+from protocols.codec import Topic, encode
+from protocols.telemetry import TelemetryBehav
+
+
+def invalidation(body=None, topic=None):
+    msg = Message(to="student1@localhost", sender="directory@localhost", body=body,
+                  metadata={"performative": "invalidate"})
+    if topic is not None:
+        encode(msg, Topic(topic))
+    return msg
+
+
+def test_unreadable_invalidation_is_skipped():
+    async def scenario():
+        behaviour = StudentAgent.DirectoryInvalidationBehav()
+        behaviour.queue = asyncio.Queue()
+        behaviour.agent = SimpleNamespace(jid="student1@localhost", log=get_logger("student", "student1"),
+                                          tutor_cache=TutorListCache(ttl=60), telemetry=TelemetryBehav())
+        behaviour.agent.tutor_cache.put("mathematics", ["tutor1@localhost"])
+        for msg in (invalidation(body="not a topic"), invalidation(topic="mathematics")):
+            behaviour.queue.put_nowait(msg)
+            await behaviour.run()  # Must not raise on the unreadable one
+        return behaviour.agent
+
+    student = asyncio.run(scenario())
+    assert student.tutor_cache.get("mathematics") is None
+    assert [event["event"] for event in student.telemetry.buffer] == ["DIRECTORY_INVALIDATED"]
@@ -0,0 +1,39 @@
+"""Batched telemetry (protocols/telemetry.py): when buffered events are sent."""
+
+import asyncio
+import json
+
+from protocols.telemetry import TelemetryBehav
+
+
+class RecordingTelemetry(TelemetryBehav):
+    """Records the messages it would send, with the simulated time they left."""
+
+    def __init__(self, clock, **kwargs):
+        super().__init__(**kwargs)
+        self.clock = clock
+        self.sent = []
+
+    async def send(self, msg):
+        self.sent.append((self.clock.elapsed(), json.loads(msg.body)["events"]))
+
+
+def test_batch_leaves_max_delay_simulated_seconds_after_the_first_event(virtual_clock):
+    async def scenario():
+        telemetry = RecordingTelemetry(virtual_clock, max_batch=10, max_delay=3.0)
+        virtual_clock.call_later(1.0, lambda: telemetry.report({"event": "first"}))
+        virtual_clock.call_later(2.0, lambda: telemetry.report({"event": "second"}))
+        await telemetry.run()
+        return telemetry.sent
+
+    assert asyncio.run(scenario()) == [(4.0, [{"event": "first"}, {"event": "second"}])]
+
+
+def test_full_batch_leaves_at_once(virtual_clock):
+    async def scenario():
+        telemetry = RecordingTelemetry(virtual_clock, max_batch=2, max_delay=3.0)
+        virtual_clock.call_later(1.0, lambda: [telemetry.report({"event": "event"}) for _ in range(2)])
+        await telemetry.run()
+        return telemetry.sent
+
+    assert asyncio.run(scenario()) == [(1.0, [{"event": "event"}] * 2)]
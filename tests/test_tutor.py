@@ -0,0 +1,44 @@
+"""Tutor session bookkeeping (agents/tutor_agent.py)."""
+
+import asyncio
+
+from spade.message import Message
+
+from agents.tutor_agent import TutorAgent
+from logs import get_logger
+from protocols.codec import Proposal
+
+
+def tutor_with(max_sessions):
+    tutor = TutorAgent("tutor1@localhost", "password")
+    tutor.log = get_logger("tutor", "tutor1")
+    tutor.status_changed = asyncio.Event()
+    tutor.is_available = True
+    tutor.session_queue_length = 0
+    tutor.max_sessions = max_sessions
+    tutor.session_slots = asyncio.Semaphore(max_sessions)
+    tutor.sessions = {}
+    responder = TutorAgent.CNPResponderBehav()
+    responder.agent = tutor
+    return tutor, responder
+
+
+def accept_proposal(thread):
+    return Message(to="tutor1@localhost", sender="student1@localhost", thread=thread,
+                   metadata={"performative": "accept-proposal"})
+
+
+def test_session_cancelled_before_it_starts_frees_its_place():
+    async def scenario():
+        tutor, responder = tutor_with(max_sessions=1)
+        await responder.on_accept(accept_proposal("t1"), Proposal(0.0, 0.9))
+        assert tutor.session_queue_length == 1 and not tutor.is_available
+        task = tutor.sessions["t1"]
+        await responder.on_cancel(accept_proposal("t1"))  # Before the session task ran at all
+        await asyncio.gather(task, return_exceptions=True)
+        return tutor, task
+
+    tutor, task = asyncio.run(scenario())
+    assert task.cancelled()
+    assert tutor.session_queue_length == 0 and tutor.is_available
+    assert tutor.sessions == {}
@@ -0,0 +1,280 @@
+# project/visualization/dashboard.py
+"""
+Live web dashboard of a running simulation.
+
+DashboardAgent asks the MonitorAgent for its metrics snapshot every
+`interval` seconds (a MonitorProtocol 'request', answered from the
+monitor's running aggregates), so the whole dashboard costs the agents
+one message per interval however many browsers are watching.
+
+Browsers connect over WebSocket (/ws) or Server-Sent Events (/events).
+They get the full snapshot once, then only what changed since the
+previous one (delta). The history charts are downsampled on the server
+(SeriesBuffer), so they stay small however long the run is.
+
+Run it next to a running simulation:
+    python -m visualization.dashboard --port 8080
+or together with it:
+    python main.py --dashboard 8080
+"""
+
+import argparse
+import asyncio
+import json
+import os
+
+import aiohttp_jinja2
+import jinja2
+from aiohttp import web, WSMsgType
+from spade.agent import Agent
+from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
+from spade.message import Message
+from spade.template import Template
+
+from logs import get_logger
+
+PROTOCOL_MONITOR = "MonitorProtocol"
+MONITOR_AGENT_JID = "monitor@localhost"
+DASHBOARD_AGENT_JID = "dashboard@localhost"
+
+DEFAULT_INTERVAL = 1.0   # Real seconds between two snapshots
+MAX_POINTS = 240         # History points kept per chart
+CLIENT_BACKLOG = 8       # Updates buffered per browser before it is resynced
+TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+log = get_logger("dashboard", "[Dashboard]")
+
+
+def diff(old, new):
+    """Nested changes that turn `old` into `new`; removed keys map to None."""
+    changes = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            nested = diff(before, value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or value != before:
+            changes[key] = value
+    for key in old.keys() - new.keys():
+        changes[key] = None
+    return changes
+
+
+class SeriesBuffer:
+    """
+    At most `max_points` points of a time series. When full, every other
+    point is dropped and from then on only every `stride`-th sample is
+    kept, so the buffer always spans the whole run at decreasing resolution.
+    """
+
+    def __init__(self, max_points=MAX_POINTS):
+        self.max_points = max_points
+        self.points = []
+        self.stride = 1
+        self.samples = 0
+
+    def add(self, point):
+        """Returns (kept, compacted): whether `point` was stored and whether the buffer halved."""
+        self.samples += 1
+        if (self.samples - 1) % self.stride:
+            return False, False
+        self.points.append(point)
+        if len(self.points) <= self.max_points:
+            return True, False
+        self.points = self.points[::2]
+        self.stride *= 2
+        return True, True
+
+
+def series_point(snapshot):
+    """[time, p50, p95, p99, queued students, mean resource load] of one snapshot."""
+    help_time = snapshot.get("time_to_help") or {}
+    tutors = (snapshot.get("tutor_status") or {}).values()
+    loads = [replica["load"] for replica in (snapshot.get("resource_load") or {}).values()]
+    return [
+        round(snapshot.get("runtime", 0.0), 1),
+        help_time.get("p50"), help_time.get("p95"), help_time.get("p99"),
+        sum(tutor["queue_length"] for tutor in tutors),
+        round(sum(loads) / len(loads), 2) if loads else None,
+    ]
+
+
+class SnapshotHub:
+    """
+    Latest snapshot, its history, and the browsers subscribed to them.
+    Each update is diffed once and the same delta goes to every browser.
+    """
+
+    def __init__(self, max_points=MAX_POINTS):
+        self.snapshot = {}
+        self.seq = 0
+        self.series = SeriesBuffer(max_points)
+        self.clients = set()  # asyncio.Queue per browser
+
+    def full(self):
+        return {"type": "full", "seq": self.seq, "data": self.snapshot, "series": list(self.series.points)}
+
+    def update(self, snapshot):
+        changes = diff(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        self.seq += 1
+        kept, compacted = self.series.add(series_point(snapshot))
+        if not changes and not kept:
+            return
+        update = {"type": "delta", "seq": self.seq, "changes": changes,
+                  "point": self.series.points[-1] if kept else None, "compact": compacted}
+        for queue in self.clients:
+            if queue.full():
+                # Too slow to keep up: drop its backlog and start it over from a full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.full())
+            else:
+                queue.put_nowait(update)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=CLIENT_BACKLOG)
+        queue.put_nowait(self.full())
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.clients.discard(queue)
+
+
+class DashboardAgent(Agent):
+    """Pulls the MonitorAgent's snapshot every `interval` seconds into a SnapshotHub."""
+
+    def __init__(self, jid, password, hub, monitor_jid=MONITOR_AGENT_JID, interval=DEFAULT_INTERVAL, **kwargs):
+        super().__init__(jid, password, **kwargs)
+        self.hub = hub
+        self.monitor_jid = monitor_jid
+        self.interval = interval
+
+    async def setup(self):
+        snapshots = Template()
+        snapshots.set_metadata("protocol", PROTOCOL_MONITOR)
+        snapshots.set_metadata("performative", "inform")
+        self.add_behaviour(self.ReceiveSnapshotBehav(), snapshots)
+
+        # Nothing is ever received on this template
+        requests = Template()
+        requests.set_metadata("protocol", PROTOCOL_MONITOR)
+        requests.set_metadata("performative", "request")
+        self.add_behaviour(self.RequestSnapshotBehav(period=self.interval), requests)
+
+    class RequestSnapshotBehav(PeriodicBehaviour):
+        async def run(self):
+            msg = Message(to=self.agent.monitor_jid)
+            msg.set_metadata("protocol", PROTOCOL_MONITOR)
+            msg.set_metadata("performative", "request")
+            await self.send(msg)
+
+    class ReceiveSnapshotBehav(CyclicBehaviour):
+        async def run(self):
+            msg = await self.receive(timeout=100)
+            if msg:
+                try:
+                    self.agent.hub.update(json.loads(msg.body))
+                except Exception as e:
+                    log.warning("Bad snapshot from {}: {}", msg.sender, e)
+
+
+# --- Web server ---
+
+@aiohttp_jinja2.template("dashboard.html")
+async def index(request):
+    return {"interval": request.app["interval"]}
+
+
+async def snapshot(request):
+    return web.json_response(request.app["hub"].snapshot)
+
+
+async def websocket(request):
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    hub = request.app["hub"]
+    queue = hub.subscribe()
+
+    async def forward():
+        while True:
+            await ws.send_str(json.dumps(await queue.get()))
+
+    sender = asyncio.create_task(forward())
+    try:
+        async for msg in ws:  # Browsers send nothing; this only waits for the close
+            if msg.type == WSMsgType.ERROR:
+                break
+    finally:
+        sender.cancel()
+        hub.unsubscribe(queue)
+    return ws
+
+
+async def events(request):
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    hub = request.app["hub"]
+    queue = hub.subscribe()
+    try:
+        while True:
+            update = await queue.get()
+            await response.write(f"data: {json.dumps(update)}\n\n".encode())
+    except ConnectionResetError:
+        pass  # Browser went away
+    finally:
+        hub.unsubscribe(queue)
+    return response
+
+
+def create_app(hub, interval=DEFAULT_INTERVAL):
+    app = web.Application()
+    app["hub"] = hub
+    app["interval"] = interval
+    aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(TEMPLATES))
+    app.router.add_get("/", index)
+    app.router.add_get("/snapshot", snapshot)
+    app.router.add_get("/ws", websocket)
+    app.router.add_get("/events", events)
+    return app
+
+
+async def start_dashboard(port, interval=DEFAULT_INTERVAL, jid=DASHBOARD_AGENT_JID,
+                          password="password", monitor_jid=MONITOR_AGENT_JID):
+    """Starts the DashboardAgent and the web server. Returns (agent, runner); stop both when done."""
+    hub = SnapshotHub()
+    agent = DashboardAgent(jid, password, hub, monitor_jid, interval)
+    await agent.start(auto_register=True)
+    runner = web.AppRunner(create_app(hub, interval))
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    log.info("Serving on http://localhost:{}/ (snapshot every {}s)", port, interval)
+    return agent, runner
+
+
+async def stop_dashboard(agent, runner):
+    await runner.cleanup()
+    await agent.stop()
+
+
+async def main(args):
+    agent, runner = await start_dashboard(args.port, args.interval, args.jid, monitor_jid=args.monitor)
+    try:
+        await asyncio.Event().wait()  # Until interrupted
+    finally:
+        await stop_dashboard(agent, runner)
+
+
+if __name__ == "__main__":
+    import spade
+
+    parser = argparse.ArgumentParser(description="Live dashboard of a running simulation.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help="Seconds between two snapshots requested from the monitor")
+    parser.add_argument("--jid", default=DASHBOARD_AGENT_JID)
+    parser.add_argument("--monitor", default=MONITOR_AGENT_JID)
+    spade.run(main(parser.parse_args()))